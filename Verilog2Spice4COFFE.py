@@ -1,34 +1,63 @@
 import argparse
-import os
+import warnings
 
-from verilog2spice import Verilog2Spice
-from cdlToCOFFE import CoffeLibGeneration
+from verilog2spice import Verilog2Spice, SPICE_LINE_WIDTH
+from cdlToCOFFE import CoffeLibGeneration, COFFE_FORMATS
+from batchFlow import BatchFlow
+from flowLog import FlowLog, Diagnostics, MAX_MESSAGES
+from flowMetrics import FlowMetrics
 from translateVerilogNetlist import translateVerilogNetlist
 
-def attemptFileRemoval(filename) -> bool:
-        if os.path.exists(filename):
-            os.remove(filename)
-            return True
-        else:
-            return False
-
 def v2sp4cFlow(cdlFile, verilogFile, out, coffe_py_out,
                pmosname, nmosname, newvdd, newvss, 
-               temp_verilog='temp.v', new_cdl='newlib.cdl', delete_temp_files=True, groundisvss=True):
+               temp_verilog='temp.v', new_cdl='newlib.cdl', delete_temp_files=None, groundisvss=True, debug_files=False, incremental=False,
+               line_width=SPICE_LINE_WIDTH, diagnostics=None, use_cache=True, rebuild_cache=False, coffe_format='functions',
+               retarget=None, emit_sizes=False, power_nets=None, gates=None):
+    #the stages hand their results over in memory. With debug_files, the intermediate
+    #circuit_translation.json, subcircuit_info.json and temp_verilog are also written out.
+    #delete_temp_files : deprecated, same as debug_files=not delete_temp_files
+    #With incremental, only the parts of verilogFile changed since the previous run are translated
+    #(the netlist translation is then done chunk by chunk inside verilog2spice, see ecoManifest.py)
+    #SPICE lines longer than line_width are cut into '+' continuation lines (0 for no limit)
+    #diagnostics : Diagnostics collecting the warnings and errors of the SPICE translation (see flowLog.py)
+    #use_cache : reuse the cells of cdlFile unchanged since the previous run (see cellCache.py), rebuild_cache recomputes them
+    #coffe_format : layout of coffe_py_out, 'functions' or 'table' (see CoffeLibGeneration.makeCoffeTable)
+    #retarget : rules for the device sizes (see DeviceTable.retarget), emit_sizes : write the sizes in new_cdl and coffe_py_out
+    #power_nets : rules naming the vdd, vss and gnd nets of cdlFile (see powerNets.py), the defaults when None
+    #gates : gate names of basic_circuits.json, to merge the cells by name instead of by transistor network
+    if delete_temp_files != None:
+        warnings.warn('v2sp4cFlow: delete_temp_files is deprecated, use debug_files', DeprecationWarning, stacklevel=2)
+        debug_files = not delete_temp_files
+
     #use cdl file to create a list of simplified standard cells
-    #create json files containing cell information and cell transformation info
+    #create cell information and cell transformation info
     #create a python file that COFFE can use to generate the new cell library
-    CoffeLibGeneration.generate_libgeneration_for_COFFE(cdlFile, coffe_py_out, new_cdl, pmosname, nmosname, newvdd, newvss, groundisvss)
+    with FlowMetrics.stage('flow.coffe_library'):
+        library = CoffeLibGeneration.generate_libgeneration_for_COFFE(cdlFile, coffe_py_out, new_cdl, pmosname, nmosname,
+                                                                      newvdd, newvss, groundisvss, json_files=debug_files,
+                                                                      use_cache=use_cache, rebuild_cache=rebuild_cache,
+                                                                      coffe_format=coffe_format, retarget=retarget, emit_sizes=emit_sizes,
+                                                                      power_nets=power_nets, gates=gates)
     #translate existing verilog netlist into the new cell library
-    tvn = translateVerilogNetlist(verilogFile=verilogFile)
-    tvn.outputTranslatedVerilog(temp_verilog)
-    #use the new verilog file and cdl file to create a spice netlist
-    Verilog2Spice.verilogNetlist2Spice(spi_files=[new_cdl], ver_file=temp_verilog, out_file=out,
-                                       pos_pwr=newvdd, neg_pwr=newvss, del_on=True)
-
-    if delete_temp_files:
-        attemptFileRemoval('circuit_translation.json')
-        attemptFileRemoval('subcircuit_info.json')
+    with FlowMetrics.stage('flow.translate'):
+        tvn = translateVerilogNetlist(verilogFile=verilogFile if debug_files or not incremental else None,
+                                      circuitTranslation=library['circuit_translation'], cellInfo=library['subcircuit_info'])
+        if debug_files:
+            tvn.outputTranslatedVerilog(temp_verilog)
+    #use the translated netlist and the new cell library to create a spice netlist
+    #new_cdl is still written, as the spice netlist includes it
+    with FlowMetrics.stage('flow.spice'):
+        cells = Verilog2Spice.parseSpiceLines(library['cdl'].splitlines())
+        if incremental:
+            Verilog2Spice.verilogNetlist2Spice(spi_files=[new_cdl], ver_file=verilogFile, out_file=out,
+                                               pos_pwr=newvdd, neg_pwr=newvss, del_on=True, cells=cells, incremental=True,
+                                               transform=tvn.translateRecords, transform_key=tvn.translationDigest(),
+                                               line_width=line_width, diagnostics=diagnostics)
+        else:
+            Verilog2Spice.verilogNetlist2Spice(spi_files=[new_cdl], ver_file=verilogFile, out_file=out,
+                                               pos_pwr=newvdd, neg_pwr=newvss, del_on=True,
+                                               cells=cells, statements=tvn.translatedStatements(), line_width=line_width,
+                                               diagnostics=diagnostics, module_names=tvn.moduleNames(), signals=tvn.signals)
 
 
 if __name__ == '__main__':
@@ -39,19 +68,41 @@ if __name__ == '__main__':
     )
 
     parser.add_argument('-cdl ', '--library', required=True)
-    parser.add_argument('-ver', '--verilog', required=True)
-    parser.add_argument('-out', '--spiceout', required=True)
+    parser.add_argument('-ver', '--verilog', action='append', default=[], help='verilog netlist, can be repeated and be a glob pattern (batch)')
+    parser.add_argument('-out', '--spiceout')
+    parser.add_argument('-ver_list', help='file listing verilog netlists or glob patterns, one per line (batch)')
+    parser.add_argument('-outdir', help='batch : translate every verilog netlist into this directory, as <name>.sp')
+    parser.add_argument('-workers', type=int, default=1, help='batch : number of processes translating the designs')
+    parser.add_argument('--batch-status', help='batch : write the status of every design to this json file')
     parser.add_argument('-cfout', '--coffeout')
     parser.add_argument('-pmos', '--pmosname')
     parser.add_argument('-nmos', '--nmosname')
     parser.add_argument('-vdd', '--newvdd')
     parser.add_argument('-vss', '--newvss')
     parser.add_argument('-gvss', '--groundisvss')
+    parser.add_argument('--debug-files', action='store_true', help='also write the intermediate json files and temp.v')
+    parser.add_argument('--no-cache', action='store_true', help='do not read or write the cell cache of the library generation')
+    parser.add_argument('--rebuild-cache', action='store_true', help='recompute every cell of the library and refresh the cache')
+    parser.add_argument('-coffe_format', choices=COFFE_FORMATS, default='functions', help='one generate function per cell in the COFFE file, or the cells as tables written by one function')
+    parser.add_argument('-retarget', help='json rules scaling, snapping and clamping the device sizes, which are then written out')
+    parser.add_argument('--emit-sizes', action='store_true', help='write the device sizes instead of the gate_length, Wn and Wp parameters')
+    parser.add_argument('-power_nets', help='json rules (patterns and net names) of the vdd, vss and gnd nets of the library')
+    parser.add_argument('-gates', help='basic_circuits.json : merge the cells by gate name and ports instead of by transistor network')
+    parser.add_argument('--incremental', action='store_true', help='only translate the parts of the netlist changed since the previous run')
+    parser.add_argument('-line_width', type=int, default=SPICE_LINE_WIDTH, help="cut SPICE lines longer than this into '+' continuation lines, 0 (default) for no limit")
+    parser.add_argument('--quiet', action='store_true', help='only print the errors')
+    parser.add_argument('--verbose', action='store_true', help='also print the details of every step')
+    parser.add_argument('-max_messages', type=int, default=MAX_MESSAGES, help='messages printed per kind of warning or error, the others are counted in the summary')
+    parser.add_argument('--diagnostics', help='write the counts of every warning and error to this json file')
+    parser.add_argument('--metrics', help='write the time, counts and bytes of every stage to this json file')
+    parser.add_argument('--metrics-memory', action='store_true', help='add the tracemalloc peak of every stage to the metrics')
 
 
     args = parser.parse_args()
     libin = args.library
-    verin = args.verilog
+    designs = BatchFlow.designList(args.verilog, args.ver_list)
+    if args.outdir == None and (len(designs) != 1 or args.spiceout == None):
+        parser.error('one verilog netlist with -out, or several with -outdir')
     spout = args.spiceout
     out = args.coffeout
     if out == None:
@@ -71,6 +122,33 @@ if __name__ == '__main__':
     groundisvss = args.groundisvss
     if groundisvss == None: groundisvss = True
 
-    v2sp4cFlow(cdlFile=libin, verilogFile=verin, coffe_py_out=out, out=spout,
-               pmosname=pmosname, nmosname=nmosname, newvdd=newvdd, 
-               newvss=newvss, delete_temp_files=True, groundisvss=True)
\ No newline at end of file
+    FlowLog.setLevel(FlowLog.levelFromArgs(args.quiet, args.verbose))
+    retarget = CoffeLibGeneration.readRules(args.retarget)
+    emit_sizes = args.emit_sizes or retarget != None
+    power_nets = CoffeLibGeneration.readRules(args.power_nets)
+    gates = CoffeLibGeneration.readGates(args.gates)
+    diagnostics = Diagnostics(args.max_messages)
+    if args.metrics:
+        FlowMetrics.enable(trace_memory=args.metrics_memory)
+    if args.outdir != None:
+        #the library is generated once for all the designs
+        results = BatchFlow.run(cdlFile=libin, verilogFiles=designs, out_dir=args.outdir, coffe_py_out=out,
+                                pmosname=pmosname, nmosname=nmosname, newvdd=newvdd, newvss=newvss, groundisvss=True,
+                                incremental=args.incremental, line_width=args.line_width, workers=args.workers,
+                                max_messages=args.max_messages, use_cache=not args.no_cache, rebuild_cache=args.rebuild_cache,
+                                coffe_format=args.coffe_format, retarget=retarget, emit_sizes=emit_sizes, power_nets=power_nets,
+                                gates=gates)
+        BatchFlow.summary(results)
+        if args.batch_status:
+            BatchFlow.write(results, args.batch_status)
+    else:
+        v2sp4cFlow(cdlFile=libin, verilogFile=designs[0], coffe_py_out=out, out=spout,
+                   pmosname=pmosname, nmosname=nmosname, newvdd=newvdd, 
+                   newvss=newvss, groundisvss=True, debug_files=args.debug_files, incremental=args.incremental,
+                   line_width=args.line_width, diagnostics=diagnostics, use_cache=not args.no_cache, rebuild_cache=args.rebuild_cache,
+                   coffe_format=args.coffe_format, retarget=retarget, emit_sizes=emit_sizes, power_nets=power_nets,
+                   gates=gates)
+        if args.diagnostics:
+            diagnostics.write(args.diagnostics)
+    if args.metrics:
+        FlowMetrics.write(args.metrics)
@@ -0,0 +1,172 @@
+import contextlib
+import glob
+import json
+import multiprocessing
+import os
+import time
+
+from verilog2spice import Verilog2Spice, SPICE_LINE_WIDTH
+from cdlToCOFFE import CoffeLibGeneration
+from flowLog import FlowLog, Diagnostics, MAX_MESSAGES, ERROR, WARNING
+from flowMetrics import FlowMetrics
+from translateVerilogNetlist import translateVerilogNetlist
+
+#
+# Translation of many Verilog netlists against one library
+#
+# The COFFE library (new cell library, cell and pin translation tables) is
+# generated once, and the new cell library is parsed once. Every design is
+# then translated on its own, in order or by a pool of worker processes which
+# receive the library when they start. Each design gets its SPICE netlist
+# out_dir/<name>.sp and the log of its translation next to it
+# (out_dir/<name>.sp.log), so that the output of the designs is not mixed on
+# the console. A design that cannot be translated does not stop the others,
+# its status says why.
+##############################################################################
+
+BATCH_STATE = {} #read-only data of a batch worker process, see BatchFlow.initWorker
+
+class BatchFlow:
+    def designList(patterns: list, manifest=None) -> list:
+        #verilog files named by patterns (paths or glob patterns) then by the manifest file (one path
+        #or pattern per line, '#' starts a comment), in order and without repeats
+        entries = list(patterns)
+        if manifest != None:
+            with open(manifest) as f:
+                for line in f:
+                    line = line.split('#', 1)[0].strip()
+                    if line != '':
+                        entries.append(line)
+        designs = []
+        seen = set()
+        for entry in entries:
+            if glob.has_magic(entry):
+                matches = sorted(glob.glob(entry))
+                if len(matches) == 0:
+                    FlowLog.warning('Warning : no verilog netlist matches ' + entry)
+            else:
+                matches = [entry]
+            for design in matches:
+                if design not in seen:
+                    seen.add(design)
+                    designs.append(design)
+        return designs
+
+    def outputPaths(designs: list, out_dir: str) -> list:
+        #out_dir/<name>.sp for each design, <name> being the file name without its extensions.
+        #Designs with the same name get _2, _3, ... in the order of the list
+        outputs = []
+        used = set()
+        for design in designs:
+            name = os.path.basename(design).split('.')[0] or 'design'
+            candidate = name
+            n = 1
+            while candidate in used:
+                n += 1
+                candidate = name + '_' + str(n)
+            used.add(candidate)
+            outputs.append(os.path.join(out_dir, candidate + '.sp'))
+        return outputs
+
+    def initWorker(cells, tvn, settings):
+        BATCH_STATE['cells'] = cells
+        BATCH_STATE['tvn'] = tvn
+        BATCH_STATE['settings'] = settings
+        FlowLog.setLevel(settings['level'])
+
+    def translateDesign(job) -> dict:
+        #translates one design with the library of BATCH_STATE, its messages going to its log file
+        design, out = job
+        settings = BATCH_STATE['settings']
+        tvn = BATCH_STATE['tvn']
+        status = {'design': design, 'output': out, 'log': out + '.log', 'status': 'ok', 'message': '',
+                  'instances': 0, 'missing_cells': 0, 'missing_pins': 0, 'errors': 0, 'warnings': 0}
+        start = time.perf_counter()
+        diagnostics = Diagnostics(settings['limit'])
+        with open(status['log'], 'w') as log, contextlib.redirect_stdout(log):
+            try:
+                counts = Verilog2Spice.verilogNetlist2Spice(spi_files=[settings['new_cdl']], ver_file=design, out_file=out,
+                                                            pos_pwr=settings['vdd'], neg_pwr=settings['vss'], del_on=True,
+                                                            cells=BATCH_STATE['cells'], incremental=settings['incremental'],
+                                                            transform=tvn.translateRecords, transform_key=settings['transform_key'],
+                                                            line_width=settings['line_width'], diagnostics=diagnostics)
+                status['missing_cells'], status['missing_pins'], status['instances'] = counts[0], counts[1], counts[2]
+                if counts[0] + counts[1] > 0:
+                    status['status'] = 'errors'
+            except (Exception, SystemExit) as e: #sys.exit of verilogNetlist2Spice, unreadable or broken netlist
+                status['status'] = 'failed'
+                status['message'] = (type(e).__name__ + ' : ' + str(e)).strip()
+                FlowLog.error('\nERROR : ' + design + ' not translated : ' + status['message'])
+                if os.path.exists(out): #no partial netlist
+                    os.remove(out)
+        status['errors'] = diagnostics.total(ERROR)
+        status['warnings'] = diagnostics.total(WARNING)
+        status['seconds'] = round(time.perf_counter() - start, 3)
+        return status
+
+    def run(cdlFile, verilogFiles, out_dir, coffe_py_out, pmosname, nmosname, newvdd, newvss,
+            new_cdl='newlib.cdl', groundisvss=True, incremental=False, line_width=SPICE_LINE_WIDTH,
+            workers=1, max_messages=MAX_MESSAGES, use_cache=True, rebuild_cache=False, coffe_format='functions',
+            retarget=None, emit_sizes=False, power_nets=None, gates=None) -> list:
+        #translates every verilog file into out_dir, returns the status of each design in the order of verilogFiles.
+        #workers : number of processes translating designs, one design at a time each
+        with FlowMetrics.stage('batch.coffe_library'):
+            library = CoffeLibGeneration.generate_libgeneration_for_COFFE(cdlFile, coffe_py_out, new_cdl, pmosname, nmosname,
+                                                                          newvdd, newvss, groundisvss, json_files=False,
+                                                                          use_cache=use_cache, rebuild_cache=rebuild_cache,
+                                                                          coffe_format=coffe_format, retarget=retarget, emit_sizes=emit_sizes,
+                                                                          power_nets=power_nets, gates=gates)
+            tvn = translateVerilogNetlist(circuitTranslation=library['circuit_translation'],
+                                          cellInfo=library['subcircuit_info'])
+            cells = Verilog2Spice.parseSpiceLines(library['cdl'].splitlines())
+        os.makedirs(out_dir, exist_ok=True)
+        jobs = list(zip(verilogFiles, BatchFlow.outputPaths(verilogFiles, out_dir)))
+        settings = {'new_cdl': new_cdl, 'vdd': newvdd, 'vss': newvss, 'incremental': incremental,
+                    'transform_key': tvn.translationDigest(), 'line_width': line_width,
+                    'limit': max_messages, 'level': FlowLog.level()}
+        workers = min(workers, len(jobs), os.cpu_count() or 1)
+        FlowLog.info('Translating ' + str(len(jobs)) + ' verilog netlists with ' + str(max(workers, 1)) + ' process(es)')
+        results = []
+        with FlowMetrics.stage('batch.designs'):
+            if workers > 1:
+                with multiprocessing.Pool(workers, initializer=BatchFlow.initWorker, initargs=(cells, tvn, settings)) as pool:
+                    for status in pool.imap(BatchFlow.translateDesign, jobs, chunksize=1):
+                        BatchFlow.progress(status, len(results) + 1, len(jobs))
+                        results.append(status)
+            else:
+                BatchFlow.initWorker(cells, tvn, settings)
+                for job in jobs:
+                    status = BatchFlow.translateDesign(job)
+                    BatchFlow.progress(status, len(results) + 1, len(jobs))
+                    results.append(status)
+                BATCH_STATE.clear()
+        FlowMetrics.count('batch.designs', len(results))
+        FlowMetrics.count('batch.failed', sum(1 for status in results if status['status'] == 'failed'))
+        return results
+
+    def progress(status: dict, n: int, total: int) -> None:
+        FlowLog.info('[' + str(n) + '/' + str(total) + '] ' + status['design'] + ' : ' + status['status'])
+
+    def summary(results: list) -> None:
+        #one line per design, then the totals
+        FlowLog.warning('\nBatch summary :')
+        FlowLog.warning('  %-30s %-7s %10s %8s %8s %8s %8s %9s' % ('design', 'status', 'instances', 'cells', 'pins',
+                                                                  'errors', 'warnings', 'seconds'))
+        for status in results:
+            FlowLog.warning('  %-30s %-7s %10d %8d %8d %8d %8d %9.2f' % (status['design'], status['status'], status['instances'],
+                                                                      status['missing_cells'], status['missing_pins'],
+                                                                      status['errors'], status['warnings'], status['seconds']))
+            if status['message'] != '':
+                FlowLog.warning('    ' + status['message'])
+        totals = {}
+        for status in results:
+            totals[status['status']] = totals.get(status['status'], 0) + 1
+        FlowLog.warning('  ' + str(len(results)) + ' designs : ' + ', '.join(str(totals.get(name, 0)) + ' ' + name
+                                                                           for name in ('ok', 'errors', 'failed')))
+        FlowLog.warning('  cells and pins : missing from the new library, messages in the .sp.log file of each design\n')
+
+    def write(results: list, path: str) -> None:
+        #writes the status of every design as JSON
+        with open(path, 'w') as f:
+            json.dump({'designs': results}, f, indent=1)
+        FlowLog.info('Batch status saved to ' + path)
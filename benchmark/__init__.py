@@ -0,0 +1,9 @@
+#
+# Throughput benchmarks of the Verilog2Spice4COFFE flow
+#
+# syntheticCdl     : deterministic CDL cell library generator
+# syntheticVerilog : deterministic structural Verilog netlist generator
+# runBenchmark     : times the three flow stages and writes a JSON report
+#
+# usage (from the repository root): python -m benchmark.runBenchmark -sizes 1000 100000
+##############################################################################
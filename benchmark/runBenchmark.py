@@ -0,0 +1,191 @@
+import argparse
+import contextlib
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+from benchmark.syntheticCdl import SyntheticCdl
+from benchmark.syntheticVerilog import SyntheticVerilog
+
+try:
+    import resource
+except ImportError: #not available on Windows, peak RSS is then not reported
+    resource = None
+
+#
+# Flow benchmark
+#
+# Generates a synthetic CDL library and synthetic netlists of increasing
+# size, then times the three stages of Verilog2Spice4COFFE separately:
+#   coffe_library : CoffeLibGeneration.generate_libgeneration_for_COFFE (once, on the library)
+#   translate     : translateVerilogNetlist + outputTranslatedVerilog
+#   verilog2spice : Verilog2Spice.verilogNetlist2Spice on the translated netlist
+# Every stage runs in a fresh process, so its peak RSS is its own. Wall time,
+# throughput and peak RSS are written to a JSON report, and -compare prints
+# the speedup against the report of an earlier commit.
+##############################################################################
+
+REPORT_VERSION = 1
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000, 10000000]
+PMOS = 'p12'
+NMOS = 'n12'
+NEW_VDD = 'n_vdd'
+NEW_VSS = 'n_gnd'
+
+class Benchmark:
+    def peakRss() -> int:
+        #peak resident set size of this process in KiB, None when unknown
+        if resource == None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin': #bytes on macOS, KiB on Linux
+            peak //= 1024
+        return peak
+
+    def stageBody(stage: str, params: dict) -> None:
+        #imported here, so that the stage process only pays for what it runs
+        if stage == 'coffe_library':
+            from cdlToCOFFE import CoffeLibGeneration
+            CoffeLibGeneration.generate_libgeneration_for_COFFE('lib.cdl', 'generate.py', 'newlib.cdl', PMOS, NMOS,
+                                                                NEW_VDD, NEW_VSS, True, json_files=True, use_cache=False)
+        elif stage == 'translate':
+            from translateVerilogNetlist import translateVerilogNetlist
+            tvn = translateVerilogNetlist(params['verilog'])
+            tvn.outputTranslatedVerilog(params['translated'])
+        elif stage == 'verilog2spice':
+            from verilog2spice import Verilog2Spice
+            Verilog2Spice.verilogNetlist2Spice(spi_files=['newlib.cdl'], ver_file=params['translated'], out_file=params['spice'],
+                                               pos_pwr=NEW_VDD, neg_pwr=NEW_VSS, del_on=True, use_cache=False,
+                                               workers=params['workers'])
+        else:
+            raise ValueError('unknown stage ' + stage)
+
+    def stageProcess(stage: str, workdir: str, params: dict, results) -> None:
+        #body of the stage process. The flow prints a lot, so its output is discarded
+        os.chdir(workdir)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            Benchmark.stageBody(stage, params)
+            wall = time.perf_counter() - start
+        results.put({'wall_time_s': wall, 'peak_rss_kib': Benchmark.peakRss()})
+
+    def runStage(stage: str, workdir: str, params: dict) -> dict:
+        ctx = multiprocessing.get_context('spawn')
+        results = ctx.Queue()
+        proc = ctx.Process(target=Benchmark.stageProcess, args=(stage, workdir, params, results))
+        proc.start()
+        result = None
+        while result == None and (proc.is_alive() or not results.empty()):
+            try:
+                result = results.get(timeout=1)
+            except queue.Empty:
+                pass
+        proc.join()
+        if proc.exitcode != 0 or result == None:
+            raise RuntimeError('stage ' + stage + ' failed with exit code ' + str(proc.exitcode))
+        return result
+
+    def gitCommit() -> str:
+        try:
+            return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def record(runs: list, stage: str, instances: int, cells: int, result: dict) -> None:
+        entry = {'stage': stage, 'instances': instances, 'cells': cells}
+        entry.update(result)
+        if stage == 'coffe_library':
+            entry['cells_per_s'] = cells / result['wall_time_s']
+        else:
+            entry['instances_per_s'] = instances / result['wall_time_s']
+        runs.append(entry)
+        print('{:<14} {:>10} instances {:>10.3f} s {:>14} {:>12} KiB peak'.format(
+            stage, instances, result['wall_time_s'],
+            '{:.0f} cells/s'.format(entry['cells_per_s']) if stage == 'coffe_library'
+            else '{:.0f} inst/s'.format(entry['instances_per_s']),
+            str(result['peak_rss_kib'])))
+
+    def run(sizes: list, nb_cells=100, transistors=8, power_style='mixed', continuation=0, bus_width=8,
+            multiline=0.1, workers=1, seed=1, workdir=None, keep=False) -> dict:
+        own_dir = workdir == None
+        if own_dir:
+            workdir = tempfile.mkdtemp(prefix='v2s_bench_')
+        os.makedirs(workdir, exist_ok=True)
+        parameters = {'sizes': sizes, 'cells': nb_cells, 'transistors': transistors, 'power_style': power_style,
+                      'continuation': continuation, 'bus_width': bus_width, 'multiline': multiline,
+                      'workers': workers, 'seed': seed}
+        runs = []
+        try:
+            cells = SyntheticCdl.generate(os.path.join(workdir, 'lib.cdl'), nb_cells, transistors, power_style,
+                                          continuation, seed)
+            Benchmark.record(runs, 'coffe_library', 0, nb_cells, Benchmark.runStage('coffe_library', workdir, {}))
+            for size in sizes:
+                params = {'verilog': 'bench_' + str(size) + '.v', 'translated': 'bench_' + str(size) + '_translated.v',
+                          'spice': 'bench_' + str(size) + '.sp', 'workers': workers}
+                SyntheticVerilog.generate(os.path.join(workdir, params['verilog']), cells, size, bus_width, multiline,
+                                          seed=seed)
+                for stage in ('translate', 'verilog2spice'):
+                    Benchmark.record(runs, stage, size, nb_cells, Benchmark.runStage(stage, workdir, params))
+                if not keep: #the netlists of the largest sizes take gigabytes
+                    for name in ('verilog', 'translated', 'spice'):
+                        os.remove(os.path.join(workdir, params[name]))
+        finally:
+            if own_dir and not keep:
+                shutil.rmtree(workdir, ignore_errors=True)
+        return {'version': REPORT_VERSION, 'commit': Benchmark.gitCommit(),
+                'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(), 'platform': platform.platform(),
+                'cpu_count': os.cpu_count(), 'parameters': parameters, 'runs': runs}
+
+    def compare(report: dict, baseline: dict) -> None:
+        #prints the speedup of each stage and size against a report of another commit
+        before = {(run['stage'], run['instances']): run for run in baseline['runs']}
+        print('compared with commit ' + str(baseline.get('commit')))
+        for run in report['runs']:
+            old = before.get((run['stage'], run['instances']))
+            if old == None:
+                continue
+            speedup = old['wall_time_s'] / run['wall_time_s']
+            line = '{:<14} {:>10} instances  speedup {:>6.2f}x'.format(run['stage'], run['instances'], speedup)
+            if old['peak_rss_kib'] and run['peak_rss_kib']:
+                line += '  peak RSS {:>6.2f}x'.format(run['peak_rss_kib'] / old['peak_rss_kib'])
+            print(line)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Times the stages of the Verilog2Spice4COFFE flow on synthetic inputs')
+    parser.add_argument('-sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='netlist sizes, in instances')
+    parser.add_argument('-cells', type=int, default=100, help='number of cells of the synthetic library')
+    parser.add_argument('-transistors', type=int, default=8, help='transistors per cell')
+    parser.add_argument('-power_style', choices=['vdd', 'gnd', 'mixed'], default='mixed', help='power pin naming of the cells')
+    parser.add_argument('-continuation', type=int, default=0, help='wrap the .subckt port lists on + lines of N ports')
+    parser.add_argument('-bus_width', type=int, default=8, help='width of the bus wires, 0 for none')
+    parser.add_argument('-multiline', type=float, default=0.1, help='fraction of instances with one connection per line')
+    parser.add_argument('-workers', type=int, default=1, help='processes used by verilog2spice')
+    parser.add_argument('-seed', type=int, default=1)
+    parser.add_argument('-workdir', help='directory of the generated files (default: a temporary directory)')
+    parser.add_argument('--keep', action='store_true', help='keep the generated files')
+    parser.add_argument('-output', default='benchmark.json', help='JSON report')
+    parser.add_argument('-compare', help='JSON report of an earlier run to compare with')
+    args = parser.parse_args()
+
+    report = Benchmark.run(args.sizes, args.cells, args.transistors, args.power_style, args.continuation, args.bus_width,
+                           args.multiline, args.workers, args.seed, args.workdir, args.keep)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=1)
+    print('report written to ' + args.output)
+    if args.compare:
+        with open(args.compare) as f:
+            Benchmark.compare(report, json.load(f))
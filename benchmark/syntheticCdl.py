@@ -0,0 +1,100 @@
+import random
+from collections import namedtuple
+
+from compressedIO import CompressedIO
+
+#
+# Deterministic synthetic CDL cell library
+#
+# Cells are named like a standard cell library (NAND2X1, NOR3X4, DFFX2, ...)
+# so that CoffeLibGeneration categorizes and merges them as it does real
+# libraries. The same parameters and seed always give the same file.
+##############################################################################
+
+Cell = namedtuple('Cell', ['name', 'inputs', 'outputs'])
+
+#family, number of inputs (0: single input cell), output pins
+FAMILIES = (('NAND', (2, 3, 4), ('QN',)),
+            ('NOR', (2, 3, 4), ('QN',)),
+            ('AND', (2, 3, 4), ('Q',)),
+            ('OR', (2, 3, 4), ('Q',)),
+            ('XOR', (2, 3), ('Q',)),
+            ('XNOR', (2, 3), ('Q',)),
+            ('INV', (0,), ('ZN',)),
+            ('NBUFF', (0,), ('Z',)),
+            ('DFF', (0,), ('Q', 'QN')),
+            ('MUX', (21, 41), ('Y',)))
+
+#power pin names found in real libraries: (supply, ground)
+POWER_STYLES = {'vdd': (('VDD', 'VSS'),),
+                'gnd': (('VDD', 'GND'),),
+                'mixed': (('VDD', 'VSS'), ('vdd', 'gnd'), ('VDD', 'GND'), ('VDDL', 'VSS'), ('vdd', 'ground'))}
+
+class SyntheticCdl:
+    def cellPins(family: str, inputs: int) -> list:
+        if family == 'DFF':
+            return ['CLK', 'D']
+        if family == 'MUX': #21 -> 2 data inputs and 1 select
+            data, select = divmod(inputs, 10)
+            return ['IN' + str(i+1) for i in range(data)] + ['S' + str(i) for i in range(select)]
+        if inputs == 0:
+            return ['INP']
+        return ['IN' + str(i+1) for i in range(inputs)]
+
+    def cells(nb_cells: int) -> list:
+        #first nb_cells cells of the library: every family and input count at drive X0, then X1, ...
+        variants = []
+        for family, inputs, outputs in FAMILIES:
+            for nb in inputs:
+                variants.append((family, nb, outputs))
+        cells = []
+        drive = 0
+        while len(cells) < nb_cells:
+            for family, nb, outputs in variants:
+                if len(cells) == nb_cells:
+                    break
+                name = family + (str(nb) if nb else '') + 'X' + str(drive)
+                cells.append(Cell(name, SyntheticCdl.cellPins(family, nb), list(outputs)))
+            drive += 1
+        return cells
+
+    def subcktText(cell, transistors: int, power: tuple, continuation: int, rnd) -> str:
+        #transistors is the number of transistors of the cell, at least 2 per pin so every pin is used
+        vdd, vss = power
+        ports = cell.inputs + cell.outputs + [vdd, vss]
+        lines = ['* Cell Name: ' + cell.name + '\n', '* View Name: schematic\n']
+        if continuation > 0:
+            lines.append('.subckt ' + cell.name + ' ' + ' '.join(ports[:continuation]) + '\n')
+            for i in range(continuation, len(ports), continuation):
+                lines.append('+ ' + ' '.join(ports[i:i+continuation]) + '\n')
+        else:
+            lines.append('.subckt ' + cell.name + ' ' + ' '.join(ports) + '\n')
+        pins = cell.inputs + cell.outputs
+        transistors = max(transistors, 2 * len(pins))
+        width = 0.4 * (1 + rnd.randrange(4))
+        for t in range(transistors):
+            pmos = t % 2 == 1
+            gate = pins[(t // 2) % len(pins)]
+            drain = 'net' + str(t // 2)
+            source = vdd if pmos else ('net' + str(t // 2 + 1) if t // 2 + 1 < transistors // 2 else vss)
+            bulk = vdd if pmos else vss
+            w = width * 1.5 if pmos else width
+            mult = ' m=1' if t % 3 == 0 else (' m = 1' if t % 3 == 1 else '')
+            lines.append(('MP' if pmos else 'MN') + str(t // 2) + ' ' + drain + ' ' + gate + ' ' + source + ' ' + bulk + ' '
+                         + ('p12' if pmos else 'n12') + ' l=0.1u w=' + format(w, '.2f') + 'u' + mult + '\n')
+        lines.append('.ends\n')
+        return ''.join(lines)
+
+    def generate(path: str, nb_cells=100, transistors=8, power_style='mixed', continuation=0, seed=1) -> list:
+        #writes the library to path (compressed for .gz/.xz/.bz2) and returns its cells
+        #power_style : 'vdd' (VDD/VSS), 'gnd' (VDD/GND) or 'mixed' (a different naming for each cell)
+        #continuation: when > 0, the .subckt port lists are wrapped on '+' lines of that many ports
+        rnd = random.Random(seed)
+        styles = POWER_STYLES[power_style]
+        cells = SyntheticCdl.cells(nb_cells)
+        with CompressedIO.openOutput(path) as out:
+            out.write('* Synthetic library: ' + str(nb_cells) + ' cells, seed ' + str(seed) + '\n')
+            out.write('************************************************************************\n')
+            for i, cell in enumerate(cells):
+                out.write(SyntheticCdl.subcktText(cell, transistors, styles[i % len(styles)], continuation, rnd))
+        return cells
@@ -0,0 +1,100 @@
+import random
+
+from compressedIO import CompressedIO
+
+#
+# Deterministic synthetic structural Verilog netlist
+#
+# One flat module of nb_instances cell instances. Instance i drives net
+# netName(i); its inputs are primary inputs or nets driven by earlier
+# instances. With buses, part of the nets are bits of bus wires and the
+# primary inputs include a bus. The netlist is streamed to the file, so
+# multi-million instance netlists never sit in memory.
+##############################################################################
+
+NB_INPUTS = 16
+NB_OUTPUTS = 16
+DECLARATION_CHUNK = 1000 #names per wire declaration
+
+class SyntheticVerilog:
+    def netName(i: int, bus_width: int) -> str:
+        #net driven by the first output of instance i. With buses, one group of bus_width instances in four drives a bus
+        if bus_width > 0 and (i // bus_width) % 4 == 0:
+            return 'bus' + str(i // bus_width) + '[' + str(i % bus_width) + ']'
+        return 'n' + str(i)
+
+    def cellChooser(cells: list, mix, seed: int):
+        #returns a function giving the cell of the next instance. mix : {cell name: weight}, None for a uniform mix
+        rnd = random.Random(seed)
+        if mix == None:
+            return lambda: cells[rnd.randrange(len(cells))]
+        weighted = [cell for cell in cells if mix.get(cell.name, 0) > 0]
+        weights = [mix[cell.name] for cell in weighted]
+        return lambda: rnd.choices(weighted, weights)[0]
+
+    def writeDeclarations(out, kind: str, names) -> None:
+        chunk = []
+        for name in names:
+            chunk.append(name)
+            if len(chunk) == DECLARATION_CHUNK:
+                out.write('  ' + kind + ' ' + ', '.join(chunk) + ';\n')
+                chunk = []
+        if chunk:
+            out.write('  ' + kind + ' ' + ', '.join(chunk) + ';\n')
+
+    def wireNames(nb_instances: int, cells: list, mix, bus_width: int, seed: int):
+        #names of the internal wires, in the order the instances drive them
+        nextCell = SyntheticVerilog.cellChooser(cells, mix, seed)
+        first_output = nb_instances - NB_OUTPUTS
+        for i in range(nb_instances):
+            cell = nextCell()
+            net = SyntheticVerilog.netName(i, bus_width)
+            if net[0] == 'n' and i < first_output:
+                yield net
+            for k in range(1, len(cell.outputs)):
+                yield 'n' + str(i) + '_' + str(k)
+
+    def generate(path: str, cells: list, nb_instances=1000, bus_width=8, multiline=0.1, mix=None, seed=1) -> None:
+        #cells     : benchmark.syntheticCdl.Cell records the instances are drawn from
+        #bus_width : width of the bus wires and of the bus input, 0 for a netlist without buses
+        #multiline : fraction of the instances written with one connection per line
+        #mix       : {cell name: weight}, None to draw the cells uniformly
+        rnd = random.Random(seed + 1)
+        nextCell = SyntheticVerilog.cellChooser(cells, mix, seed)
+        first_output = max(nb_instances - NB_OUTPUTS, 0)
+        inputs = ['in' + str(i) for i in range(NB_INPUTS)]
+        sources = inputs + (['din[' + str(b) + ']' for b in range(bus_width)] if bus_width > 0 else [])
+        outputs = [SyntheticVerilog.netName(i, 0) for i in range(first_output, nb_instances)]
+        with CompressedIO.openOutput(path) as out:
+            out.write('// synthetic netlist: ' + str(nb_instances) + ' instances, seed ' + str(seed) + '\n')
+            ports = inputs + (['din'] if bus_width > 0 else []) + outputs
+            out.write('module top ( ' + ', '.join(ports) + ' );\n')
+            out.write('  input ' + ', '.join(inputs) + ';\n')
+            if bus_width > 0:
+                out.write('  input [' + str(bus_width - 1) + ':0] din;\n')
+            if outputs:
+                out.write('  output ' + ', '.join(outputs) + ';\n')
+            if bus_width > 0:
+                buses = range(0, (nb_instances + bus_width - 1) // bus_width, 4)
+                SyntheticVerilog.writeDeclarations(out, 'wire [' + str(bus_width - 1) + ':0]', ('bus' + str(b) for b in buses))
+            SyntheticVerilog.writeDeclarations(out, 'wire', SyntheticVerilog.wireNames(nb_instances, cells, mix, bus_width, seed))
+            out.write('\n')
+            for i in range(nb_instances):
+                cell = nextCell()
+                driven = SyntheticVerilog.netName(i, 0 if i >= first_output else bus_width)
+                connections = []
+                for pin in cell.inputs:
+                    j = rnd.randrange(i + len(sources)) - len(sources) #primary input if < 0, else an earlier instance
+                    if j < 0:
+                        net = sources[j]
+                    else:
+                        net = SyntheticVerilog.netName(j, 0 if j >= first_output else bus_width)
+                    connections.append('.' + pin + '(' + net + ')')
+                connections.append('.' + cell.outputs[0] + '(' + driven + ')')
+                for k in range(1, len(cell.outputs)):
+                    connections.append('.' + cell.outputs[k] + '(n' + str(i) + '_' + str(k) + ')')
+                if rnd.random() < multiline:
+                    out.write('  ' + cell.name + ' U' + str(i) + ' ( ' + ',\n      '.join(connections) + ' );\n')
+                else:
+                    out.write('  ' + cell.name + ' U' + str(i) + ' ( ' + ', '.join(connections) + ' );\n')
+            out.write('endmodule\n')
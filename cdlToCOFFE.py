@@ -10,20 +10,68 @@
 #2. Make a method to replace most of main.
 #3. Wrap all (except reformat_json) in a class.
 #4. Add descriptions for all methods 
-#5. Add parameter for basic_circuit file
-#6. Add parameter for subcircuit info file
-#7. Add parameter for determining if unused ports should be removed
+#5. Add parameter for subcircuit info file
+#6. Add parameter for determining if unused ports should be removed
 ##############################################################################
 
 import argparse
-import re
+import io
 import json
+import mmap
+import os
 
-#util to help make json files readable
-import json
+from cellCache import CellCache
+from cellTopology import CellTopology
+from compressedIO import CompressedIO
+from deviceTable import DeviceTable
+from flowLog import FlowLog
+from flowMetrics import FlowMetrics
+from powerNets import PowerNets
 
 #variables
 DEBUG_OUTPUT = False
+CDL_REGION_BYTES = 1 << 18 #a memory-mapped library is decoded by regions of about this size, see libraryLines
+COFFE_FORMATS = ('functions', 'table') #layouts of the COFFE python file, see makeCoffeTable
+CELL_SEPARATOR = '*' * 90
+MOS_PARAMS = ' W={w} AS={w}*trans_diffusion_length AD={w}*trans_diffusion_length PS={w}+2*trans_diffusion_length PD={w}+2*trans_diffusion_length'
+DEFAULT_WIDTHS = {'nmos': 'Wn', 'pmos': 'Wp'} #parameters of the generated cells, used when the sizes are not written
+NMOS_PARAMS = MOS_PARAMS.format(w=DEFAULT_WIDTHS['nmos'])
+PMOS_PARAMS = MOS_PARAMS.format(w=DEFAULT_WIDTHS['pmos'])
+#code of the table layout, after the CELL_LINES table: one writer for every cell, and the <cell>_generate
+#functions of the functions layout built from it. With SIZED, the devices are whole SPICE lines
+COFFE_TABLE_WRITER = '''
+#(name, ports, devices) of every cell
+CELLS = tuple((fields[0], tuple(fields[1].split()), tuple(fields[2:])) for fields in (line.split('\\t') for line in CELL_LINES))
+CELL_INDEX = {cell[0]: cell for cell in CELLS}
+DEVICE_PARAMS = {'nmos': NMOS_PARAMS, 'pmos': PMOS_PARAMS}
+
+def cell_text(cell):
+    name, ports, devices = cell
+    lines = [CELL_SEPARATOR, '*' + name, CELL_SEPARATOR,
+             '.SUBCKT ' + name + ' ' + ''.join(port + ' ' for port in ports) + SUBCKT_PARAMS]
+    for device in devices:
+        lines.append(device if SIZED else device + ' L=gate_length' + DEVICE_PARAMS.get(device[device.rfind(' ') + 1:], ''))
+    lines.append('.ENDS')
+    return '\\n'.join(lines) + '\\n'
+
+def write_cells(filename, names=None, use_finfet=False):
+    #appends all the cells (in library order), or the named ones, to filename in one write
+    cells = CELLS if names is None else [CELL_INDEX[name] for name in names]
+    with open(filename, 'a') as spice_file:
+        spice_file.write(''.join(cell_text(cell) for cell in cells))
+
+def generate_all(filename):
+    write_cells(filename)
+
+def cell_generator(name):
+    def generate(filename, use_finfet):
+        write_cells(filename, (name,), use_finfet)
+    generate.__name__ = name + '_generate'
+    return generate
+
+for cell in CELLS:
+    globals()[cell[0] + '_generate'] = cell_generator(cell[0])
+'''
 class CoffeLibGeneration:
     def reformat_json(file_path, indent=4):
         """Reads a JSON file, reformats it with proper indentation, and overwrites it."""
@@ -34,65 +82,89 @@ class CoffeLibGeneration:
             with open(file_path, 'w') as file:
                 json.dump(data, file, indent=indent)  # Overwrite with formatted JSON
 
-            print(f"Reformatted JSON saved to {file_path}")
+            FlowLog.info(f"Reformatted JSON saved to {file_path}")
         except Exception as e:
-            print(f"Error: {e}")
-
-
-    def extractCellNames(input: str) -> str:
-        # Regular expression to extract cell names
-        matches = re.findall(r'\* Cell\s*:\s*(\S+)', input)
-        
-        names = []
-
-        #go through matches and remove .SCH and ;
-        for match in matches:
-            match = match.replace('.SCH','')
-            match = match.replace('.sch','')
-            match = re.sub(r";\d*", '', match)
-            names.append(match)
-
-        # Print all cell names found
-        # print("Extracted cell names:", names)
-        finalstr = '**************Cell Library**************\n'
-        for name in names:
-            finalstr += '*CellName: ' + name + '\n'
-        finalstr += '***********************************************\n'
-        return finalstr
+            FlowLog.error(f"Error: {e}")
 
-    def cleanCdl(file) -> str:
-        cleanlines = []
-        emptylines = ['\n', ' ', '\t']
-        for line in file:
+
+    def normalizeCdl(lines):
+        #yields the logical lines of a CDL library in one pass: comments removed (a '* Cell' label is kept,
+        #on the line it ends), whitespace collapsed and '+' continuation lines
+        #joined to the line they continue. Blank lines are skipped.
+        #Device parameters are kept, m= multipliers included ('m = 2' becomes 'm=2'): they are
+        #device multipliers, not metal layers, and extractSUBCKTInfo reads them (see deviceTable.py)
+        pending = None #last line, kept until it is known that no continuation follows
+        for line in lines:
             #remove all content after *
             #one exception being Cell labels
-            linesplit = line.split('*')
+            linesplit = line.split('*', 2)
             cleanline = linesplit[0]
-            if len(linesplit) > 1:
-                if 'cell' in str.lower(linesplit[1]):
-                    cleanline += '\n*' + linesplit[1]
-            #remove metal layer
-            cleanline = re.sub(r"m=\d+", "", cleanline)
-            cleanline = re.sub(r"m = \d+", "", cleanline)
+            if len(linesplit) > 1 and 'cell' in linesplit[1].lower():
+                cleanline += ' *' + linesplit[1]
             #remove extra spaces
-            cleanline = re.sub(r"\s+", " ", cleanline).strip()
-            cleanline = cleanline.replace(' = ', '=')
-
-            if len(cleanline) != 0 and cleanline not in emptylines:
-                cleanlines.append(cleanline)
-        finalstr = ''
-        for line in cleanlines:
-            finalstr += line + '\n'
-        return finalstr
-
-    def reformatLib(lib: str) -> str:
-        #add newlines before commented lines
-        lib = re.sub(r"\* *cell", "\n\n* Cell", lib, flags=re.IGNORECASE)
-        #add newline before .subckt
-        lib = lib.replace(".subckt", "\n.subckt")
-        #add newline before .global
-        lib = lib.replace(".global", "\n.global")
-        return lib
+            cleanline = ' '.join(cleanline.split()).replace(' = ', '=')
+            if len(cleanline) == 0:
+                continue
+            if cleanline[0] == '+' and pending != None:
+                cleanline = cleanline[1:].lstrip()
+                if len(cleanline) != 0:
+                    pending += ' ' + cleanline
+                continue
+            if pending != None:
+                yield pending
+            pending = cleanline
+        if pending != None:
+            yield pending
+
+    def cleanCdl(file) -> str:
+        return ''.join(line + '\n' for line in CoffeLibGeneration.normalizeCdl(file))
+
+    def libraryLines(libin):
+        #yields the lines of a CDL library. A plain file is memory-mapped and the mapped bytes are cut at the
+        #beginning of a line containing '.subckt' about every CDL_REGION_BYTES: only the region being read is
+        #decoded, so memory stays close to the size of the largest cell. Compressed files and stdin are read
+        #line by line instead
+        if not CompressedIO.isPlainFile(libin):
+            with CompressedIO.openInput(libin) as libf:
+                yield from libf
+            return
+        with open(libin, 'rb') as libf:
+            if os.fstat(libf.fileno()).st_size == 0:
+                return
+            with mmap.mmap(libf.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                start = 0
+                found = mm.find(b'.subckt', CDL_REGION_BYTES)
+                while found != -1:
+                    linestart = mm.rfind(b'\n', 0, found) + 1
+                    if linestart > start:
+                        yield from io.StringIO(mm[start:linestart].decode('utf-8', 'replace'), newline=None)
+                        start = linestart
+                    found = mm.find(b'.subckt', max(found + 7, start + CDL_REGION_BYTES))
+                yield from io.StringIO(mm[start:].decode('utf-8', 'replace'), newline=None)
+
+    def iterSubckts(libin):
+        #yields the cleaned text of each subcircuit, i.e. cleanCdl(library).split('.subckt')[1:],
+        #while the library is streamed and only one subcircuit is held in memory at a time
+        pieces = None #text of the subcircuit being completed, None before the first .subckt
+        for line in CoffeLibGeneration.normalizeCdl(CoffeLibGeneration.libraryLines(libin)):
+            if '.subckt' not in line:
+                if pieces != None:
+                    pieces.append(line + '\n')
+                continue
+            parts = (line + '\n').split('.subckt')
+            if pieces != None:
+                pieces.append(parts[0])
+            for part in parts[1:]:
+                if pieces != None:
+                    yield ''.join(pieces)
+                pieces = [part]
+        if pieces != None:
+            yield ''.join(pieces)
+
+    def subcktRecords(libin):
+        #yields the information of each subcircuit of the library (see extractSUBCKTInfo) as it is read
+        for subckt in CoffeLibGeneration.iterSubckts(libin):
+            yield CoffeLibGeneration.extractSUBCKTInfo(subckt)
 
     def filterListForEmptyStr(in_list: list) -> list:
         out_list = []
@@ -143,6 +215,8 @@ class CoffeLibGeneration:
                     cinfo['l'] = spl.split('=')[-1]
                 elif('w=' in str.lower(spl)):
                     cinfo['w'] = spl.split('=')[-1]
+                elif str.lower(spl).startswith('m='): #multiplier
+                    cinfo['m'] = spl.split('=')[-1]
                 else:
                     cinfo['misc'].append(spl)
             info['components'].append(cinfo)
@@ -156,7 +230,8 @@ class CoffeLibGeneration:
                 comp['type'] = 'nmos'
         return cktinfo
 
-    def makeNewCDL(cktinfo:dict, vdd: str, vss: str) -> str:
+    def makeNewCDL(cktinfo:dict, vdd: str, vss: str, sizes=None) -> str:
+        #sizes : (W, L, multiplier) of each component (see DeviceTable.sizes), written instead of the parameters
         final = ''
         final += "******************************************************************************************\n"
         final += "* "+ cktinfo['name'] +" \n"
@@ -166,52 +241,80 @@ class CoffeLibGeneration:
             subcktports += port + ' '
         subcktdef = '.subckt ' + cktinfo['name'] + ' ' + subcktports + '\n'
         final += subcktdef
-        for c in cktinfo['components']:
+        for i, c in enumerate(cktinfo['components']):
+            w, l, m = sizes[i] if sizes != None else (None, None, None)
             cs = c['name'] + ' '
             portstr = ''
             for port in c['connections']:
                 portstr += port + ' '
             cs += portstr
             cs += c['type'] + ' '
-            cs += 'l=gate_length'
-            if c['type'] == 'nmos':
-                cs += ' w=Wn'
-            elif c['type'] == 'pmos':
-                cs += ' w=Wp'
+            cs += 'l=' + (l or 'gate_length')
+            if c['type'] in DEFAULT_WIDTHS:
+                cs += ' w=' + (w or DEFAULT_WIDTHS[c['type']])
+            if m != None:
+                cs += ' m=' + m
             final+= cs + '\n'
         final += '\n.ends\n\n .global ' + vdd + ' ' + vss + '\n'
         return final
 
-    def makeGenerateMethod(cktinfo:dict, wn='45n', wp='45n', vdd='vdd', vss='vss') -> str:
+    def makeGenerateMethod(cktinfo:dict, wn='45n', wp='45n', vdd='vdd', vss='vss', sizes=None) -> str:
         final = ''
         title = 'def ' + cktinfo['name'] + '_generate(filename, use_finfet):\n'
         final += title
         final += '\tspice_file = open(filename, "a")\n\n'
-        final += '\tspice_file.write("******************************************************************************************\\n")\n'
+        final += '\tspice_file.write("' + CELL_SEPARATOR + '\\n")\n'
         final += '\tspice_file.write("*' + cktinfo['name'] + '\\n")\n'
-        final += '\tspice_file.write("******************************************************************************************\\n")\n'
+        final += '\tspice_file.write("' + CELL_SEPARATOR + '\\n")\n'
         subcktports = ''
         for port in cktinfo['ports']:
             subcktports += port + ' '
         subcktdef = '\tspice_file.write(".SUBCKT ' + cktinfo['name'] + ' ' + subcktports +vdd+' '+vss+' Wn=' + wn +' Wp=' + wp + '\\n")\n'
         final += subcktdef
-        for c in cktinfo['components']:
-            cs = c['name'] + ' '
-            portstr = ''
-            for port in c['connections']:
-                portstr += port + ' '
-            cs += portstr
-            cs += c['type'] + ' '
-            cs += 'L=gate_length'
-            if c['type'] == 'nmos':
-                cs += ' W=Wn AS=Wn*trans_diffusion_length AD=Wn*trans_diffusion_length PS=Wn+2*trans_diffusion_length PD=Wn+2*trans_diffusion_length'
-            elif c['type'] == 'pmos':
-                cs += ' W=Wp AS=Wp*trans_diffusion_length AD=Wp*trans_diffusion_length PS=Wp+2*trans_diffusion_length PD=Wp+2*trans_diffusion_length'
+        for i, c in enumerate(cktinfo['components']):
+            cs = CoffeLibGeneration.generateDeviceLine(c, sizes[i] if sizes != None else None)
             final+='\tspice_file.write("' + cs + '\\n")\n'
         final += '\tspice_file.write(".ENDS\\n")\n'
         final += '\n\tspice_file.close()'
         return final
 
+    def generateDeviceLine(c: dict, size=None) -> str:
+        #SPICE line of a component in the COFFE code. size : (W, L, multiplier) texts, None for the parameters
+        w, l, m = size if size != None else (None, None, None)
+        cs = c['name'] + ' '
+        for port in c['connections']:
+            cs += port + ' '
+        cs += c['type'] + ' '
+        cs += 'L=' + (l or 'gate_length')
+        if c['type'] in DEFAULT_WIDTHS:
+            cs += MOS_PARAMS.format(w=w or DEFAULT_WIDTHS[c['type']])
+        if m != None:
+            cs += ' M=' + m
+        return cs
+
+    def makeCoffeTable(cktinfos: list, wn='45n', wp='45n', vdd='vdd', vss='vss', sizes=None) -> str:
+        #table layout of the COFFE python file: one literal string per cell, its name, ports and devices
+        #('name connections type') separated by tabs, and one writer emitting them with the same text as
+        #the functions layout. A tuple of strings compiles much faster than nested tuples or functions.
+        #sizes : sizes of the components of each cell (see DeviceTable.sizes), the devices are then whole lines
+        final = '#COFFE cell library : generate_all(filename) or write_cells(filename, [cell names]) appends the cells\n'
+        final += '#to filename, the <cell>_generate(filename, use_finfet) functions are kept for compatibility\n\n'
+        final += 'CELL_SEPARATOR = ' + repr(CELL_SEPARATOR) + '\n'
+        final += 'SUBCKT_PARAMS = ' + repr(vdd + ' ' + vss + ' Wn=' + wn + ' Wp=' + wp) + '\n'
+        final += 'NMOS_PARAMS = ' + repr(NMOS_PARAMS) + '\n'
+        final += 'PMOS_PARAMS = ' + repr(PMOS_PARAMS) + '\n'
+        final += 'SIZED = ' + repr(sizes != None) + '\n\n'
+        final += 'CELL_LINES = (\n'
+        for k, cktinfo in enumerate(cktinfos):
+            fields = [cktinfo['name'], ' '.join(cktinfo['ports'])]
+            if sizes != None:
+                fields += [CoffeLibGeneration.generateDeviceLine(c, size) for c, size in zip(cktinfo['components'], sizes[k])]
+            else:
+                fields += [' '.join([c['name']] + c['connections'] + [c['type']]) for c in cktinfo['components']]
+            final += repr('\t'.join(fields)) + ',\n'
+        final += ')\n'
+        return final + COFFE_TABLE_WRITER
+
     def extract_gate_name(gate_string):
         # Regular expression to match the gate name and preserve the number of inputs
         #find last X
@@ -232,133 +335,39 @@ class CoffeLibGeneration:
             # If the format doesn't match, return None or an error message
             return None
 
-    def isItVdd(name:str) -> bool:
-        if 'vdd' in name.lower():
-            return True
-        return False
-
-    def isItGnd(name:str) -> bool:
-        if 'gnd' in name.lower():
-            return True
-        if 'ground' in name.lower():
-            return True
-        return False
-
-    def isItVss(name:str) -> bool:
-        if 'vss' in name.lower():
-            return True
-        return False
-
-    def findVssInComponents(coms: list) -> list:
-        vss = []
-        for c in coms: #loop through components
-            for connection in c['connections']:
-                if 'vss' in connection.lower():
-                    vss.append(connection)
-        return vss
-
-    def findVddInComponents(coms: list) -> list:
-        vdd = []
-        for c in coms: #loop through components
-            for connection in c['connections']:
-                if 'vdd' in connection.lower():
-                    vdd.append(connection)
-        return vdd
-
-    def findGndInComponents(coms: list) -> list:
-        gnd = []
-        for c in coms: #loop through components
-            for connection in c['connections']:
-                if 'gnd' in connection.lower():
-                    gnd.append(connection)
-        return gnd
-
-    def replaceVddInComponents(coms: list, newvdd:str) -> None:
-        for c in coms:
-            newconnections = []
-            for connection in c['connections']:
-                if 'vdd' in connection.lower():
-                    newconnections.append(newvdd)
-                else:
-                    newconnections.append(connection)
-            c['connections'] = newconnections
-
-    def replaceVssInComponents(coms: list, newvdd:str) -> None:
-        for c in coms:
-            newconnections = []
-            for connection in c['connections']:
-                if 'vss' in connection.lower():
-                    newconnections.append(newvdd)
-                else:
-                    newconnections.append(connection)
-            c['connections'] = newconnections
-
-    def replaceGndInComponents(coms: list, newgnd:str) -> None:
-        for c in coms:
-            newconnections = []
-            for connection in c['connections']:
-                if 'gnd' in connection.lower():
-                    newconnections.append(newgnd)
-                else:
-                    newconnections.append(connection)
-            c['connections'] = newconnections
-
-    def correct_vdd_vss(cktinfo:dict, newvdd='VDD', newvss='VSS', gnd_is_Vss=True, vddvss_is_global=True):
+    def correct_vdd_vss(cktinfo:dict, newvdd='VDD', newvss='VSS', gnd_is_Vss=True, vddvss_is_global=True, power=None):
+        #renames the supply nets of the ports and components to newvdd and newvss in one pass.
+        #power : PowerNets classifying the nets (see powerNets.py), shared by the cells of a library
+        #so that every distinct net name is classified once. The default rules when None
+        if power == None:
+            power = PowerNets(gnd_is_vss=gnd_is_Vss)
+        classify = power.classify
         cktinfo['old_ports'] = cktinfo['ports']
-        #detect if vdd and vss exist in ports
-        vddexist = False
-        vdds = []
-        vssexist = False
-        vsss = []
+        rename = {'vdd': newvdd, 'vss': newvss}
+        found = {'vdd': {}, 'vss': {}} #original supply nets of each rail, in order of appearance
         finports = [] #collection of final ports. Will not include vdd and vss.
         for port in cktinfo['ports']:
-            if CoffeLibGeneration.isItVss(port):
-                vssexist = True
-                vsss.append(port)
-            elif CoffeLibGeneration.isItVdd(port):
-                vddexist = True
-                vdds.append(port)
-            elif CoffeLibGeneration.isItGnd(port):
-                if gnd_is_Vss:
-                    vssexist = True
-                    vsss.append(port)
-                else:
-                    vddexist = True
-                    vdds.append(port)
-            else:
+            rail = classify(port)
+            if rail == None:
                 finports.append(port)
+            else:
+                found[rail][port] = None
         if not vddvss_is_global:
             finports.append(newvdd)
             finports.append(newvss)
         #redo the ports
         cktinfo['ports'] = finports
 
-        #go through the components and find other VDD and VSS references. Add them to vdds and vsss lists.
-        vdd2 = CoffeLibGeneration.findVddInComponents(cktinfo['components'])
-        vss2 = CoffeLibGeneration.findVssInComponents(cktinfo['components'])
-        gnd2 = CoffeLibGeneration.findGndInComponents(cktinfo['components'])
-        for vdd in vdd2:
-            if vdd not in vdds:
-                vdds.append(vdd)
-        for vss in vss2:
-            if vss not in vsss:
-                vsss.append(vss)
-        for gnd in gnd2:
-            if gnd_is_Vss:
-                if gnd not in vsss:
-                    vsss.append(gnd)
-            else:
-                if gnd not in vdds:
-                    vdds.append(gnd)
-        #loop through components and replace vdd, vss, and gnd
-        CoffeLibGeneration.replaceVddInComponents(cktinfo['components'], newvdd)
-        CoffeLibGeneration.replaceVssInComponents(cktinfo['components'], newvss)
-        if gnd_is_Vss:
-            CoffeLibGeneration.replaceGndInComponents(cktinfo['components'], newvss)
-        else:
-            CoffeLibGeneration.replaceGndInComponents(cktinfo['components'], newvdd)
+        #go through the components, record their other vdd and vss references and replace them
+        for c in cktinfo['components']:
+            connections = c['connections']
+            for i, connection in enumerate(connections):
+                rail = classify(connection)
+                if rail != None:
+                    found[rail][connection] = None
+                    connections[i] = rename[rail]
         # add the translation info to the circuit info
-        cktinfo['vddvss_translation'] = {newvdd : vdds, newvss: vsss}
+        cktinfo['vddvss_translation'] = {newvdd : list(found['vdd']), newvss: list(found['vss'])}
 
     def removeUnusedPorts(cktinfo:dict):
         unused_ports = cktinfo['ports'].copy()
@@ -369,7 +378,7 @@ class CoffeLibGeneration:
         cktinfo['unused_ports'] = unused_ports
         for unused in unused_ports:
             cktinfo['ports'].remove(unused)
-        print('subcircuit: ' + cktinfo['name'] + ' unused ports: ' + str(unused_ports))
+        FlowLog.debug('subcircuit: ' + cktinfo['name'] + ' unused ports: ' + str(unused_ports))
         return
 
     def arePortsTheSame(ports1: list, ports2: list):
@@ -380,127 +389,265 @@ class CoffeLibGeneration:
                 return False
         return True
 
-    def generate_libgeneration_for_COFFE(libin, out, newlib, pmosname, nmosname, newvdd, newvss, groundisvss) -> None:
-        libf = open(libin)
-        # spf = open(spin)
-
-        lintedlib = CoffeLibGeneration.cleanCdl(libf)
-        reformatted= CoffeLibGeneration.reformatLib(lintedlib)
-        cellnames = CoffeLibGeneration.extractCellNames(reformatted)
-
-        #now go through and extract information for each subckt
-        subckts = lintedlib.split('.subckt')
-
-        subinfo = []
-        for subckt in subckts[1:]:
-            subinfo.append(CoffeLibGeneration.extractSUBCKTInfo(subckt))
+    def readRules(path):
+        #rules of a json file (retargeting, see DeviceTable.retarget, or supply nets, see PowerNets), None without a file
+        if path == None:
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def write_json(file_path, data, indent=1) -> None:
+        with open(file_path, 'w+') as outfile:
+            json.dump(data, outfile, indent=indent)
+        FlowLog.info(f"JSON saved to {file_path}")
+
+    def generate_libgeneration_for_COFFE(libin, out, newlib, pmosname, nmosname, newvdd, newvss, groundisvss, json_files=True,
+                                         use_cache=True, rebuild_cache=False, coffe_format='functions', retarget=None, emit_sizes=False,
+                                         power_nets=None, gates=None) -> dict:
+        #builds the library model and writes the COFFE python file, the new cdl and (optionally) the json files.
+        #With use_cache, the cells unchanged since the previous run with the same parameters are not
+        #recomputed (see cellCache.py). rebuild_cache recomputes every cell and refreshes the cache.
+        #coffe_format : layout of the COFFE python file, one of COFFE_FORMATS
+        #retarget : rules changing the device sizes (see DeviceTable.retarget), emit_sizes : write the sizes
+        #           in the new cdl and the COFFE code instead of the gate_length / Wn / Wp parameters
+        #power_nets : rules naming the supply nets of the library (see powerNets.py), the defaults when None
+        #gates : gate names of basic_circuits.json, to group the cells by name instead of by structure (see groupByName)
+        power = PowerNets(power_nets, gnd_is_vss=groundisvss)
+        cache = None
+        if use_cache:
+            cache = CellCache(libin, (pmosname, nmosname, newvdd, newvss, groundisvss, power.key(), gates), rebuild=rebuild_cache)
+        library = CoffeLibGeneration.buildCoffeLibrary(libin, pmosname, nmosname, newvdd, newvss, groundisvss, cache=cache,
+                                                       coffe_format=coffe_format, retarget=retarget, emit_sizes=emit_sizes,
+                                                       power=power, gates=gates)
+        CoffeLibGeneration.writeCoffeLibrary(library, out, newlib, json_files=json_files)
+        if cache != None:
+            cache.store()
+            FlowMetrics.count('cdl.cache_hits', cache.hits)
+            FlowMetrics.count('cdl.cache_misses', cache.misses)
+        return library
+
+    def writeCoffeLibrary(library: dict, out, newlib, json_files=True) -> None:
+        if json_files:
+            with FlowMetrics.stage('cdl.write_json'):
+                CoffeLibGeneration.write_json('circuit_translation.json', library['circuit_translation'], indent=1)
+                CoffeLibGeneration.write_json('subcircuit_info.json', library['subcircuit_info'], indent=1)
+            FlowMetrics.fileWritten('circuit_translation.json')
+            FlowMetrics.fileWritten('subcircuit_info.json')
+        with FlowMetrics.stage('cdl.write_library'):
+            with open(out, 'w+') as output:
+                output.write(library['coffe_code'])
+            with CompressedIO.openOutput(newlib) as output:
+                output.write(library['cdl'])
+        FlowMetrics.fileWritten(out)
+        FlowMetrics.fileWritten(newlib)
+
+    def matchingGroup(groups: list, key: str, entry: dict, cells):
+        #group of cells (key of its first cell, names) with the same digest that the cell is isomorphic to, or None.
+        #An isomorphism confirmed by a previous run is recorded in the cache entry of the cell
+        for group in groups:
+            first = group[0]
+            if first == key or first in entry['matches']:
+                return group
+            if cells.topology(first).isomorphic(cells.topology(key)):
+                entry['matches'].append(first)
+                return group
+        return None
+
+    def cellEntry(info: dict, digest) -> dict:
+        #cache entry of a cell (see cellCache.py), before its new cell is made
+        return {'name': info['name'], 'ports': info['ports'], 'digest': digest, 'matches': [],
+                'transistors': len(info['components']), 'final': None}
+
+    def uniqueName(name: str, transmap: dict) -> str:
+        if(name in transmap.keys()): #deal with possible overlaps
+            digit=1
+            newname = str(name)+'_'+str(digit)
+            while newname in transmap.keys():
+                digit+=1
+                newname = name+'_'+str(digit)
+            name = newname
+        return name
+
+    def groupByTopology(order: list, cells, cache) -> dict:
+        #new cell name -> original cell names. Structurally identical cells are grouped: same transistor
+        #network and same ports, supply ports included, whatever the drive strength, device order or
+        #internal net names (see cellTopology.py). The cells of a group are all translated to one new cell.
+        #order : [key, cache entry] of every cell in library order, the missing entries are filled in
+        groups = [] #(key of the first cell, names), in library order
+        byShape = {} #(digest, ports) -> groups
+        for cell in order:
+            key, entry = cell
+            if entry == None:
+                entry = cell[1] = CoffeLibGeneration.cellEntry(cells.info(key), cells.topology(key).digest)
+                if cache != None:
+                    cache.put(key, entry)
+            candidates = byShape.setdefault((entry['digest'], tuple(entry['ports'])), [])
+            group = CoffeLibGeneration.matchingGroup(candidates, key, entry, cells)
+            if group == None:
+                group = (key, [])
+                candidates.append(group)
+                groups.append(group)
+            elif group[0] != key:
+                cells.release(key) #only the first cell of a group is compared again
+            group[1].append(entry['name'])
+        FlowMetrics.count('cdl.cells', len(order))
+        if FlowMetrics.enabled():
+            FlowMetrics.count('cdl.transistors', sum(entry['transistors'] for key, entry in order))
+        FlowMetrics.count('cdl.structural_classes', len(groups))
+
+        #name each group after its first cell, without the drive strength
+        transmap = {}
+        for first, names in groups:
+            name = CoffeLibGeneration.extract_gate_name(names[0])
+            if name == None:
+                name = names[0]
+            transmap[CoffeLibGeneration.uniqueName(name, transmap)] = names
+        return transmap
+
+    def groupByName(entries: list, gates: list) -> dict:
+        #new cell name -> original cell names, grouped by name as before the structural grouping: the cells
+        #whose name contains the same gate name (e.g. 'nand', from basic_circuits.json) and with the same
+        #ports are merged, the cells matching no gate name are kept as they are.
+        #entries : cache entries of the cells in library order
+        categories = {'misc': []}
+        for entry in entries:
+            added = False
+            for gate in gates:
+                if gate in entry['name'].lower():
+                    categories.setdefault(gate, []).append(entry)
+                    added = True
+            if not added:
+                categories['misc'].append(entry)
+        transmap = {}
+        for gate, members in categories.items():
+            if gate == 'misc': #no good way to detect redundancies or lack of with misc circuits
+                for entry in members:
+                    transmap[entry['name']] = [entry['name']]
+                continue
+            byPorts = {} #lower case port list -> names
+            for entry in members:
+                byPorts.setdefault(' '.join(port.lower() for port in entry['ports']), []).append(entry['name'])
+            for names in byPorts.values():
+                name = CoffeLibGeneration.extract_gate_name(names[0])
+                if name == None:
+                    name = names[0]
+                transmap[CoffeLibGeneration.uniqueName(name, transmap)] = names
+        return transmap
+
+    def readGates(path):
+        #gate names of a basic_circuits.json file ({"gates": [...]}), None without a file
+        if path == None:
+            return None
+        return CoffeLibGeneration.readRules(path)['gates']
+
+    def buildCoffeLibrary(libin, pmosname, nmosname, newvdd, newvss, groundisvss, cache=None, coffe_format='functions',
+                          retarget=None, emit_sizes=False, power=None, gates=None) -> dict:
+        #in-memory library model:
+        #  circuit_translation : original cell name -> new cell name
+        #  subcircuit_info     : {'subcircuits': [cell information]}
+        #  coffe_code          : text of the python file COFFE uses to generate the library
+        #  cdl                 : text of the new cdl library
+        #  devices             : DeviceTable of the components of the new cells, in the order of subcircuit_info
+        #cache : CellCache giving the results of the cells unchanged since the previous run
+        #coffe_format : 'functions', one generate function per cell, or 'table', the cells as literal tables
+        #               written by one function (see makeCoffeTable)
+        #retarget : rules applied to the device sizes (see DeviceTable.retarget)
+        #emit_sizes : the new cdl and the COFFE code get the sizes of the devices instead of parameters
+        #power : PowerNets telling the supply nets, the default rules with groundisvss when None
+        #gates : gate names grouping the cells by name (see groupByName), None to group them by structure
+        #go through the library one subckt at a time and extract its information. A cell found in the
+        #cache is only parsed when a step it has not been through before needs it
+        if power == None:
+            power = PowerNets(gnd_is_vss=groundisvss)
+        cells = CellSource(pmosname, nmosname, power)
+        order = [] #[key, cache entry] of every cell, in library order. The entry is None until computed
+        with FlowMetrics.stage('cdl.extract'):
+            for text in CoffeLibGeneration.iterSubckts(libin):
+                key = cache.cellKey(text) if cache != None else str(len(order))
+                entry = cache.get(key) if cache != None else None
+                cells.add(key, text)
+                if entry == None:
+                    cells.info(key)
+                order.append([key, entry])
+        FlowMetrics.fileRead(libin)
 
         if DEBUG_OUTPUT:
             wrapper = {}
-            wrapper['subcircuits'] = subinfo
+            wrapper['subcircuits'] = list(cells.infos.values())
             with open('temp1.json', 'w+') as outfile:
                 json.dump(wrapper, outfile)
 
-        #go through and capitalize all names
-        for subckt in subinfo:
-            subckt['name'] = subckt['name'].upper()
-
-        #go through and replace pmos and nmos names
-        newsubinfo = []
-        for subckt in subinfo:
-            newinfo = CoffeLibGeneration.replaceNmosPmos(subckt, pmosname=pmosname, nmosname=nmosname)
-            newsubinfo.append(newinfo)
-
-        #go through the various gates and categorize them
-        gatefile = open('basic_circuits.json')
-        basicgates = json.load(gatefile)
-        categorizedCircuits = {'misc': []}
-        for subckt in newsubinfo:
-            added = False
-            minInfo = {}
-            minInfo['name'] = subckt['name']
-            minInfo['ports'] = subckt['ports']
-            for gate in basicgates['gates']:
-                if gate in subckt['name'].lower():
-                    if gate in categorizedCircuits.keys():
-                        categorizedCircuits[gate].append(minInfo)
-                    else:
-                        categorizedCircuits[gate] = []
-                        categorizedCircuits[gate].append(minInfo)
-                    added = True
-            if not added:
-                categorizedCircuits['misc'].append(minInfo)
-
-        #use the categorized information to remove redundant gates (any gates that have the same category and ports)
-        transmap = {}
-        for key in categorizedCircuits.keys():
-            if key != 'misc':
-                sublist = categorizedCircuits[key]
-                #create a list of unique ports
-                uPort = {}
-                for sub in sublist:
-                    portstr = ''
-                    for port in sub['ports']:
-                        portstr += port.lower() + ' '
-                    if portstr not in uPort.keys():
-                        uPort[portstr] = [sub['name']]
-                    else:
-                        uPort[portstr].append(sub['name'])
-
-                #loop through the uPort and create a mapping of old circuits to new circuits
-                for key in uPort.keys():
-                    name = CoffeLibGeneration.extract_gate_name(uPort[key][0])
-                    if name != None:
-                        if(name in transmap.keys()): #deal with possible overlaps
-                            digit=1
-                            # print(name)
-                            newname = str(name)+'_'+str(digit)
-                            while newname in transmap.keys():
-                                digit+=1
-                                newname = name+'_'+str(digit)
-                            name = newname
-                        transmap[name] = uPort[key]
-                    else:
-                        print('got None as name for ' + str(key) + str(uPort[key]))
-                        transmap[uPort[key][0]] = [uPort[key]]
-            else:
-                #no good way to detect redundancies or lack of with misc circuits
-                for sub in categorizedCircuits[key]:
-                    transmap[sub['name']] = [sub['name']]
+        laps = FlowMetrics.laps()
+        if gates != None:
+            #grouping of basic_circuits.json: by gate name and ports, see groupByName
+            for cell in order:
+                key, entry = cell
+                if entry == None:
+                    entry = cell[1] = CoffeLibGeneration.cellEntry(cells.info(key), None)
+                    if cache != None:
+                        cache.put(key, entry)
+            transmap = CoffeLibGeneration.groupByName([entry for key, entry in order], gates)
+            FlowMetrics.count('cdl.cells', len(order))
+        else:
+            transmap = CoffeLibGeneration.groupByTopology(order, cells, cache)
 
         #need to invert the map so that the original names can be used as lookups
         finalmap = {}
         for key in transmap.keys():
             for item in transmap[key]:
-                if isinstance(item, list):
-                    print('item is a list, pls fix: ' +str(item) + ' key: ' + key)
-                finalmap[str(item)] = 'njf_' + key
-
-        #now that you have a map, create the map file as a json
-        mapfile = open('circuit_translation.json', 'w+')
-        json.dump(finalmap, mapfile)
-        mapfile.close()
-        CoffeLibGeneration.reformat_json('circuit_translation.json', indent=1)
+                finalmap[item] = 'njf_' + key
 
         #Create minimum collection of subcircuits
-        finalSubs = []
-        finalNames = []
-        for sub in newsubinfo:
-            translatedname = finalmap[sub['name']]
+        finalCells = [] #(key, cache entry, translated name)
+        finalNames = set()
+        for key, entry in order:
+            translatedname = finalmap[entry['name']]
             if translatedname in finalNames:
                 continue
-            else:
-                finalNames.append(translatedname)
-                newsub = sub
-                newsub['name'] = translatedname
-                finalSubs.append(newsub)
+            finalNames.add(translatedname)
+            finalCells.append((key, entry, translatedname))
+
+        laps.lap('cdl.categorize')
+        FlowMetrics.count('cdl.library_cells', len(finalCells))
 
         #rename vss and vdd. Data for translation stored in the circuit information
-        #correct unused ports
-        for sub in finalSubs:
-            CoffeLibGeneration.correct_vdd_vss(sub, newvdd=newvdd, newvss=newvss, gnd_is_Vss=groundisvss)
-            CoffeLibGeneration.removeUnusedPorts(sub)
-            sub['ports_changed'] = not CoffeLibGeneration.arePortsTheSame(sub['ports'], sub['old_ports'])
+        #correct unused ports, then create the generate method and the cdl of the new cell.
+        #A new cell of the cache is reused when its source cell still gets the same name
+        finalSubs = []
+        code = ''
+        cdl = ''
+        methods_to_call = []
+        for key, entry, translatedname in finalCells:
+            final = entry['final']
+            if final == None or final[0] != translatedname:
+                sub = cells.info(key)
+                sub['name'] = translatedname
+                CoffeLibGeneration.correct_vdd_vss(sub, newvdd=newvdd, newvss=newvss, gnd_is_Vss=groundisvss, power=power)
+                CoffeLibGeneration.removeUnusedPorts(sub)
+                sub['ports_changed'] = not CoffeLibGeneration.arePortsTheSame(sub['ports'], sub['old_ports'])
+                final = entry['final'] = (translatedname, sub, CoffeLibGeneration.makeGenerateMethod(sub),
+                                          CoffeLibGeneration.makeNewCDL(sub, newvdd, newvss))
+            finalSubs.append(final[1])
+            code += final[2] + '\n'
+            methods_to_call.append(translatedname + '_generate')
+            cdl += final[3] + '\n'
+
+        laps.lap('cdl.new_cells')
+
+        #device sizes of the new cells, retargeted as a whole
+        devices = DeviceTable.fromCells(finalSubs)
+        if retarget != None:
+            devices.retarget(retarget)
+        sizes = None
+        if emit_sizes:
+            sizes = [devices.sizes(k) for k in range(len(finalSubs))]
+            code = ''
+            cdl = ''
+            for sub, cellSizes in zip(finalSubs, sizes):
+                code += CoffeLibGeneration.makeGenerateMethod(sub, sizes=cellSizes) + '\n'
+                cdl += CoffeLibGeneration.makeNewCDL(sub, newvdd, newvss, sizes=cellSizes) + '\n'
+        FlowMetrics.count('cdl.devices', len(devices))
+        laps.lap('cdl.devices')
 
         #save port translation in a file. Will not be needed in the future. All info already saved in subcircuit information
         if DEBUG_OUTPUT:
@@ -521,33 +668,54 @@ class CoffeLibGeneration:
                 outfile.close()
             CoffeLibGeneration.reformat_json('temp2.json', indent=1)
 
-        #output all stdlib information to a json file
-        wrapper = {}
-        wrapper['subcircuits'] = finalSubs
-        with open('subcircuit_info.json', 'w+') as outfile:
-            json.dump(wrapper, outfile)
-            outfile.close()
-        CoffeLibGeneration.reformat_json('subcircuit_info.json', indent=1)
-
         #finally, create the standard library file
         #The resulting python methods should each generate the subcircuits
-        code = ''
-        cdl = ''
-        methods_to_call = []
-        for sub in finalSubs:
-            code += CoffeLibGeneration.makeGenerateMethod(sub) + '\n'
-            methods_to_call.append(sub['name'] + '_generate')
-            cdl += CoffeLibGeneration.makeNewCDL(sub, newvdd, newvss) + '\n'
-        code += '\n\ndef generate_all(filename):\n'
-        for method in methods_to_call:
-            code += '\t' + method + '(filename, use_finfet=False)\n'
-
-        output = open(out, 'w+')
-        output.write(code)
-        output.close
-        output = open(newlib, 'w+')
-        output.write(cdl)
-        output.close
+        if coffe_format == 'table':
+            code = CoffeLibGeneration.makeCoffeTable(finalSubs, sizes=sizes)
+        else:
+            code += '\n\ndef generate_all(filename):\n'
+            for method in methods_to_call:
+                code += '\t' + method + '(filename, use_finfet=False)\n'
+        laps.end('cdl.codegen')
+
+        return {'circuit_translation': finalmap, 'subcircuit_info': {'subcircuits': finalSubs},
+                'coffe_code': code, 'cdl': cdl, 'devices': devices}
+
+class CellSource:
+    #cells of a library by cache key: their text, and their information and topology once parsed.
+    #Cells are parsed on first use, so the cells coming from the cache are only parsed when needed
+    def __init__(self, pmosname, nmosname, power):
+        self.pmosname = pmosname
+        self.nmosname = nmosname
+        self.power = power #PowerNets of the library
+        self.texts = {}
+        self.infos = {}
+        self.topologies = {}
+        self.colours = {} #shared by the topologies, see CellTopology
+
+    def add(self, key: str, text: str) -> None:
+        if key not in self.infos:
+            self.texts[key] = text
+
+    def info(self, key: str) -> dict:
+        #cell information with upper case name and pmos / nmos device types
+        info = self.infos.get(key)
+        if info == None:
+            info = CoffeLibGeneration.extractSUBCKTInfo(self.texts.pop(key))
+            info['name'] = info['name'].upper()
+            info = self.infos[key] = CoffeLibGeneration.replaceNmosPmos(info, pmosname=self.pmosname, nmosname=self.nmosname)
+        return info
+
+    def release(self, key: str) -> None:
+        #the topology of the cell is not needed any more
+        self.topologies.pop(key, None)
+
+    def topology(self, key: str) -> CellTopology:
+        #only valid before the power nets of the cell are corrected
+        topology = self.topologies.get(key)
+        if topology == None:
+            topology = self.topologies[key] = CellTopology(self.info(key), colours=self.colours, power=self.power)
+        return topology
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
@@ -564,6 +732,13 @@ if __name__ == '__main__':
     parser.add_argument('-vdd', '--newvdd')
     parser.add_argument('-vss', '--newvss')
     parser.add_argument('-gvss', '--groundisvss')
+    parser.add_argument('--no-cache', action='store_true', help='do not read or write the cell cache')
+    parser.add_argument('--rebuild-cache', action='store_true', help='recompute every cell and refresh the cache')
+    parser.add_argument('-coffe_format', choices=COFFE_FORMATS, default='functions', help='one generate function per cell, or the cells as tables written by one function')
+    parser.add_argument('-retarget', help='json rules scaling, snapping and clamping the device sizes, which are then written out')
+    parser.add_argument('--emit-sizes', action='store_true', help='write the device sizes instead of the gate_length, Wn and Wp parameters')
+    parser.add_argument('-power_nets', help='json rules (patterns and net names) of the vdd, vss and gnd nets of the library')
+    parser.add_argument('-gates', help='basic_circuits.json : merge the cells by gate name and ports instead of by transistor network')
 
 
     args = parser.parse_args()
@@ -586,4 +761,9 @@ if __name__ == '__main__':
     groundisvss = args.groundisvss
     if groundisvss == None: groundisvss = True
 
-    CoffeLibGeneration.generate_libgeneration_for_COFFE(libin, out, pmosname, nmosname, newvdd, newvss, groundisvss)
\ No newline at end of file
+    CoffeLibGeneration.generate_libgeneration_for_COFFE(libin, out, 'newlib.cdl', pmosname, nmosname, newvdd, newvss, groundisvss,
+                                                        use_cache=not args.no_cache, rebuild_cache=args.rebuild_cache,
+                                                        coffe_format=args.coffe_format, retarget=CoffeLibGeneration.readRules(args.retarget),
+                                                        emit_sizes=args.emit_sizes or args.retarget != None,
+                                                        power_nets=CoffeLibGeneration.readRules(args.power_nets),
+                                                        gates=CoffeLibGeneration.readGates(args.gates))
\ No newline at end of file
@@ -0,0 +1,81 @@
+import hashlib
+import marshal
+import os
+
+from flowLog import FlowLog
+from libraryCache import LibraryCache, DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES
+
+#
+# Per-cell cache of the COFFE library generation
+#
+# Every subcircuit of the source CDL is identified by the hash of its
+# normalized text (see CoffeLibGeneration.iterSubckts) and of the generation
+# parameters (device names, new supplies, gnd is vss). Its entry keeps what
+# the next run can reuse without parsing the cell again: its name, its
+# topology digest (see cellTopology.py), the cells it was found isomorphic to
+# and, for the first cell of a structural class, the finished new cell (cell
+# information, COFFE generate method and CDL text) with the name it got.
+# An edited cell gets a new hash and is the only one recomputed.
+#
+# The entries of a library and parameter set are stored in one marshal file
+# of the library cache directory. Only the entries used by the last run are
+# kept, and the directory is trimmed like the library cache.
+##############################################################################
+
+CELL_CACHE_VERSION = 3
+
+class CellCache:
+    def __init__(self, libin: str, settings: tuple, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES, rebuild=False):
+        #settings : generation parameters, part of the key of every cell
+        if cache_dir == None:
+            cache_dir = os.environ.get('V2S_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.rebuild = rebuild #ignore existing entries, but still write fresh ones
+        self.settings = repr(settings)
+        key = hashlib.sha1(repr((os.path.abspath(libin), self.settings)).encode('utf-8')).hexdigest()
+        self.path = os.path.join(cache_dir, key + '.cells')
+        self.entries = {} #cell key -> entry of the previous run
+        self.used = {} #cell key -> entry of this run, stored by store()
+        self.hits = 0
+        self.misses = 0
+        if not rebuild:
+            self.load()
+
+    def cellKey(self, text: str) -> str:
+        return hashlib.sha1((self.settings + '\n' + text).encode('utf-8')).hexdigest()
+
+    def load(self) -> None:
+        try:
+            with open(self.path, 'rb') as f:
+                version, settings, entries = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return
+        if version == CELL_CACHE_VERSION and settings == self.settings:
+            self.entries = entries
+
+    def get(self, key: str):
+        #entry of a cell ({'name', 'ports', 'digest', 'matches', 'transistors', 'final'}), or None when it has to be computed
+        entry = self.entries.get(key)
+        if entry == None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.used[key] = entry
+        return entry
+
+    def put(self, key: str, entry: dict) -> None:
+        #entries are stored as they are at store() time, later changes included
+        self.used[key] = entry
+
+    def store(self) -> None:
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = self.path + '.' + str(os.getpid()) + '.tmp'
+            with open(tmp, 'wb') as f:
+                marshal.dump((CELL_CACHE_VERSION, self.settings, self.used), f)
+            os.replace(tmp, self.path) #atomic, so concurrent runs never read half an entry
+        except OSError as e:
+            FlowLog.warning('Warning : could not write the cell cache ' + self.path + ' : ' + str(e))
+            return
+        LibraryCache(self.cache_dir, self.max_bytes).trim()
@@ -0,0 +1,164 @@
+import hashlib
+
+from powerNets import PowerNets
+
+#
+# Structural identity of a library cell
+#
+# The transistor network of a cell (as returned by
+# CoffeLibGeneration.extractSUBCKTInfo) is seen as a graph of devices and
+# nets. Ports keep their name (and supply ports their class, vdd or vss),
+# other supply nets are reduced to their class, internal nets are
+# anonymous. Device widths, lengths and names are ignored, and drain and
+# source of a MOS device are interchangeable.
+# Two cells with the same network get the same digest whatever the order of
+# their devices and the names of their internal nets. The digest comes from a
+# Weisfeiler-Lehman colour refinement of the graph, and isomorphic() confirms
+# a match with an exact device by device mapping.
+##############################################################################
+
+MOS_TYPES = frozenset(('nmos', 'pmos'))
+
+class CellTopology:
+    def __init__(self, cktinfo: dict, gnd_is_vss=True, colours=None, power=None):
+        #colours : digest of every label already met, shared by the cells of a library so that
+        #each distinct label is only hashed once
+        #power : PowerNets telling the supply nets, the default rules with gnd_is_vss when None
+        if power == None:
+            power = PowerNets(gnd_is_vss=gnd_is_vss)
+        self.colours = {} if colours == None else colours
+        self.name = cktinfo['name']
+        ports = set(cktinfo['ports'])
+        self.nets = [] #net names, by net index
+        netIndex = {}
+        self.netLabels = []
+        self.devices = [] #(type, terminals as net indexes, terminal roles)
+        for component in cktinfo['components']:
+            terminals = []
+            for net in component['connections']:
+                if net not in netIndex:
+                    netIndex[net] = len(self.nets)
+                    self.nets.append(net)
+                    self.netLabels.append(CellTopology.netLabel(net, net in ports, power))
+                terminals.append(netIndex[net])
+            devtype = component['type'].lower()
+            self.devices.append((devtype, tuple(terminals), CellTopology.roles(devtype, terminals)))
+        #signal ports not connected to any device still belong to the interface
+        self.unconnected = tuple(sorted(port for port in ports if port not in netIndex
+                                        and power.classify(port) == None))
+        #cells listing the same devices in the same order (drive strength variants usually do) are only refined once
+        shape = (tuple(self.devices), tuple(self.netLabels), self.unconnected)
+        refined = self.colours.get(shape)
+        if refined == None:
+            self.refine()
+            self.colours[shape] = (self.netColours, self.devColours, self.digest)
+        else:
+            self.netColours, self.devColours, self.digest = refined
+
+    def netLabel(net: str, isPort: bool, power: PowerNets) -> str:
+        #same classification as CoffeLibGeneration.correct_vdd_vss. A supply port keeps its name,
+        #so that two vdd ports of a cell (e.g. VDD and VDDL) are never swapped
+        supply = power.classify(net)
+        if supply != None:
+            if isPort:
+                return 'supply:' + supply + ':' + net
+            return 'supply:' + supply
+        if isPort:
+            return 'port:' + net
+        return 'net'
+
+    def roles(devtype: str, terminals: tuple) -> tuple:
+        #role of each terminal. MOS: drain, gate, source, bulk with drain and source sharing a role
+        if devtype in MOS_TYPES and len(terminals) == 4:
+            return ('ds', 'g', 'ds', 'b')
+        return tuple(str(i) for i in range(len(terminals)))
+
+    def refine(self) -> None:
+        #colour refinement until the number of net and device classes stops growing
+        netLabels = list(self.netLabels)
+        devLabels = []
+        colours = self.colours
+        classes = -1
+        for _ in range(len(self.nets) + 1):
+            devLabels = []
+            incidence = [[] for _ in self.nets]
+            for devtype, terminals, roles in self.devices:
+                if roles[0] == 'ds': #drain and source unordered
+                    d, g, s, b = terminals
+                    ld, ls = netLabels[d], netLabels[s]
+                    label = (devtype, netLabels[g], netLabels[b]) + ((ld, ls) if ld <= ls else (ls, ld))
+                else:
+                    label = (devtype,) + tuple(netLabels[t] for t in terminals)
+                colour = colours.get(label)
+                if colour == None:
+                    colour = colours[label] = CellTopology.digestOf(label)
+                devLabels.append(colour)
+                for t, role in zip(terminals, roles):
+                    incidence[t].append((colour, role))
+            netLabels = []
+            for n, incident in enumerate(incidence):
+                incident.sort()
+                label = (self.netLabels[n], tuple(incident))
+                colour = colours.get(label)
+                if colour == None:
+                    colour = colours[label] = CellTopology.digestOf(label)
+                netLabels.append(colour)
+            count = len(set(netLabels)) + len(set(devLabels))
+            if count == classes:
+                break
+            classes = count
+        self.netColours = netLabels
+        self.devColours = devLabels
+        self.digest = CellTopology.digestOf((tuple(sorted(devLabels)), tuple(sorted(netLabels)), self.unconnected))
+
+    def digestOf(value) -> str:
+        return hashlib.sha1(repr(value).encode('utf-8')).hexdigest()
+
+    def isomorphic(self, other) -> bool:
+        #exact check: a one to one mapping of devices and nets preserving types, terminals, ports and supplies
+        if (self.digest != other.digest or len(self.devices) != len(other.devices)
+                or len(self.nets) != len(other.nets) or self.unconnected != other.unconnected):
+            return False
+        candidates = {}
+        for k, colour in enumerate(other.devColours):
+            candidates.setdefault(colour, []).append(k)
+        order = sorted(range(len(self.devices)), key=lambda k: len(candidates.get(self.devColours[k], ())))
+        return self.extend(other, order, 0, candidates, {}, {}, set())
+
+    def extend(self, other, order, depth, candidates, netMap, netUsed, devUsed) -> bool:
+        #backtracking over the devices of self (in order), netMap: net of self -> net of other
+        if depth == len(order):
+            return True
+        k = order[depth]
+        devtype, terminals, roles = self.devices[k]
+        for j in candidates.get(self.devColours[k], ()):
+            if j in devUsed:
+                continue
+            otherTerminals = other.devices[j][1]
+            layouts = [otherTerminals]
+            if roles[0] == 'ds': #drain and source swapped
+                layouts.append((otherTerminals[2], otherTerminals[1], otherTerminals[0], otherTerminals[3]))
+            for layout in layouts:
+                added = []
+                if self.bind(other, terminals, layout, netMap, netUsed, added):
+                    devUsed.add(j)
+                    if self.extend(other, order, depth + 1, candidates, netMap, netUsed, devUsed):
+                        return True
+                    devUsed.discard(j)
+                for n in added:
+                    del netUsed[netMap.pop(n)]
+        return False
+
+    def bind(self, other, terminals, layout, netMap, netUsed, added) -> bool:
+        #maps the nets of one device on the nets of the candidate device, recording the new pairs in added
+        for a, b in zip(terminals, layout):
+            if a in netMap:
+                if netMap[a] != b:
+                    return False
+                continue
+            if b in netUsed or self.netLabels[a] != other.netLabels[b] or self.netColours[a] != other.netColours[b]:
+                return False
+            netMap[a] = b
+            netUsed[b] = a
+            added.append(a)
+        return True
@@ -0,0 +1,89 @@
+import bz2
+import gzip
+import io
+import lzma
+import sys
+
+#
+# Transparent compressed streaming I/O
+#
+# Inputs are detected by their magic bytes (gzip, xz, bzip2), outputs by their
+# extension (.gz, .xz, .bz2). '-' stands for stdin / stdout. Everything is
+# streamed through large buffers, nothing is decompressed to disk.
+##############################################################################
+
+BUFFER_SIZE = 1 << 20
+MAGICS = ((b'\x1f\x8b', 'gz'), (b'\xfd7zXZ\x00', 'xz'), (b'BZh', 'bz2'))
+EXTENSIONS = {'.gz': 'gz', '.gzip': 'gz', '.xz': 'xz', '.lzma': 'xz', '.bz2': 'bz2'}
+
+class CompressedIO:
+    def inputFormat(path: str) -> str:
+        #'gz', 'xz', 'bz2' or '' for plain text, from the magic bytes of the file
+        if path == '-':
+            head = sys.__stdin__.buffer.peek(6)[:6]
+        else:
+            with open(path, 'rb') as f:
+                head = f.read(6)
+        for magic, fmt in MAGICS:
+            if head.startswith(magic):
+                return fmt
+        return ''
+
+    def outputFormat(path: str) -> str:
+        for ext, fmt in EXTENSIONS.items():
+            if path.lower().endswith(ext):
+                return fmt
+        return ''
+
+    def isPlainFile(path: str) -> bool:
+        #True for an uncompressed regular file, i.e. one that can be read by byte ranges
+        return path != '-' and CompressedIO.inputFormat(path) == ''
+
+    def openInput(path: str, encoding=None):
+        #text stream over a plain or compressed file, or stdin for '-'
+        if path == '-':
+            raw = open(sys.__stdin__.fileno(), 'rb', buffering=BUFFER_SIZE, closefd=False)
+        else:
+            raw = open(path, 'rb', buffering=BUFFER_SIZE)
+        head = raw.peek(6)[:6]
+        for magic, fmt in MAGICS:
+            if head.startswith(magic):
+                stream = io.BufferedReader(CompressedIO.compressor(fmt, raw, 'rb', None), buffer_size=BUFFER_SIZE)
+                return StackedTextStream(stream, raw, encoding)
+        return io.TextIOWrapper(raw, encoding=encoding)
+
+    def openOutput(path: str, level=None, encoding=None):
+        #text stream writing a plain or compressed (from the extension) file, or stdout for '-'
+        #level is the compression level (gzip/bzip2 1-9, xz preset 0-9)
+        if path == '-':
+            raw = open(sys.__stdout__.fileno(), 'wb', buffering=BUFFER_SIZE, closefd=False)
+            fmt = ''
+        else:
+            raw = open(path, 'wb', buffering=BUFFER_SIZE)
+            fmt = CompressedIO.outputFormat(path)
+        if fmt == '':
+            return io.TextIOWrapper(raw, encoding=encoding)
+        stream = io.BufferedWriter(CompressedIO.compressor(fmt, raw, 'wb', level), buffer_size=BUFFER_SIZE)
+        return StackedTextStream(stream, raw, encoding)
+
+    def compressor(fmt: str, raw, mode: str, level):
+        if fmt == 'gz':
+            return gzip.GzipFile(fileobj=raw, mode=mode, compresslevel=6 if level == None else level)
+        if fmt == 'xz':
+            return lzma.LZMAFile(raw, mode=mode, preset=level if 'w' in mode else None)
+        return bz2.BZ2File(raw, mode=mode, compresslevel=9 if level == None else level)
+
+class StackedTextStream(io.TextIOWrapper):
+    #text stream over a (de)compressor. The compressor does not own the file it reads or
+    #writes, so that file is closed here, after the compressor has written its trailer
+    def __init__(self, stream, raw, encoding=None):
+        super().__init__(stream, encoding=encoding)
+        self.raw_file = raw
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            super().close()
+        finally:
+            self.raw_file.close()
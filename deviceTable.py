@@ -0,0 +1,157 @@
+import math
+import re
+from array import array
+
+from netlistModel import NameTable
+
+try:
+    import numpy
+except ImportError: #the transforms then loop over the columns in Python
+    numpy = None
+
+#
+# Columnar table of the transistors of a library
+#
+# One row per device: cell ID, device type ID, W, L and multiplier, each
+# column an array (W and L in meters, NaN when the CDL gives no number, e.g.
+# a parameter name). The devices of cell k are the rows start[k] to
+# start[k+1]. Sizes can be retargeted for a new node with bulk transforms
+# (scale, snap to a grid, clamp to a range), on the whole library or on some
+# device types. With NumPy installed a transform works on the arrays in
+# place, without NumPy it loops over them.
+##############################################################################
+
+VALUE_RE = re.compile(r'([-+]?(?:\d+\.?\d*|\.\d+)(?:e[-+]?\d+)?)(meg|[tgkmunpfa])?', re.IGNORECASE)
+SCALES = {'t': 1e12, 'g': 1e9, 'meg': 1e6, 'k': 1e3, 'm': 1e-3, 'u': 1e-6, 'n': 1e-9, 'p': 1e-12, 'f': 1e-15, 'a': 1e-18}
+SUFFIXES = (('u', 1e-6), ('n', 1e-9), ('p', 1e-12)) #units of the written sizes, the largest one giving at least 1
+COLUMNS = ('w', 'l')
+RULE_KEYS = ('scale', 'grid', 'min', 'max')
+
+class DeviceTable:
+    def __init__(self):
+        self.cells = [] #cell names, by cell ID
+        self.types = NameTable() #device types
+        self.cell = array('i') #cell ID of each device
+        self.type = array('i') #type ID of each device
+        self.w = array('d')
+        self.l = array('d')
+        self.m = array('d')
+        self.start = array('q', [0])
+
+    def fromCells(cktinfos: list):
+        #table of the components of the cells (see CoffeLibGeneration.extractSUBCKTInfo), in order
+        table = DeviceTable()
+        parse = DeviceTable.parseValue
+        for cktinfo in cktinfos:
+            k = len(table.cells)
+            table.cells.append(cktinfo['name'])
+            for c in cktinfo['components']:
+                table.cell.append(k)
+                table.type.append(table.types.intern(c['type']))
+                table.w.append(parse(c.get('w')))
+                table.l.append(parse(c.get('l')))
+                m = parse(c.get('m'))
+                table.m.append(1.0 if math.isnan(m) else m)
+            table.start.append(len(table.cell))
+        return table
+
+    def parseValue(text) -> float:
+        #SPICE number with its scale suffix ('0.8u', '45n', '1e-7'), NaN when there is none
+        if text == None:
+            return math.nan
+        match = VALUE_RE.match(text) #units after the suffix ('0.1um') are ignored
+        if match == None:
+            return math.nan
+        value = float(match.group(1))
+        if match.group(2) != None:
+            value *= SCALES[match.group(2).lower()]
+        return value
+
+    def formatValue(value: float) -> str:
+        for suffix, scale in SUFFIXES:
+            if abs(value) >= scale:
+                return '%.6g%s' % (value / scale, suffix)
+        return '%.6g' % value
+
+    def __len__(self) -> int:
+        return len(self.cell)
+
+    def rows(self, types=None) -> list:
+        #indexes of the devices of the given type names, all of them for None
+        ids = set(self.types.ids[t] for t in types if t in self.types.ids) if types != None else None
+        return [i for i, t in enumerate(self.type) if ids == None or t in ids]
+
+    def mask(self, types):
+        #NumPy selection of the devices of the given type names, None for all of them
+        if types == None:
+            return None
+        ids = [self.types.ids[t] for t in types if t in self.types.ids]
+        return numpy.isin(numpy.frombuffer(self.type, dtype=numpy.int32), ids)
+
+    def transform(self, column: str, function, vectorized, types=None) -> None:
+        #applies a transform to the W or L of the devices of the given types: vectorized on a
+        #NumPy view of the column when NumPy is there, otherwise function on every value
+        values = getattr(self, column)
+        if numpy != None:
+            view = numpy.frombuffer(values, dtype=numpy.float64)
+            mask = self.mask(types)
+            if mask is None:
+                view[:] = vectorized(view)
+            else:
+                view[mask] = vectorized(view[mask])
+            return
+        for i in (range(len(values)) if types == None else self.rows(types)):
+            values[i] = function(values[i])
+
+    def scale(self, column: str, factor: float, types=None) -> None:
+        self.transform(column, lambda x: x * factor, lambda v: v * factor, types)
+
+    def snap(self, column: str, grid: float, types=None) -> None:
+        #nearest multiple of grid (ties to even, as numpy.round)
+        self.transform(column, lambda x: round(x / grid) * grid if not math.isnan(x) else x,
+                       lambda v: numpy.round(v / grid) * grid, types)
+
+    def clamp(self, column: str, low=None, high=None, types=None) -> None:
+        low = -math.inf if low == None else low
+        high = math.inf if high == None else high
+        self.transform(column, lambda x: min(max(x, low), high) if not math.isnan(x) else x,
+                       lambda v: numpy.clip(v, low, high), types)
+
+    def retarget(self, rules: dict) -> None:
+        #rules : device type (or '*' for every type) -> {'w': {'scale', 'grid', 'min', 'max'}, 'l': {...}}.
+        #Values are numbers or SPICE numbers ('45n'). Per column: scale, then snap, then clamp.
+        #The '*' rules are applied first, then the rules of each type
+        for devtype in sorted(rules, key=lambda t: t != '*'):
+            types = None if devtype == '*' else (devtype,)
+            for column, rule in rules[devtype].items():
+                if column not in COLUMNS:
+                    raise ValueError('unknown size ' + repr(column) + ' in the rules of ' + devtype + ', expected w or l')
+                for key in rule:
+                    if key not in RULE_KEYS:
+                        raise ValueError('unknown rule ' + repr(key) + ' for ' + devtype + ' ' + column)
+                values = {key: DeviceTable.ruleValue(value) for key, value in rule.items()}
+                if 'scale' in values:
+                    self.scale(column, values['scale'], types)
+                if 'grid' in values:
+                    self.snap(column, values['grid'], types)
+                if 'min' in values or 'max' in values:
+                    self.clamp(column, values.get('min'), values.get('max'), types)
+
+    def ruleValue(value) -> float:
+        if isinstance(value, (int, float)):
+            return value
+        parsed = DeviceTable.parseValue(str(value))
+        if math.isnan(parsed):
+            raise ValueError('not a number : ' + repr(value))
+        return parsed
+
+    def sizes(self, k: int) -> list:
+        #(W, L, multiplier) texts of the devices of cell k, None for a size that is not a number
+        #and for a multiplier of 1
+        sizes = []
+        for i in range(self.start[k], self.start[k + 1]):
+            w, l, m = self.w[i], self.l[i], self.m[i]
+            sizes.append((None if math.isnan(w) else DeviceTable.formatValue(w),
+                          None if math.isnan(l) else DeviceTable.formatValue(l),
+                          None if m == 1 else '%g' % m))
+        return sizes
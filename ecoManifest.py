@@ -0,0 +1,77 @@
+import hashlib
+import marshal
+import os
+
+from flowLog import FlowLog
+
+#
+# Sidecar manifest of an incremental (ECO) Verilog to SPICE translation
+#
+# The netlist is cut into content defined chunks (see Verilog2Spice.chunkVerilogFile).
+# For every chunk made only of library cell instances, the manifest keeps the
+# SHA-1 of its Verilog text, the byte span of its SPICE lines in the output
+# and the error counts and diagnostics of its translation. On the next run the
+# chunks found in the manifest are copied from the previous output, only the
+# new or changed ones are parsed and translated again. The manifest is only
+# used when the output file is still the one it describes and the library,
+# power supplies, bus delimiter and netlist transformation are unchanged.
+##############################################################################
+
+MANIFEST_VERSION = 3
+
+class EcoManifest:
+    def __init__(self, out_file: str, settings: str):
+        #settings : key of everything besides the netlist the SPICE lines depend on, see settingsKey
+        self.out_file = out_file
+        self.path = EcoManifest.manifestPath(out_file)
+        self.settings = settings
+        self.chunks = {} #chunk digest -> (offset, length, counts, diagnostics state) in the previous output
+        self.spans = {} #same, for the output being written
+        self.reused = 0
+        self.translated = 0
+
+    def manifestPath(out_file: str) -> str:
+        return out_file + '.eco'
+
+    def settingsKey(*parts) -> str:
+        return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+    def chunkDigest(chunk: bytes) -> bytes:
+        return hashlib.sha1(chunk).digest()
+
+    def load(self) -> bool:
+        #True when the previous output can be reused
+        try:
+            with open(self.path, 'rb') as f:
+                version, settings, size, mtime, chunks = marshal.load(f)
+            st = os.stat(self.out_file)
+        except (OSError, EOFError, ValueError, TypeError):
+            return False
+        if version != MANIFEST_VERSION or settings != self.settings or size != st.st_size or mtime != st.st_mtime_ns:
+            return False
+        self.chunks = chunks
+        return True
+
+    def lookup(self, digest: bytes):
+        #(offset, length, counts, diagnostics state) of the chunk in the previous output, None if it has to be translated
+        span = self.chunks.get(digest)
+        if span == None:
+            self.translated += 1
+        else:
+            self.reused += 1
+        return span
+
+    def record(self, digest: bytes, offset: int, length: int, counts: list, diagnostics: tuple) -> None:
+        #diagnostics : Diagnostics.state() of the chunk translation
+        self.spans[digest] = (offset, length, tuple(counts), diagnostics)
+
+    def store(self) -> None:
+        #call once the new output is closed, its size and mtime are recorded
+        try:
+            st = os.stat(self.out_file)
+            tmp = self.path + '.' + str(os.getpid()) + '.tmp'
+            with open(tmp, 'wb') as f:
+                marshal.dump((MANIFEST_VERSION, self.settings, st.st_size, st.st_mtime_ns, self.spans), f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            FlowLog.warning('Warning : could not write the ECO manifest ' + self.path + ' : ' + str(e))
@@ -0,0 +1,164 @@
+import json
+import sys
+
+#
+# Leveled console output and aggregated diagnostics of the flow
+#
+# FlowLog.error / warning / info / debug print a message when the level set
+# with FlowLog.setLevel allows it (INFO by default, ERROR for a quiet run,
+# DEBUG for the per cell details). Messages go to the current sys.stdout.
+#
+# A Diagnostics collector counts the warnings and errors of a translation by
+# kind (missing pin, unknown cell, ...) and key (e.g. cell and pin). Only the
+# first messages of each kind are printed, the others are only counted, and
+# summary() prints the most frequent keys of each kind at the end. Collectors
+# filled in worker processes or by the chunks of an incremental translation
+# keep their first messages instead of printing them, and are merged into the
+# collector of the run in order.
+##############################################################################
+
+ERROR = 40
+WARNING = 30
+INFO = 20
+DEBUG = 10
+LEVEL_NAMES = {ERROR: 'ERROR', WARNING: 'WARNING', INFO: 'INFO', DEBUG: 'DEBUG'}
+
+LEVEL = INFO #messages below this level are not printed
+MAX_MESSAGES = 10 #default number of messages printed per kind of diagnostic
+SUMMARY_KEYS = 10 #keys listed per kind of diagnostic in the summary
+
+class FlowLog:
+    def setLevel(level: int) -> None:
+        global LEVEL
+        LEVEL = level
+
+    def level() -> int:
+        return LEVEL
+
+    def enabled(level: int) -> bool:
+        return level >= LEVEL
+
+    def log(level: int, message: str) -> None:
+        if level >= LEVEL:
+            sys.stdout.write(message + '\n')
+
+    def error(message: str) -> None:
+        FlowLog.log(ERROR, message)
+
+    def warning(message: str) -> None:
+        FlowLog.log(WARNING, message)
+
+    def info(message: str) -> None:
+        FlowLog.log(INFO, message)
+
+    def debug(message: str) -> None:
+        FlowLog.log(DEBUG, message)
+
+    def levelFromArgs(quiet: bool, verbose: bool) -> int:
+        #level of the --quiet / --verbose command line options
+        if quiet:
+            return ERROR
+        if verbose:
+            return DEBUG
+        return INFO
+
+class Diagnostics:
+    def __init__(self, limit=MAX_MESSAGES, echo=True):
+        #limit : messages printed (or kept) per kind. echo : print them, otherwise they are kept for merge()
+        self.limit = limit
+        self.echo = echo
+        self.counts = {} #(level, kind) -> {key: occurrences}
+        self.shown = {} #kind -> messages printed or kept
+        self.messages = [] #kept messages (level, kind, message), when not echoed
+        self.silenced = set() #kinds whose messages are only counted from now on
+
+    def note(self, level: int, kind: str, key: tuple) -> bool:
+        #counts one occurrence, True when its message is to be given to show(). Lets the caller
+        #skip building the messages that are only counted
+        keys = self.counts.get((level, kind))
+        if keys == None:
+            keys = self.counts[(level, kind)] = {}
+        keys[key] = keys.get(key, 0) + 1
+        return self.keeps(level, kind)
+
+    def keeps(self, level: int, kind: str) -> bool:
+        #True while messages of this kind are printed (or kept). Says once when they stop being printed
+        if self.echo and level < LEVEL:
+            return False
+        if self.shown.get(kind, 0) < self.limit:
+            return True
+        if self.echo and kind not in self.silenced:
+            self.silenced.add(kind)
+            FlowLog.log(level, '... further ' + kind + ' messages are only counted, see the summary')
+        return False
+
+    def show(self, level: int, kind: str, message: str) -> None:
+        self.shown[kind] = self.shown.get(kind, 0) + 1
+        if self.echo:
+            FlowLog.log(level, message)
+        else:
+            self.messages.append((level, kind, message))
+
+    def warning(self, kind: str, key: tuple, message: str) -> None:
+        if self.note(WARNING, kind, key):
+            self.show(WARNING, kind, message)
+
+    def error(self, kind: str, key: tuple, message: str) -> None:
+        if self.note(ERROR, kind, key):
+            self.show(ERROR, kind, message)
+
+    def merge(self, other) -> None:
+        #adds the counts and the kept messages of another collector, as if they had been reported here
+        for level, kind, message in other.messages:
+            if self.keeps(level, kind):
+                self.show(level, kind, message)
+        for (level, kind), keys in other.counts.items():
+            mine = self.counts.get((level, kind))
+            if mine == None:
+                mine = self.counts[(level, kind)] = {}
+            for key, n in keys.items():
+                mine[key] = mine.get(key, 0) + n
+            if sum(keys.values()) > other.shown.get(kind, 0): #some were only counted over there
+                self.keeps(level, kind)
+
+    def state(self) -> tuple:
+        #counts and kept messages as plain data (marshal, pickle), see fromState
+        return (self.counts, tuple(self.messages))
+
+    def fromState(state: tuple, limit=MAX_MESSAGES):
+        diagnostics = Diagnostics(limit, echo=False)
+        counts, messages = state
+        diagnostics.counts = {name: dict(keys) for name, keys in counts.items()}
+        diagnostics.messages = list(messages)
+        return diagnostics
+
+    def total(self, level: int) -> int:
+        return sum(sum(keys.values()) for (lvl, kind), keys in self.counts.items() if lvl == level)
+
+    def summary(self) -> None:
+        #table of the diagnostics, the most frequent keys of each kind first
+        if not self.counts or not FlowLog.enabled(WARNING):
+            return
+        FlowLog.warning('\nDiagnostics summary :')
+        FlowLog.warning('  %-8s %-20s %10s  %s' % ('level', 'kind', 'count', 'most frequent keys'))
+        for (level, kind), keys in sorted(self.counts.items(), key=lambda item: (-item[0][0], item[0][1])):
+            top = sorted(keys.items(), key=lambda item: (-item[1], item[0]))
+            listed = ', '.join('/'.join(key) + ' (' + str(n) + ')' for key, n in top[:SUMMARY_KEYS])
+            if len(top) > SUMMARY_KEYS:
+                listed += ', ... ' + str(len(top) - SUMMARY_KEYS) + ' more'
+            FlowLog.warning('  %-8s %-20s %10d  %s' % (LEVEL_NAMES[level], kind, sum(keys.values()), listed))
+        FlowLog.warning('')
+
+    def report(self) -> dict:
+        entries = []
+        for (level, kind), keys in self.counts.items():
+            for key, n in keys.items():
+                entries.append({'level': LEVEL_NAMES[level], 'kind': kind, 'key': list(key), 'count': n})
+        entries.sort(key=lambda entry: (entry['level'], entry['kind'], -entry['count'], entry['key']))
+        return {'errors': self.total(ERROR), 'warnings': self.total(WARNING), 'diagnostics': entries}
+
+    def write(self, path: str) -> None:
+        #writes the counts as JSON
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=1)
+        FlowLog.info('Diagnostics saved to ' + path)
@@ -0,0 +1,168 @@
+import json
+import os
+import time
+import tracemalloc
+
+from flowLog import FlowLog
+
+#
+# Per-stage instrumentation of the flow
+#
+# Stages are timed with FlowMetrics.stage(name) (a context manager), or with
+# FlowMetrics.laps() for the successive steps of one long function, counters
+# are added with FlowMetrics.count(name, n) and file sizes with
+# FlowMetrics.fileRead / fileWritten. Nothing is recorded until
+# FlowMetrics.enable() is called: the calls then return at once, and they
+# are only placed around whole stages, never inside per-line loops.
+#
+# For each stage the report gives the number of calls, the wall and CPU time
+# (this process only, not the worker processes) and, when enabled with
+# trace_memory, the tracemalloc peak. Stages can be nested, the time of an
+# inner stage is included in the outer one.
+##############################################################################
+
+ACTIVE = None #MetricsCollector while the metrics are enabled
+
+class MetricsCollector:
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = {} #name -> {'calls', 'wall_s', 'cpu_s', 'peak_bytes'}
+        self.counters = {}
+        self.bytes_read = {} #path -> bytes
+        self.bytes_written = {}
+        #tracemalloc keeps a single peak, reset when a stage starts. Per open stage: [peak of the stage
+        #around it before it started, highest peak of its inner stages already closed]
+        self.peaks = []
+        self.peak = 0 #highest peak before the last reset outside of any stage
+        self.start = time.perf_counter()
+        self.start_cpu = time.process_time()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def enter(self) -> tuple:
+        if self.trace_memory:
+            self.peaks.append([tracemalloc.get_traced_memory()[1], 0])
+            tracemalloc.reset_peak()
+        return time.perf_counter(), time.process_time()
+
+    def leave(self, name: str, started: tuple) -> None:
+        wall = time.perf_counter() - started[0]
+        cpu = time.process_time() - started[1]
+        entry = self.stages.get(name)
+        if entry == None:
+            entry = self.stages[name] = {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0}
+        entry['calls'] += 1
+        entry['wall_s'] += wall
+        entry['cpu_s'] += cpu
+        if self.trace_memory:
+            before, inner = self.peaks.pop()
+            peak = max(tracemalloc.get_traced_memory()[1], inner)
+            entry['peak_bytes'] = max(entry.get('peak_bytes', 0), peak)
+            if self.peaks: #the peak of this stage also counts for the stage around it
+                self.peaks[-1][1] = max(self.peaks[-1][1], before, peak)
+            else:
+                self.peak = max(self.peak, before, peak)
+
+    def report(self) -> dict:
+        report = {'wall_s': time.perf_counter() - self.start, 'cpu_s': time.process_time() - self.start_cpu,
+                  'stages': self.stages, 'counters': self.counters,
+                  'bytes_read': sum(self.bytes_read.values()), 'bytes_written': sum(self.bytes_written.values()),
+                  'files_read': self.bytes_read, 'files_written': self.bytes_written}
+        if self.trace_memory:
+            report['peak_bytes'] = max([self.peak, tracemalloc.get_traced_memory()[1]] + [max(p) for p in self.peaks])
+        return report
+
+class Stage:
+    __slots__ = ('name', 'started')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.started = ACTIVE.enter()
+        return self
+
+    def __exit__(self, *exc):
+        ACTIVE.leave(self.name, self.started)
+        return False
+
+class Laps:
+    #times the successive steps of a function: lap(name) closes the step started by the
+    #previous lap (or by FlowMetrics.laps()) and starts the next one, end(name) closes the last step
+    __slots__ = ('started',)
+
+    def __init__(self):
+        self.started = ACTIVE.enter()
+
+    def lap(self, name: str) -> None:
+        ACTIVE.leave(name, self.started)
+        self.started = ACTIVE.enter()
+
+    def end(self, name: str) -> None:
+        ACTIVE.leave(name, self.started)
+
+class NoStage:
+    #what FlowMetrics.stage and FlowMetrics.laps return while the metrics are off
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def lap(self, name: str) -> None:
+        pass
+
+    def end(self, name: str) -> None:
+        pass
+
+NO_STAGE = NoStage()
+
+class FlowMetrics:
+    def enable(trace_memory=False) -> MetricsCollector:
+        global ACTIVE
+        ACTIVE = MetricsCollector(trace_memory)
+        return ACTIVE
+
+    def disable() -> None:
+        global ACTIVE
+        if ACTIVE != None and ACTIVE.trace_memory:
+            tracemalloc.stop()
+        ACTIVE = None
+
+    def enabled() -> bool:
+        return ACTIVE != None
+
+    def stage(name: str):
+        if ACTIVE == None:
+            return NO_STAGE
+        return Stage(name)
+
+    def laps():
+        if ACTIVE == None:
+            return NO_STAGE
+        return Laps()
+
+    def count(name: str, n=1) -> None:
+        if ACTIVE == None:
+            return
+        ACTIVE.counters[name] = ACTIVE.counters.get(name, 0) + n
+
+    def fileRead(path: str) -> None:
+        #size on disk (compressed size for a compressed file), nothing for stdin
+        if ACTIVE == None or path == '-':
+            return
+        ACTIVE.bytes_read[path] = os.path.getsize(path)
+
+    def fileWritten(path: str) -> None:
+        #call once the file is closed
+        if ACTIVE == None or path == '-':
+            return
+        ACTIVE.bytes_written[path] = os.path.getsize(path)
+
+    def write(path: str) -> None:
+        #writes the report of the enabled metrics as JSON
+        with open(path, 'w') as f:
+            json.dump(ACTIVE.report(), f, indent=1)
+        FlowLog.info('Metrics saved to ' + path)
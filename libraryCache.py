@@ -0,0 +1,108 @@
+import hashlib
+import marshal
+import os
+
+from flowLog import FlowLog
+
+#
+# Persistent cache of parsed SPICE/CDL libraries
+#
+# Each library gets one entry file in the cache directory. An entry is only
+# reused when the path, size, mtime and content hash of the library all match.
+# Entries are stored with marshal (compact binary, fast to load for lists of
+# strings) and the directory is trimmed to a size cap, least recently used first.
+##############################################################################
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'verilog2spice')
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+CACHE_SUFFIXES = ('.lib', '.cells') #entries of this cache and of the cell cache (see cellCache.py)
+
+class LibraryCache:
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES, rebuild=False):
+        if cache_dir == None:
+            cache_dir = os.environ.get('V2S_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.rebuild = rebuild #ignore existing entries, but still write fresh ones
+        self.hits = 0
+        self.misses = 0
+
+    def fileDigest(path: str) -> str:
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def entryPath(self, path: str) -> str:
+        key = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key + '.lib')
+
+    def load(self, path: str):
+        #returns the cached parse result of a library, or None if there is no valid entry
+        if self.rebuild:
+            self.misses += 1
+            return None
+        entry = self.entryPath(path)
+        try:
+            with open(entry, 'rb') as f:
+                version, abspath, size, mtime, digest, data = marshal.load(f)
+            st = os.stat(path)
+        except (OSError, EOFError, ValueError, TypeError):
+            self.misses += 1
+            return None
+        if (version != CACHE_VERSION or abspath != os.path.abspath(path) or size != st.st_size
+                or mtime != st.st_mtime_ns or digest != LibraryCache.fileDigest(path)):
+            self.misses += 1
+            return None
+        os.utime(entry) #mark as recently used
+        self.hits += 1
+        return data
+
+    def store(self, path: str, data) -> None:
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            st = os.stat(path)
+            record = (CACHE_VERSION, os.path.abspath(path), st.st_size, st.st_mtime_ns,
+                      LibraryCache.fileDigest(path), data)
+            entry = self.entryPath(path)
+            tmp = entry + '.' + str(os.getpid()) + '.tmp'
+            with open(tmp, 'wb') as f:
+                marshal.dump(record, f)
+            os.replace(tmp, entry) #atomic, so concurrent runs never read half an entry
+        except OSError as e:
+            FlowLog.warning('Warning : could not write the library cache entry for ' + path + ' : ' + str(e))
+            return
+        self.trim()
+
+    def trim(self) -> None:
+        #drop the least recently used entries until the cache fits in max_bytes
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(CACHE_SUFFIXES):
+                continue
+            full = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(full)
+            except OSError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, full))
+            total += st.st_size
+        entries.sort()
+        for mtime, size, full in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(full)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self) -> None:
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(CACHE_SUFFIXES):
+                os.remove(os.path.join(self.cache_dir, name))
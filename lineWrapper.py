@@ -0,0 +1,36 @@
+#
+# Line wrapping shared by the translated Verilog netlist and the SPICE netlist
+#
+# A line longer than the width is cut at the last space before the width, the
+# rest goes on the next line behind a prefix (nothing for Verilog, '+ ' for
+# SPICE continuation lines). Every cut only looks back over one line width and
+# the rest of the line is never copied, so wrapping is linear in the length of
+# the line. A token longer than the width is kept whole on an over long line.
+##############################################################################
+
+SPICE_CONTINUATION = '+ '
+
+class LineWrapper:
+    def wrap(line: str, width: int, min_length=0, prefix='') -> list:
+        #parts of line, each at most width long when it can be cut. Lines up to min_length are never cut
+        parts = []
+        pos = 0 #start of the current part in line
+        lead = '' #prefix of the current part
+        while len(line) - pos + len(lead) > max(width, min_length):
+            #a cut leaves at least 2 characters of line in the part
+            cut = line.rfind(' ', pos + 2, pos + width - len(lead) + 1)
+            if cut == -1:
+                break
+            parts.append(lead + line[pos:cut])
+            pos = cut + 1
+            lead = prefix
+        parts.append(lead + line[pos:])
+        return parts
+
+    def spiceLine(nodes: list, width: int) -> str:
+        #SPICE line of the nodes (instance name, pins, cell name) with its end of line, '+' continuation
+        #lines once it gets longer than width. No wrapping when width is 0
+        line = ' '.join(nodes)
+        if width and len(line) > width:
+            line = '\n'.join(LineWrapper.wrap(line, width, prefix=SPICE_CONTINUATION))
+        return line + '\n'
@@ -0,0 +1,165 @@
+from array import array
+
+from verilogParser import Instance
+
+#
+# Compact in-memory netlist
+#
+# Cell types, pin names and net names are interned once into integer IDs.
+# Instances are stored column-wise in arrays: type ID, pin range, pin IDs and
+# net IDs, plus a list of instance names. All the other statements (module
+# header, declarations, ...) are kept as VerilogParser records, in order.
+##############################################################################
+
+class NameTable:
+    #interned strings: one copy of each name, addressed by its integer ID
+    __slots__ = ('ids', 'names')
+
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def intern(self, name: str) -> int:
+        i = self.ids.get(name)
+        if i is None:
+            i = len(self.names)
+            self.ids[name] = i
+            self.names.append(name)
+        return i
+
+    def __getitem__(self, i: int) -> str:
+        return self.names[i]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+class Netlist:
+    __slots__ = ('cells', 'pins', 'nets', 'inst_type', 'inst_name', 'pin_start', 'pin_id', 'net_id', 'order', 'others')
+
+    def __init__(self):
+        self.cells = NameTable()
+        self.pins = NameTable()
+        self.nets = NameTable()
+        self.inst_type = array('i') #cell ID of each instance
+        self.inst_name = [] #name of each instance
+        self.pin_start = array('q', [0]) #pins of instance i are pin_id/net_id[pin_start[i]:pin_start[i+1]]
+        self.pin_id = array('i') #-1 for a positional connection
+        self.net_id = array('i')
+        self.order = array('q') #statement order: >= 0 instance row, < 0 index -1-k in others
+        self.others = [] #records of the statements that are not instances
+
+    def fromStatements(statements):
+        netlist = Netlist()
+        for stmt in statements:
+            netlist.add(stmt)
+        return netlist
+
+    def add(self, stmt) -> None:
+        if not isinstance(stmt, Instance):
+            self.order.append(-1 - len(self.others))
+            self.others.append(stmt)
+            return
+        self.order.append(len(self.inst_name))
+        self.inst_type.append(self.cells.intern(stmt.type))
+        self.inst_name.append(stmt.name)
+        for pin, net in stmt.pins:
+            self.pin_id.append(-1 if pin is None else self.pins.intern(pin))
+            self.net_id.append(self.nets.intern(net))
+        self.pin_start.append(len(self.pin_id))
+
+    def instanceCount(self) -> int:
+        return len(self.inst_name)
+
+    def instancePins(self, row: int) -> list:
+        pins = self.pins.names
+        nets = self.nets.names
+        return [(None if self.pin_id[k] < 0 else pins[self.pin_id[k]], nets[self.net_id[k]])
+                for k in range(self.pin_start[row], self.pin_start[row+1])]
+
+    def instanceText(self, row: int) -> str:
+        connections = []
+        for pin, net in self.instancePins(row):
+            connections.append(net if pin is None else '.' + pin + '(' + net + ')')
+        return self.cells[self.inst_type[row]] + ' ' + self.inst_name[row] + ' ( ' + ', '.join(connections) + ' );'
+
+    def statements(self):
+        #VerilogParser records in netlist order. Instance records are rebuilt from the columns, with text None
+        cells = self.cells.names
+        for k in self.order:
+            if k < 0:
+                yield self.others[-1 - k]
+            else:
+                yield Instance(cells[self.inst_type[k]], self.inst_name[k], self.instancePins(k), None)
+
+    def lines(self):
+        #text of every statement. Instances are written as: type name ( .pin(net), ... );
+        for k in self.order:
+            if k < 0:
+                yield self.others[-1 - k].text
+            else:
+                yield self.instanceText(k)
+
+    def renameCells(self, translation: dict) -> None:
+        #renames cell types (old name -> new name); costs one pass over the type IDs
+        remap = array('i', range(len(self.cells)))
+        for i, name in enumerate(list(self.cells.names)):
+            if name in translation:
+                remap[i] = self.cells.intern(translation[name])
+        self.inst_type = array('i', (remap[t] for t in self.inst_type))
+
+    def remapPins(self, tables: dict) -> None:
+        #rewrites the connections of the instances whose cell name is in tables.
+        #tables: cell name -> {old pin: new pin}; pins missing from the table are dropped, as are
+        #positional connections. When several pins map to the same new pin the last connection wins
+        bycell = {}
+        for cell, table in tables.items():
+            if cell in self.cells.ids:
+                bycell[self.cells.ids[cell]] = {self.pins.intern(old): self.pins.intern(new) for old, new in table.items()}
+        if not bycell:
+            return
+        plans = {} #(cell ID, old pin IDs) -> (new pin IDs, positions of their nets), see remapPlan
+        pin_start = array('q', [0])
+        pin_id = array('i')
+        net_id = array('i')
+        old_pins = self.pin_id
+        old_nets = self.net_id
+        bounds = self.pin_start
+        for row, cell in enumerate(self.inst_type):
+            start = bounds[row]
+            end = bounds[row+1]
+            pins = old_pins[start:end]
+            table = bycell.get(cell)
+            if table is None:
+                pin_id.extend(pins)
+                net_id.extend(old_nets[start:end])
+            else:
+                #instances of a cell nearly always list the same pins in the same order: one plan each
+                key = (cell, pins.tobytes())
+                plan = plans.get(key)
+                if plan is None:
+                    plan = plans[key] = Netlist.remapPlan(pins, table)
+                pin_id.extend(plan[0])
+                if plan[1] is None:
+                    net_id.extend(old_nets[start:end])
+                else:
+                    net_id.extend([old_nets[start + k] for k in plan[1]])
+            pin_start.append(len(pin_id))
+        self.pin_start = pin_start
+        self.pin_id = pin_id
+        self.net_id = net_id
+
+    def remapPlan(pins, table: dict) -> tuple:
+        #new pin IDs of a connection list (pin IDs, -1 for positional) and the position in the list of
+        #the connection giving each one its net, None when the nets stay as they are
+        connections = {} #old pin -> position of its last connection
+        for k, pin in enumerate(pins):
+            if pin >= 0:
+                connections[pin] = k
+        newports = {}
+        for pin, k in connections.items():
+            if pin in table:
+                newports[table[pin]] = k
+        positions = tuple(newports.values())
+        if positions == tuple(range(len(pins))):
+            positions = None
+        return array('i', newports.keys()), positions
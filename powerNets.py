@@ -0,0 +1,64 @@
+import re
+
+#
+# Classification of the supply nets of library cells
+#
+# A net is a vdd or a vss rail, or a signal. The rules list, for each of the
+# vdd, vss and gnd classes, exact net names and name patterns (regular
+# expressions searched in the net name, case insensitive). Exact names are
+# tried first, then the patterns, in the order vdd, vss, gnd. gnd nets are
+# vss or vdd rails depending on the gnd is vss policy. The default rules are
+# the 'vdd', 'vss', 'gnd' and 'ground' substrings; foundry rail names (VPWR,
+# VGND, VPB, ...) are added with a rules file. Every distinct net name is only
+# classified once.
+##############################################################################
+
+POWER_CLASSES = ('vdd', 'vss', 'gnd')
+POWER_KEYS = ('patterns', 'nets')
+DEFAULT_POWER_NETS = {'vdd': {'patterns': ['vdd']},
+                      'vss': {'patterns': ['vss']},
+                      'gnd': {'patterns': ['gnd', 'ground']}}
+
+class PowerNets:
+    def __init__(self, rules=None, gnd_is_vss=True):
+        #rules : class ('vdd', 'vss' or 'gnd') -> {'patterns': [regular expressions], 'nets': [net names]}.
+        #A class given in rules replaces the default rules of that class
+        self.rules = dict(DEFAULT_POWER_NETS)
+        if rules != None:
+            for name, rule in rules.items():
+                if name not in POWER_CLASSES:
+                    raise ValueError('unknown supply class ' + repr(name) + ', expected vdd, vss or gnd')
+                for key in rule:
+                    if key not in POWER_KEYS:
+                        raise ValueError('unknown key ' + repr(key) + ' in the ' + name + ' rules, expected patterns or nets')
+                self.rules[name] = rule
+        self.gnd_is_vss = gnd_is_vss
+        gnd = 'vss' if gnd_is_vss else 'vdd'
+        self.nets = {} #lower case net name -> rail
+        self.patterns = [] #(compiled patterns, rail), in class order
+        for name in POWER_CLASSES:
+            rail = gnd if name == 'gnd' else name
+            rule = self.rules[name]
+            for net in rule.get('nets', ()):
+                self.nets.setdefault(net.lower(), rail)
+            patterns = rule.get('patterns', ())
+            if len(patterns) > 0:
+                self.patterns.append((re.compile('|'.join('(?:' + p + ')' for p in patterns), re.IGNORECASE), rail))
+        self.classes = {} #net name -> rail or None, memo of classify
+
+    def classify(self, net: str) -> str:
+        #'vdd' or 'vss' for a supply net, None for a signal
+        if net in self.classes:
+            return self.classes[net]
+        rail = self.nets.get(net.lower())
+        if rail == None:
+            for pattern, patternRail in self.patterns:
+                if pattern.search(net):
+                    rail = patternRail
+                    break
+        self.classes[net] = rail
+        return rail
+
+    def key(self) -> str:
+        #identity of the rules, part of the cell cache key
+        return repr((sorted((name, sorted(rule.items())) for name, rule in self.rules.items()), self.gnd_is_vss))
@@ -0,0 +1,82 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+#the modules of the flow are scripts at the root of the repository
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA = os.path.join(ROOT, 'tests', 'data')
+sys.path.insert(0, ROOT)
+
+from verilog2spice import Verilog2Spice
+
+def dataFile(name: str) -> str:
+    return os.path.join(DATA, name)
+
+def golden(name: str) -> str:
+    #expected output in data/golden, i.e. the output of the original code (see test_golden.py)
+    with open(dataFile('golden/' + name)) as f:
+        return f.read()
+
+def spiceText(path: str) -> str:
+    #SPICE netlist without its header comment (file names and translation date)
+    with open(path) as f:
+        lines = f.readlines()
+    start = 0
+    while start < len(lines) and lines[start].startswith('*'):
+        start += 1
+    return ''.join(lines[start:])
+
+CELLS = ('  AND2X1 U{0} ( .IN1(w[{1}]), .IN2(w[{2}]), .Q(w[{3}]) );\n',
+         '  INVX1 U{0} ( .INP(w[{1}]),\n    .ZN(w[{2}]) );\n',
+         '  NAND2X0 U{0} ( .IN1(w[{1}]), .IN2(w[{2}]), .QN(w[{3}]) );\n')
+
+def writeNetlist(path, instances=600, commented=200):
+    #flat netlist whose middle is a block comment spanning many complete instances
+    lines = ['module top ( a, y );\n', '  input a;\n', '  output y;\n', '  wire [63:0] w;\n']
+    for i in range(instances):
+        if i == instances // 3:
+            lines.append('  /* disabled block\n')
+            lines += [CELLS[k % 3].format('C' + str(k), k % 64, (k + 1) % 64, (k + 2) % 64) for k in range(commented)]
+            lines.append('  */ INVX1 UE ( .INP(a), .ZN(y) ); /* one line */\n')
+        lines.append(CELLS[i % 3].format(i, i % 64, (i * 7) % 64, (i * 13) % 64))
+    lines.append('endmodule\n')
+    with open(path, 'w') as f:
+        f.write(''.join(lines))
+
+def writeCommentedNetlist(path, instances=400):
+    #multi-line instances with a line comment ending in ';' after their first pin, and escaped names holding a ';'
+    lines = ['module top ( a, y );\n', '  input a;\n', '  output y;\n', '  wire [63:0] w;\n']
+    for i in range(instances):
+        name = '\\U' + str(i) + ';x ' if i % 5 == 0 else 'U' + str(i)
+        lines.append('  INVX1 ' + name + ' ( .INP(w[' + str(i % 64) + ']), // note ' + str(i) + ';\n')
+        lines.append('    .ZN(w[' + str((i + 1) % 64) + ']) ); /* done; */\n')
+    lines.append('endmodule\n')
+    with open(path, 'w') as f:
+        f.write(''.join(lines))
+
+@pytest.fixture(autouse=True)
+def cacheDir(tmp_path, monkeypatch):
+    #the library caches of a test go to its own directory
+    monkeypatch.setenv('V2S_CACHE_DIR', str(tmp_path / 'cache'))
+
+@pytest.fixture
+def translate(tmp_path):
+    #translates a verilog netlist against the sample library, returns the SPICE text.
+    #out : output file name in tmp_path, the other arguments are those of verilogNetlist2Spice
+    def run(ver_file, out='out.sp', spi_files=None, **kwargs):
+        out_file = str(tmp_path / out)
+        kwargs.setdefault('use_cache', False)
+        Verilog2Spice.verilogNetlist2Spice(spi_files=spi_files or [dataFile('lib.cdl')], ver_file=ver_file, out_file=out_file, **kwargs)
+        return spiceText(out_file)
+    return run
+
+@pytest.fixture
+def sample(tmp_path, monkeypatch):
+    #the sample files in the working directory, as the outputs name them (.INCLUDE lib.cdl)
+    for name in ('lib.cdl', 'top.v'):
+        shutil.copy(dataFile(name), str(tmp_path))
+    shutil.copy(os.path.join(ROOT, 'basic_circuits.json'), str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,63 @@
+def njf_AND2_generate(filename, use_finfet):
+	spice_file = open(filename, "a")
+
+	spice_file.write("******************************************************************************************\n")
+	spice_file.write("*njf_AND2\n")
+	spice_file.write("******************************************************************************************\n")
+	spice_file.write(".SUBCKT njf_AND2 IN1 IN2 Q vdd vss Wn=45n Wp=45n\n")
+	spice_file.write("MN0 net1 IN1 net2 n_gnd nmos L=gate_length W=Wn AS=Wn*trans_diffusion_length AD=Wn*trans_diffusion_length PS=Wn+2*trans_diffusion_length PD=Wn+2*trans_diffusion_length\n")
+	spice_file.write("MN1 net2 IN2 n_gnd n_gnd nmos L=gate_length W=Wn AS=Wn*trans_diffusion_length AD=Wn*trans_diffusion_length PS=Wn+2*trans_diffusion_length PD=Wn+2*trans_diffusion_length\n")
+	spice_file.write("MP0 net1 IN1 n_vdd n_vdd pmos L=gate_length W=Wp AS=Wp*trans_diffusion_length AD=Wp*trans_diffusion_length PS=Wp+2*trans_diffusion_length PD=Wp+2*trans_diffusion_length\n")
+	spice_file.write("MP1 net1 IN2 n_vdd n_vdd pmos L=gate_length W=Wp AS=Wp*trans_diffusion_length AD=Wp*trans_diffusion_length PS=Wp+2*trans_diffusion_length PD=Wp+2*trans_diffusion_length\n")
+	spice_file.write("MN2 Q net1 n_gnd n_gnd nmos L=gate_length W=Wn AS=Wn*trans_diffusion_length AD=Wn*trans_diffusion_length PS=Wn+2*trans_diffusion_length PD=Wn+2*trans_diffusion_length\n")
+	spice_file.write("MP2 Q net1 n_vdd n_vdd pmos L=gate_length W=Wp AS=Wp*trans_diffusion_length AD=Wp*trans_diffusion_length PS=Wp+2*trans_diffusion_length PD=Wp+2*trans_diffusion_length\n")
+	spice_file.write(".ENDS\n")
+
+	spice_file.close()
+def njf_INVX1_generate(filename, use_finfet):
+	spice_file = open(filename, "a")
+
+	spice_file.write("******************************************************************************************\n")
+	spice_file.write("*njf_INVX1\n")
+	spice_file.write("******************************************************************************************\n")
+	spice_file.write(".SUBCKT njf_INVX1 INP ZN vdd vss Wn=45n Wp=45n\n")
+	spice_file.write("MN0 ZN INP n_gnd n_gnd nmos L=gate_length W=Wn AS=Wn*trans_diffusion_length AD=Wn*trans_diffusion_length PS=Wn+2*trans_diffusion_length PD=Wn+2*trans_diffusion_length\n")
+	spice_file.write("MP0 ZN INP n_vdd n_vdd pmos L=gate_length W=Wp AS=Wp*trans_diffusion_length AD=Wp*trans_diffusion_length PS=Wp+2*trans_diffusion_length PD=Wp+2*trans_diffusion_length\n")
+	spice_file.write(".ENDS\n")
+
+	spice_file.close()
+def njf_DFFX1_generate(filename, use_finfet):
+	spice_file = open(filename, "a")
+
+	spice_file.write("******************************************************************************************\n")
+	spice_file.write("*njf_DFFX1\n")
+	spice_file.write("******************************************************************************************\n")
+	spice_file.write(".SUBCKT njf_DFFX1 CLK D Q QN vdd vss Wn=45n Wp=45n\n")
+	spice_file.write("MN0 a CLK n_gnd n_gnd nmos L=gate_length W=Wn AS=Wn*trans_diffusion_length AD=Wn*trans_diffusion_length PS=Wn+2*trans_diffusion_length PD=Wn+2*trans_diffusion_length\n")
+	spice_file.write("MP0 a D n_vdd n_vdd pmos L=gate_length W=Wp AS=Wp*trans_diffusion_length AD=Wp*trans_diffusion_length PS=Wp+2*trans_diffusion_length PD=Wp+2*trans_diffusion_length\n")
+	spice_file.write("MN1 Q a n_gnd n_gnd nmos L=gate_length W=Wn AS=Wn*trans_diffusion_length AD=Wn*trans_diffusion_length PS=Wn+2*trans_diffusion_length PD=Wn+2*trans_diffusion_length\n")
+	spice_file.write("MP1 QN a n_vdd n_vdd pmos L=gate_length W=Wp AS=Wp*trans_diffusion_length AD=Wp*trans_diffusion_length PS=Wp+2*trans_diffusion_length PD=Wp+2*trans_diffusion_length\n")
+	spice_file.write(".ENDS\n")
+
+	spice_file.close()
+def njf_NAND2_1_generate(filename, use_finfet):
+	spice_file = open(filename, "a")
+
+	spice_file.write("******************************************************************************************\n")
+	spice_file.write("*njf_NAND2_1\n")
+	spice_file.write("******************************************************************************************\n")
+	spice_file.write(".SUBCKT njf_NAND2_1 IN1 IN2 QN vdd vss Wn=45n Wp=45n\n")
+	spice_file.write("MN0 QN IN1 n1 n_gnd nmos L=gate_length W=Wn AS=Wn*trans_diffusion_length AD=Wn*trans_diffusion_length PS=Wn+2*trans_diffusion_length PD=Wn+2*trans_diffusion_length\n")
+	spice_file.write("MN1 n1 IN2 n_gnd n_gnd nmos L=gate_length W=Wn AS=Wn*trans_diffusion_length AD=Wn*trans_diffusion_length PS=Wn+2*trans_diffusion_length PD=Wn+2*trans_diffusion_length\n")
+	spice_file.write("MP0 QN IN1 n_vdd n_vdd pmos L=gate_length W=Wp AS=Wp*trans_diffusion_length AD=Wp*trans_diffusion_length PS=Wp+2*trans_diffusion_length PD=Wp+2*trans_diffusion_length\n")
+	spice_file.write("MP1 QN IN2 n_vdd n_vdd pmos L=gate_length W=Wp AS=Wp*trans_diffusion_length AD=Wp*trans_diffusion_length PS=Wp+2*trans_diffusion_length PD=Wp+2*trans_diffusion_length\n")
+	spice_file.write(".ENDS\n")
+
+	spice_file.close()
+
+
+def generate_all(filename):
+	njf_AND2_generate(filename, use_finfet=False)
+	njf_INVX1_generate(filename, use_finfet=False)
+	njf_DFFX1_generate(filename, use_finfet=False)
+	njf_NAND2_1_generate(filename, use_finfet=False)
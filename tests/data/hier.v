@@ -0,0 +1,23 @@
+module top (a, b, y);
+  input a, b;
+  output [1:0] y;
+  wire [3:0] w;
+  half h0 (.x(a), .z(w[1:0]), .q({b, 1'b1}));
+  half h1 (a, w[3:2], w[1:0]);
+  AND2X1 U1 (.IN1(w[0]), .IN2(w[3]), .Q(y[0]));
+  INVX1 U2 (.INP(a), .ZN(y[1]));
+endmodule
+module half (x, z, q);
+  input x;
+  input [1:0] q;
+  output [1:0] z;
+  INVX1 U1 (.INP(x), .ZN(z[0]));
+  NAND2X0 U2 (.IN1(q[1]), .IN2(q[0]), .QN(z[1]));
+endmodule
+module half (x, z);
+  input x;
+endmodule
+module unused (p);
+  input p;
+  NOPE U9 (.A(p));
+endmodule
@@ -0,0 +1,18 @@
+// test netlist
+module top ( a, b, clk, y, z );
+  input a, b;
+  input clk;
+  input [3:0] d;
+  output y;
+  output [0:1] z;
+  wire n1, n2;
+  wire [3:0] bus;
+
+  AND2X1 U1 ( .IN1(a), .IN2(b), .Q(n1) );
+  AND2X2 U2 ( .IN1(n1),
+     .IN2(d[2]), .Q(n2) );
+  INVX1 U3 ( .INP(n2), .ZN(y) );
+  DFFX1 XU4 ( .CLK(clk), .D(n2), .Q(z[0]), .QN(z[1]) );
+  NAND2X0 U5 ( .IN1(bus[0]), .IN2(bus[3]), .QN(bus[1]) );
+  INVX1 U6 ( .INP(a), .ZN(bus[2]), .VDD(a), .VSS(b) );
+endmodule
@@ -0,0 +1,27 @@
+import os
+import shutil
+
+from batchFlow import BatchFlow
+from cdlToCOFFE import CoffeLibGeneration
+from conftest import dataFile, golden, spiceText
+
+def runBatch(designs, out_dir, workers):
+    return BatchFlow.run('lib.cdl', designs, out_dir, 'generate_std.py', 'p12', 'n12', 'n_vdd', 'n_gnd',
+                         workers=workers, use_cache=False, gates=CoffeLibGeneration.readGates('basic_circuits.json'))
+
+def testBatchMatchesSingleRuns(sample):
+    shutil.copy(dataFile('top.v'), 'copy.v')
+    designs = ['top.v', 'missing.v', 'copy.v', 'top.v']
+    for workers in (1, 2):
+        out_dir = 'out' + str(workers)
+        results = runBatch(designs, out_dir, workers)
+        assert [status['design'] for status in results] == designs
+        assert [status['status'] for status in results] == ['ok', 'failed', 'ok', 'ok']
+        assert [status['instances'] for status in results] == [6, 0, 6, 6]
+        assert not os.path.exists(os.path.join(out_dir, 'missing.sp'))
+        assert 'missing.v' in results[1]['message']
+        #each design is translated as by a single run of the flow
+        for name in ('top.sp', 'copy.sp', 'top_2.sp'):
+            assert spiceText(os.path.join(out_dir, name)) == golden('flow_final.sp')
+    with open('newlib.cdl') as f:
+        assert f.read() == golden('flow_newlib.cdl')
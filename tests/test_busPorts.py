@@ -0,0 +1,36 @@
+#ascending and descending ranges, several busses per declaration and per line
+BUS_MODULES = '''module top (a, b, c, z, s);
+  input [0:7] a;
+  input [3:0] b, c;
+  output [2:1] z; output s;
+  wire [7:0] w;
+  sub u0 (.p(w[7:4]), .q(a[2:5]));
+  INVX1 U1 (.INP(a[0]), .ZN(z[1]));
+  INVX1 U2 (.INP(b[3]), .ZN(s));
+endmodule
+module sub (p, q);
+  input [0:3] p;
+  input [3:0] q;
+endmodule
+'''
+
+def subckts(text):
+    return [line for line in text.splitlines() if line.startswith(('.SUBCKT', 'Xu0'))]
+
+def testBusPortsInTheHeader(tmp_path, translate):
+    path = tmp_path / 'bus.v'
+    path.write_text(BUS_MODULES)
+    assert subckts(translate(str(path))) == [
+        '.SUBCKT top a_bus0_ a_bus1_ a_bus2_ a_bus3_ a_bus4_ a_bus5_ a_bus6_ a_bus7_ b_bus0_ b_bus1_ b_bus2_ b_bus3_ '
+        'c_bus0_ c_bus1_ c_bus2_ c_bus3_ z_bus1_ z_bus2_ s ',
+        #the bits of a bus connection are matched msb first, whatever the direction of the ranges
+        'Xu0 w_bus7_ w_bus6_ w_bus5_ w_bus4_ a_bus5_ a_bus4_ a_bus3_ a_bus2_ sub',
+        '.SUBCKT sub p_bus0_ p_bus1_ p_bus2_ p_bus3_ q_bus0_ q_bus1_ q_bus2_ q_bus3_ ']
+    assert subckts(translate(str(path), del_on=False))[0].startswith('.SUBCKT top a[0] a[1] a[2] ')
+
+def testWideBus(tmp_path, translate):
+    path = tmp_path / 'wide.v'
+    path.write_text('module top (d);\n  input [0:99999] d;\nendmodule\n')
+    header = subckts(translate(str(path)))[0].split()
+    assert len(header) == 100002
+    assert header[2:4] == ['d_bus0_', 'd_bus1_'] and header[-1] == 'd_bus99999_'
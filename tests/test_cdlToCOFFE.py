@@ -0,0 +1,100 @@
+import gzip
+import os
+
+import cdlToCOFFE
+from cdlToCOFFE import CoffeLibGeneration
+from conftest import ROOT, dataFile
+
+def testNormalizeCdl():
+    lines = ['* comment\n', '* Cell Name: INV\n', '.subckt INV A Y\n', '+ VDD   VSS * pins\n', '\n',
+             'MN0 Y A VSS VSS nmos l=0.1u w=0.4u m = 2\n', 'MP0 Y A VDD VDD pmos l=0.1u w=0.6u m=1\n', '.ends\n']
+    assert list(CoffeLibGeneration.normalizeCdl(lines)) == [
+        '* Cell Name: INV', '.subckt INV A Y VDD VSS',
+        'MN0 Y A VSS VSS nmos l=0.1u w=0.4u m=2', 'MP0 Y A VDD VDD pmos l=0.1u w=0.6u m=1', '.ends']
+
+def testMultipliersAreParsed():
+    subckts = list(CoffeLibGeneration.iterSubckts(dataFile('lib.cdl')))
+    info = CoffeLibGeneration.extractSUBCKTInfo(subckts[0])
+    assert info['name'] == 'AND2X1'
+    assert [c.get('m') for c in info['components']] == ['1', '1', '1', None, None, None]
+    assert all(c['misc'] == [] for c in info['components'])
+
+def testMappedLibraryReadsLikeAStream(tmp_path, monkeypatch):
+    #a plain library is memory-mapped and decoded by regions, a compressed one is read line by line
+    with open(dataFile('lib.cdl'), 'rb') as f:
+        data = f.read().replace(b'\n', b'\r\n')
+    plain = tmp_path / 'lib.cdl'
+    plain.write_bytes(data)
+    packed = tmp_path / 'lib.cdl.gz'
+    with gzip.open(str(packed), 'wb') as f:
+        f.write(data)
+    monkeypatch.setattr(cdlToCOFFE, 'CDL_REGION_BYTES', 64)
+    mapped = list(CoffeLibGeneration.iterSubckts(str(plain)))
+    assert len(mapped) == 5
+    assert mapped == list(CoffeLibGeneration.iterSubckts(str(packed)))
+    assert ''.join(CoffeLibGeneration.libraryLines(str(plain))) == data.decode().replace('\r\n', '\n')
+
+def nand2(name, w, gnd='VSS'):
+    return ('.subckt ' + name + ' A B Y VDD ' + gnd + '\n'
+            'MN0 Y A n1 ' + gnd + ' nmos l=0.1u w=' + w + '\n' + 'MN1 n1 B ' + gnd + ' ' + gnd + ' nmos l=0.1u w=' + w + '\n'
+            'MP0 Y A VDD VDD pmos l=0.1u w=' + w + '\n' + 'MP1 Y B VDD VDD pmos l=0.1u w=' + w + '\n.ends\n')
+
+def nor2(name, w):
+    return ('.subckt ' + name + ' A B Y VDD VSS\n'
+            'MN0 Y A VSS VSS nmos l=0.1u w=' + w + '\n' + 'MN1 Y B VSS VSS nmos l=0.1u w=' + w + '\n'
+            'MP0 Y A p1 VDD pmos l=0.1u w=' + w + '\n' + 'MP1 p1 B VDD VDD pmos l=0.1u w=' + w + '\n.ends\n')
+
+def translation(tmp_path, cells, gates=None):
+    lib = tmp_path / 'lib.cdl'
+    lib.write_text(''.join(cells))
+    model = CoffeLibGeneration.buildCoffeLibrary(str(lib), 'p12', 'n12', 'VDD', 'VSS', True, gates=gates)
+    return model['circuit_translation']
+
+def testLogicallyDifferentCellsStaySeparate(tmp_path):
+    #NAND2 and NOR2 have the same ports and device counts, but not the same network
+    cells = translation(tmp_path, [nand2('GA', '0.4u'), nor2('GB', '0.4u'), nand2('GC', '0.8u'), nor2('GD', '0.8u')])
+    assert cells['GA'] == cells['GC']
+    assert cells['GB'] == cells['GD']
+    assert cells['GA'] != cells['GB']
+
+def testSupplyPortNamesMustMatch(tmp_path):
+    #the same network with VSS or GND ground ports is two cells, as the instances connect different pins
+    cells = translation(tmp_path, [nand2('NAND2X1', '0.4u'), nand2('NAND2X2', '0.4u', gnd='GND')])
+    assert cells['NAND2X1'] != cells['NAND2X2']
+
+def testGroupingByGateNames(tmp_path):
+    #with the gate names of basic_circuits.json, cells are grouped by name and port list, whatever their network
+    cells = translation(tmp_path, [nand2('NAND2X1', '0.4u'), nor2('NAND2X2', '0.8u'), nor2('NOR2X1', '0.4u')],
+                        gates=CoffeLibGeneration.readGates(os.path.join(ROOT, 'basic_circuits.json')))
+    assert cells['NAND2X1'] == cells['NAND2X2']
+    assert cells['NAND2X1'] != cells['NOR2X1']
+
+def testSampleCellsMergeByStructure(sample):
+    #without basic_circuits.json, the cells with the same network and ports are merged whatever their name
+    library = CoffeLibGeneration.buildCoffeLibrary('lib.cdl', 'p12', 'n12', 'n_vdd', 'n_gnd', True)
+    assert library['circuit_translation'] == {'AND2X1': 'njf_AND2', 'AND2X2': 'njf_AND2', 'INVX1': 'njf_INV',
+                                              'DFFX1': 'njf_DFF', 'NAND2X0': 'njf_NAND2'}
+
+def coffeOutput(code, path, cell=None):
+    #SPICE text written by a generated COFFE python file, all the cells or one through its generate function
+    namespace = {}
+    exec(compile(code, 'generate_std.py', 'exec'), namespace)
+    if cell == None:
+        namespace['generate_all'](path)
+    else:
+        namespace[cell + '_generate'](path, use_finfet=False)
+    with open(path) as f:
+        return f.read()
+
+def testCoffeLayoutsWriteTheSameCells(sample):
+    for emit_sizes in (False, True):
+        outputs = {}
+        for coffe_format in cdlToCOFFE.COFFE_FORMATS:
+            library = CoffeLibGeneration.buildCoffeLibrary('lib.cdl', 'p12', 'n12', 'n_vdd', 'n_gnd', True, coffe_format=coffe_format,
+                                                           retarget={'*': {'w': {'scale': 0.5}}}, emit_sizes=emit_sizes)
+            path = coffe_format + str(emit_sizes)
+            outputs[coffe_format] = [coffeOutput(library['coffe_code'], path + '.sp'),
+                                     coffeOutput(library['coffe_code'], path + '_inv.sp', 'njf_INV')]
+        assert outputs['table'] == outputs['functions']
+        assert outputs['table'][0].count('.SUBCKT') == 4
+        assert '.SUBCKT njf_INV ' in outputs['table'][1]
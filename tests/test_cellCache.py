@@ -0,0 +1,40 @@
+import cellCache
+from cdlToCOFFE import CoffeLibGeneration
+
+def generate(cache=True, rebuild=False):
+    return CoffeLibGeneration.generate_libgeneration_for_COFFE('lib.cdl', 'generate_std.py', 'newlib.cdl', 'p12', 'n12', 'n_vdd',
+                                                               'n_gnd', True, json_files=False, use_cache=cache, rebuild_cache=rebuild)
+
+def model(library):
+    #the library model with the columns of its device table
+    devices = library['devices']
+    return dict(library, devices=[devices.cells] + [list(getattr(devices, column)) for column in ('cell', 'type', 'w', 'l', 'm', 'start')])
+
+def countCells(monkeypatch):
+    #hits and misses of the cell caches of the following runs
+    caches = []
+    class Counted(cellCache.CellCache):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            caches.append(self)
+    monkeypatch.setattr('cdlToCOFFE.CellCache', Counted)
+    return caches
+
+def testWarmCellCacheMatchesColdRun(sample, monkeypatch):
+    uncached = model(generate(cache=False))
+    caches = countCells(monkeypatch)
+    cold = model(generate())
+    warm = model(generate())
+    assert cold == warm == uncached
+    assert [(cache.hits, cache.misses) for cache in caches] == [(0, 5), (5, 0)]
+    #an edited cell is the only one computed again
+    with open('lib.cdl') as f:
+        text = f.read()
+    with open('lib.cdl', 'w') as f:
+        f.write(text.replace('w=0.4u', 'w=0.41u', 1))
+    edited = model(generate())
+    assert (caches[-1].hits, caches[-1].misses) == (4, 1)
+    assert edited == model(generate(cache=False))
+    assert edited['devices'] != cold['devices']
+    generate(rebuild=True)
+    assert (caches[-1].hits, caches[-1].misses) == (0, 5)
@@ -0,0 +1,28 @@
+from cdlToCOFFE import CoffeLibGeneration
+from cellTopology import CellTopology
+
+def topology(*lines):
+    #lines : .subckt line (without .subckt) then the devices
+    return CellTopology(CoffeLibGeneration.extractSUBCKTInfo('\n'.join(lines + ('.ends',))))
+
+NAND2 = ('NAND2 A B Y VDD VSS', 'MN0 Y A n1 VSS nmos l=0.1u w=0.4u', 'MN1 n1 B VSS VSS nmos l=0.1u w=0.4u',
+         'MP0 Y A VDD VDD pmos l=0.1u w=0.6u', 'MP1 Y B VDD VDD pmos l=0.1u w=0.6u')
+
+def testDigestIgnoresNamesOrderAndSizes():
+    #other cell, device and internal net names, device order, widths, drain and source swapped
+    other = topology('NAND2X4 A B Y VDD VSS', 'MP7 Y B VDD VDD pmos l=0.1u w=2.4u', 'MNb x9 B VSS VSS nmos l=0.1u w=1.6u',
+                     'MP3 VDD A Y VDD pmos l=0.1u w=2.4u', 'MNa Y A x9 VSS nmos l=0.1u w=1.6u')
+    nand = topology(*NAND2)
+    assert nand.digest == other.digest
+    assert nand.isomorphic(other)
+
+def testDigestSeesTheNetwork():
+    #NOR2 : same ports and devices, series and parallel swapped
+    nor = topology('NOR2 A B Y VDD VSS', 'MN0 Y A VSS VSS nmos l=0.1u w=0.4u', 'MN1 Y B VSS VSS nmos l=0.1u w=0.4u',
+                   'MP0 Y A p1 VDD pmos l=0.1u w=0.6u', 'MP1 p1 B VDD VDD pmos l=0.1u w=0.6u')
+    nand = topology(*NAND2)
+    assert nand.digest != nor.digest
+    assert not nand.isomorphic(nor)
+    #same network, pins A and B swapped on the series devices only
+    swapped = topology(NAND2[0], 'MN0 Y B n1 VSS nmos l=0.1u w=0.4u', 'MN1 n1 A VSS VSS nmos l=0.1u w=0.4u', *NAND2[3:])
+    assert nand.digest != swapped.digest
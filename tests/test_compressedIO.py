@@ -0,0 +1,53 @@
+import bz2
+import gzip
+import lzma
+import shutil
+
+import pytest
+
+from compressedIO import CompressedIO
+from conftest import dataFile
+from verilog2spice import Verilog2Spice
+
+COMPRESSORS = {'gz': gzip.open, 'bz2': bz2.open, 'xz': lzma.open}
+
+def compress(src: str, dst: str, fmt: str) -> None:
+    with open(src, 'rb') as f, COMPRESSORS[fmt](dst, 'wb') as g:
+        shutil.copyfileobj(f, g)
+
+@pytest.mark.parametrize('fmt', sorted(COMPRESSORS))
+def testRoundTrip(tmp_path, fmt):
+    path = str(tmp_path / ('out.sp.' + fmt))
+    text = ''.join('XU%d a b c INVX1\n' % i for i in range(5000))
+    with CompressedIO.openOutput(path, level=1) as f:
+        f.write(text)
+    assert CompressedIO.inputFormat(path) == fmt
+    assert not CompressedIO.isPlainFile(path)
+    with COMPRESSORS[fmt](path, 'rt') as f:
+        assert f.read() == text
+    with CompressedIO.openInput(path) as f:
+        assert f.read() == text
+
+def testPlainFiles(tmp_path):
+    path = str(tmp_path / 'out.sp')
+    with CompressedIO.openOutput(path) as f:
+        f.write('.END\n')
+    assert CompressedIO.inputFormat(path) == '' and CompressedIO.isPlainFile(path)
+    #inputs are recognized by their content, not their name
+    compress(path, str(tmp_path / 'packed.sp'), 'xz')
+    with CompressedIO.openInput(str(tmp_path / 'packed.sp')) as f:
+        assert f.read() == '.END\n'
+
+@pytest.mark.parametrize('fmt', sorted(COMPRESSORS))
+def testCompressedTranslation(tmp_path, translate, fmt):
+    lib = str(tmp_path / ('lib.cdl.' + fmt))
+    ver = str(tmp_path / ('top.v.' + fmt))
+    compress(dataFile('lib.cdl'), lib, fmt)
+    compress(dataFile('top.v'), ver, fmt)
+    plain = translate(dataFile('top.v'), out='plain.sp')
+    assert translate(ver, out='unpacked.sp', spi_files=[lib], workers=2) == plain.replace('.INCLUDE lib.cdl', '.INCLUDE lib.cdl.' + fmt)
+    Verilog2Spice.verilogNetlist2Spice(spi_files=[dataFile('lib.cdl')], ver_file=dataFile('top.v'),
+                                       out_file=str(tmp_path / ('out.sp.' + fmt)), use_cache=False)
+    with CompressedIO.openInput(str(tmp_path / ('out.sp.' + fmt))) as f:
+        lines = f.readlines()
+    assert ''.join(line for line in lines if not line.startswith('*')) == plain
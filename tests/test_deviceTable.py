@@ -0,0 +1,67 @@
+import math
+import random
+
+import pytest
+
+import deviceTable
+from deviceTable import DeviceTable
+
+def device(type, w, l='0.1u', m=None):
+    c = {'name': 'M', 'connections': [], 'type': type, 'misc': [], 'w': w, 'l': l}
+    if m != None:
+        c['m'] = m
+    return c
+
+def table():
+    return DeviceTable.fromCells([
+        {'name': 'INV', 'components': [device('nmos', '0.4u'), device('pmos', '0.6u', m='2')]},
+        {'name': 'BUF', 'components': [device('nmos', 'Wn', l='gate_length'), device('pmos', '1u')]}])
+
+RULES = {'pmos': {'w': {'grid': '250n', 'max': '0.4u'}},
+         '*': {'w': {'scale': 0.5}},
+         'nmos': {'l': {'min': 1.5e-7}}}
+
+def testRetarget(monkeypatch):
+    monkeypatch.setattr(deviceTable, 'numpy', None)
+    devices = table()
+    devices.retarget(RULES)
+    #'*' first, then the type rules; sizes that are not numbers are kept
+    assert devices.sizes(0) == [('200n', '150n', None), ('250n', '100n', '2')]
+    assert devices.sizes(1) == [(None, None, None), ('400n', '100n', None)]
+
+def testRuleErrors():
+    with pytest.raises(ValueError):
+        table().retarget({'*': {'x': {'scale': 2}}})
+    with pytest.raises(ValueError):
+        table().retarget({'*': {'w': {'double': 2}}})
+    with pytest.raises(ValueError):
+        table().retarget({'*': {'w': {'scale': 'twice'}}})
+
+def randomTable(seed=1, cells=200):
+    rnd = random.Random(seed)
+    cktinfos = []
+    for k in range(cells):
+        components = []
+        for _ in range(rnd.randrange(1, 12)):
+            w = rnd.choice(('Wn', format(rnd.uniform(0.05, 3), '.3f') + 'u', str(rnd.randrange(40, 900)) + 'n'))
+            components.append(device(rnd.choice(('nmos', 'pmos', 'n12', 'p12')), w, l=rnd.choice(('0.1u', '90n', 'gate_length'))))
+        cktinfos.append({'name': 'C' + str(k), 'components': components})
+    return DeviceTable.fromCells(cktinfos)
+
+def columns(devices):
+    #W and L of every device, NaN as None
+    return [[None if math.isnan(x) else x for x in getattr(devices, column)] for column in ('w', 'l')]
+
+def testVectorizedRetargetMatchesLoop(monkeypatch):
+    pytest.importorskip('numpy')
+    rules = {'*': {'w': {'scale': 0.45, 'grid': '5n'}, 'l': {'scale': '0.5', 'min': '40n'}},
+             'pmos': {'w': {'scale': 1.1, 'grid': '10n', 'min': '100n', 'max': '1.2u'}},
+             'n12': {'w': {'max': '500n'}, 'l': {'grid': '1n'}},
+             'missing': {'w': {'scale': 2}}}
+    vectorized = randomTable()
+    vectorized.retarget(rules)
+    monkeypatch.setattr(deviceTable, 'numpy', None)
+    loop = randomTable()
+    loop.retarget(rules)
+    assert columns(vectorized) == columns(loop)
+    assert [vectorized.sizes(k) for k in range(len(vectorized.cells))] == [loop.sizes(k) for k in range(len(loop.cells))]
@@ -0,0 +1,32 @@
+import os
+
+from ecoManifest import EcoManifest
+
+def writeOutput(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+
+def testStoreAndLoad(tmp_path):
+    out = str(tmp_path / 'out.sp')
+    writeOutput(out, 'XU1 a b INVX1\n')
+    digest = EcoManifest.chunkDigest(b'INVX1 U1 ( .INP(a), .ZN(b) );\n')
+    manifest = EcoManifest(out, EcoManifest.settingsKey('lib', 'VDD', 'VSS'))
+    manifest.record(digest, 0, 14, [0, 0, 1, 2], ())
+    manifest.store()
+    assert os.path.exists(EcoManifest.manifestPath(out))
+    previous = EcoManifest(out, EcoManifest.settingsKey('lib', 'VDD', 'VSS'))
+    assert previous.load()
+    assert previous.lookup(digest) == (0, 14, (0, 0, 1, 2), ())
+    assert previous.lookup(EcoManifest.chunkDigest(b'other')) == None
+    assert (previous.reused, previous.translated) == (1, 1)
+
+def testOutdatedManifestIsIgnored(tmp_path):
+    out = str(tmp_path / 'out.sp')
+    writeOutput(out, 'XU1 a b INVX1\n')
+    manifest = EcoManifest(out, EcoManifest.settingsKey('lib'))
+    manifest.store()
+    #other settings (library, supplies, ...)
+    assert not EcoManifest(out, EcoManifest.settingsKey('other lib')).load()
+    #output modified since the manifest was written
+    writeOutput(out, 'XU1 a b INVX2\n*\n')
+    assert not EcoManifest(out, EcoManifest.settingsKey('lib')).load()
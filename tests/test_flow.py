@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+from Verilog2Spice4COFFE import v2sp4cFlow
+from cdlToCOFFE import CoffeLibGeneration
+from conftest import dataFile, golden, spiceText
+
+def runFlow(tmp_path, monkeypatch, **kwargs):
+    #the intermediate json files are written to the working directory
+    monkeypatch.chdir(tmp_path)
+    v2sp4cFlow(dataFile('lib.cdl'), dataFile('top.v'), 'out.sp', 'generate.py', 'p12', 'n12', 'VDD', 'VSS', **kwargs)
+    return sorted(os.listdir(str(tmp_path)))
+
+def testDeleteTempFilesIsAnAliasOfDebugFiles(tmp_path, monkeypatch):
+    #the call of the original flow still works
+    with pytest.warns(DeprecationWarning):
+        files = runFlow(tmp_path, monkeypatch, delete_temp_files=True)
+    assert 'out.sp' in files and 'subcircuit_info.json' not in files
+    with pytest.warns(DeprecationWarning):
+        files = runFlow(tmp_path, monkeypatch, delete_temp_files=False)
+    assert 'subcircuit_info.json' in files and 'circuit_translation.json' in files and 'temp.v' in files
+
+def testFlowMatchesTheOriginalOutputs(sample):
+    #outputs of the original file based flow with the name grouping of basic_circuits.json, except for INVX1:
+    #its '+ GND' port continuation line used to be read as a device, which added the '+' and GND pins to the
+    #instances and a '+ GND' line to the new cell
+    v2sp4cFlow(cdlFile='lib.cdl', verilogFile='top.v', coffe_py_out='generate_std.py', out='final.sp', pmosname='p12',
+               nmosname='n12', newvdd='n_vdd', newvss='n_gnd', use_cache=False,
+               gates=CoffeLibGeneration.readGates('basic_circuits.json'))
+    assert spiceText('final.sp') == golden('flow_final.sp')
+    for name in ('newlib.cdl', 'generate_std.py'):
+        with open(name) as f:
+            assert f.read() == golden('flow_' + name)
+    assert not os.path.exists('temp.v') and not os.path.exists('subcircuit_info.json')
@@ -0,0 +1,54 @@
+import json
+
+import flowLog
+from flowLog import Diagnostics, FlowLog, ERROR, WARNING
+
+def missingPins(diagnostics, pins):
+    for cell, pin in pins:
+        diagnostics.warning('missing_pin', (cell, pin), 'pin ' + pin + ' of ' + cell + ' not found')
+
+def testFirstMessagesThenCounts(capsys):
+    diagnostics = Diagnostics(limit=2)
+    missingPins(diagnostics, [('INVX1', 'GND')] * 3 + [('AND2X1', 'IN3')] * 2)
+    diagnostics.error('unknown_cell', ('NOPE',), 'unknown cell NOPE')
+    assert capsys.readouterr().out.splitlines() == ['pin GND of INVX1 not found', 'pin GND of INVX1 not found',
+        '... further missing_pin messages are only counted, see the summary', 'unknown cell NOPE']
+    assert diagnostics.counts == {(WARNING, 'missing_pin'): {('INVX1', 'GND'): 3, ('AND2X1', 'IN3'): 2},
+                                  (ERROR, 'unknown_cell'): {('NOPE',): 1}}
+    assert (diagnostics.total(WARNING), diagnostics.total(ERROR)) == (5, 1)
+    diagnostics.summary()
+    summary = capsys.readouterr().out
+    assert 'INVX1/GND (3), AND2X1/IN3 (2)' in summary
+    assert summary.index('unknown_cell') < summary.index('missing_pin')
+
+def testQuietRunOnlyCounts(capsys, monkeypatch):
+    monkeypatch.setattr(flowLog, 'LEVEL', ERROR)
+    diagnostics = Diagnostics()
+    assert not diagnostics.note(WARNING, 'missing_pin', ('INVX1', 'GND'))
+    missingPins(diagnostics, [('INVX1', 'GND')] * 100)
+    diagnostics.summary()
+    FlowLog.info('not printed')
+    assert capsys.readouterr().out == ''
+    assert diagnostics.total(WARNING) == 101
+
+def testMergeKeepsTheOrderOfTheParts(capsys):
+    #parts translated apart (workers, chunks) report as one collector would
+    parts = [Diagnostics(limit=3, echo=False) for i in range(2)]
+    missingPins(parts[0], [('INVX1', 'P0'), ('INVX1', 'P1')])
+    missingPins(parts[1], [('INVX1', 'P2'), ('INVX1', 'P3'), ('INVX1', 'P1')])
+    assert capsys.readouterr().out == ''
+    diagnostics = Diagnostics(limit=3)
+    for part in parts:
+        diagnostics.merge(Diagnostics.fromState(part.state()))
+    assert capsys.readouterr().out.splitlines() == ['pin P0 of INVX1 not found', 'pin P1 of INVX1 not found',
+        'pin P2 of INVX1 not found', '... further missing_pin messages are only counted, see the summary']
+    assert diagnostics.counts[(WARNING, 'missing_pin')] == {('INVX1', 'P0'): 1, ('INVX1', 'P1'): 2,
+                                                            ('INVX1', 'P2'): 1, ('INVX1', 'P3'): 1}
+
+def testReport(tmp_path):
+    diagnostics = Diagnostics(echo=False)
+    missingPins(diagnostics, [('INVX1', 'GND')] * 2)
+    diagnostics.write(str(tmp_path / 'diagnostics.json'))
+    with open(str(tmp_path / 'diagnostics.json')) as f:
+        assert json.load(f) == {'errors': 0, 'warnings': 2, 'diagnostics': [
+            {'level': 'WARNING', 'kind': 'missing_pin', 'key': ['INVX1', 'GND'], 'count': 2}]}
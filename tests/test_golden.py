@@ -0,0 +1,30 @@
+import pytest
+
+from conftest import golden, spiceText
+from flowLog import Diagnostics, WARNING
+from verilog2spice import Verilog2Spice
+from verilogParser import Instance
+
+#
+# Outputs of the sample library and netlist (tests/data) checked against the
+# outputs of the original code, in data/golden. The direct translations are
+# the original ones byte for byte. The flow outputs are checked in
+# test_flow.py.
+##############################################################################
+
+@pytest.mark.parametrize('del_on, name', [(True, 'top.sp'), (False, 'top_nodel.sp')])
+def testDirectTranslation(sample, del_on, name):
+    Verilog2Spice.verilogNetlist2Spice(spi_files=['lib.cdl'], ver_file='top.v', out_file='out.sp', del_on=del_on, use_cache=False)
+    assert spiceText('out.sp') == golden(name)
+
+def testPinTemplates():
+    #the first definition of a cell wins, supply pins are connected to the supplies whatever the instance says
+    diagnostics = Diagnostics(echo=False)
+    library = Verilog2Spice.indexCells([('a.cdl', [['INV', 'A', 'Y', 'VDD', 'VSS']]), ('b.cdl', [['INV', 'Y', 'A']])], diagnostics)
+    templates = Verilog2Spice.compilePinTemplates(library, 'VDD', 'VSS')
+    assert templates['INV'] == (('A', None), ('Y', None), ('VDD', 'VDD'), ('VSS', 'VSS'))
+    assert diagnostics.counts[(WARNING, 'duplicate_cell')] == {('INV',): 1}
+    counts = [0, 0, 0, 0]
+    inv = Instance('INV', 'U1', [('A', 'd[2]'), ('VDD', 'x'), ('A', 'ignored')], '')
+    assert Verilog2Spice.translateInstance(inv, templates, True, counts, diagnostics) == 'XU1 d_bus2_ 0 VDD VSS INV\n'
+    assert counts[1] == 1 #Y is missing
@@ -0,0 +1,59 @@
+import io
+import marshal
+
+from conftest import dataFile
+from ecoManifest import EcoManifest
+from flowLog import Diagnostics
+from verilog2spice import Verilog2Spice, ModuleWriter
+from verilogParser import VerilogParser
+
+def writer(module_names=()):
+    return ModuleWriter(io.StringIO(), 'VDD', 'VSS', False, [0, 0, 0, 0], Diagnostics(echo=False), module_names=module_names)
+
+def testUnknownCellIsReportedAtOnce():
+    out = writer()
+    for stmt in VerilogParser.parse(['module top (a);\n', 'input a;\n', 'NOPE U1 (.A(a));\n']):
+        out.process(stmt)
+    out.process('XU2 a INVX1\n')
+    assert out.counts[0] == 1
+    assert len(out.pending) == 0
+    assert out.outfl.getvalue().endswith('XU2 a INVX1\n')
+
+def testModuleDefinedLaterIsWaitedFor():
+    out = writer({'half'})
+    for stmt in VerilogParser.parse(['module top (a);\n', 'input a;\n', 'half h0 (.x(a));\n']):
+        out.process(stmt)
+    out.process('XU2 a INVX1\n')
+    assert out.counts[0] == 0
+    assert len(out.pending) == 2
+    for stmt in VerilogParser.parse(['endmodule\n', 'module half (x);\n', 'input x;\n', 'endmodule\n']):
+        out.process(stmt)
+    out.finish()
+    assert len(out.pending) == 0
+    assert 'Xh0 a half' in out.outfl.getvalue()
+
+def testModuleNamesPrescan(tmp_path):
+    path = tmp_path / 'names.v'
+    path.write_text('module a(x);\nendmodule\nmodule\n  \\b[0] (y); endmodule // module c\nmacromodule d; endmodule\n')
+    assert VerilogParser.moduleNames(str(path)) == {'a', 'b[0]', 'd'}
+    assert VerilogParser.moduleNames(dataFile('hier.v')) == {'top', 'half', 'unused'}
+
+def testForwardModuleReference(translate):
+    text = translate(dataFile('hier.v'))
+    assert text.index('.SUBCKT top') < text.index('Xh0 ') < text.index('.SUBCKT half')
+    assert text.count('.SUBCKT half') == 1
+
+def testUnknownCellKeepsIncrementalChunks(tmp_path, translate):
+    path = tmp_path / 'flat.v'
+    lines = ['module flat (a);\n', 'input a;\n', 'wire [99:0] w;\n', 'NOPE U0 (.A(a));\n']
+    lines += ['AND2X1 U%d (.IN1(w[%d]), .IN2(a), .Q(w[%d]));\n' % (i + 1, i % 100, (i + 1) % 100) for i in range(2000)]
+    path.write_text(''.join(lines + ['endmodule\n']))
+    first = translate(str(path), incremental=True)
+    again = translate(str(path), incremental=True)
+    assert again == first
+    with open(str(tmp_path / 'out.sp.eco'), 'rb') as f:
+        version, settings, size, mtime, chunks = marshal.load(f)
+    #the chunks after the one of the unknown cell are recorded, up to the one closing the module
+    middle = list(Verilog2Spice.chunkVerilogFile(str(path)))[1:-1]
+    assert len(middle) > 10
+    assert all(EcoManifest.chunkDigest(chunk) in chunks for chunk in middle)
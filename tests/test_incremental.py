@@ -0,0 +1,46 @@
+from conftest import writeCommentedNetlist, writeNetlist
+from verilog2spice import Verilog2Spice
+
+def countTranslations(monkeypatch):
+    #number of chunks parsed and translated, the reused ones are not
+    calls = []
+    translate = Verilog2Spice.translateStatements
+    def counted(*args):
+        calls.append(1)
+        return translate(*args)
+    monkeypatch.setattr(Verilog2Spice, 'translateStatements', counted)
+    return calls
+
+def testSerialShardedAndIncrementalAgree(tmp_path, translate, monkeypatch):
+    ver_file = str(tmp_path / 'eco.v')
+    writeNetlist(ver_file, instances=3000)
+    serial = translate(ver_file, out='serial.sp')
+    assert translate(ver_file, out='sharded.sp', workers=4) == serial
+    calls = countTranslations(monkeypatch)
+    assert translate(ver_file, out='eco.sp', incremental=True) == serial
+    first = len(calls)
+    assert first > 10
+    #rerun, every chunk of instances comes from the previous output
+    del calls[:]
+    assert translate(ver_file, out='eco.sp', incremental=True) == serial
+    assert len(calls) <= 2 #the chunks with the module header and endmodule
+    #ECO : one instance is rewired, only the chunks around it are translated again
+    with open(ver_file) as f:
+        text = f.read()
+    with open(ver_file, 'w') as f:
+        f.write(text.replace('U1500 ( .IN1(w[28]),', 'U1500 ( .IN1(a),'))
+    del calls[:]
+    eco = translate(ver_file, out='eco.sp', incremental=True)
+    assert len(calls) <= 4
+    assert eco == translate(ver_file, out='serial.sp')
+    assert eco != serial
+
+def testIncrementalRunWithLineComments(tmp_path, translate):
+    #chunks never end after a '// ... ;' comment in the middle of an instance
+    ver_file = str(tmp_path / 'notes.v')
+    writeCommentedNetlist(ver_file, instances=3000)
+    for chunk in Verilog2Spice.chunkVerilogFile(ver_file):
+        assert chunk.endswith(b'/* done; */\n') or chunk.endswith(b'endmodule\n')
+    serial = translate(ver_file, out='serial.sp')
+    assert translate(ver_file, out='eco.sp', incremental=True) == serial
+    assert translate(ver_file, out='eco.sp', incremental=True) == serial
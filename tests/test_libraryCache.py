@@ -0,0 +1,66 @@
+import os
+import shutil
+
+from conftest import dataFile
+import verilog2spice
+from libraryCache import LibraryCache
+from verilog2spice import Verilog2Spice
+
+def countParses(monkeypatch):
+    #libraries parsed, the ones read from the cache are not
+    parsed = []
+    parse = Verilog2Spice.parseSpiceLibrary
+    def counted(spi_file):
+        parsed.append(spi_file)
+        return parse(spi_file)
+    monkeypatch.setattr(Verilog2Spice, 'parseSpiceLibrary', counted)
+    return parsed
+
+def testWarmCacheMatchesColdRun(tmp_path, translate, monkeypatch):
+    lib = str(tmp_path / 'lib.cdl')
+    shutil.copy(dataFile('lib.cdl'), lib)
+    uncached = translate(dataFile('top.v'), out='uncached.sp', spi_files=[lib])
+    parsed = countParses(monkeypatch)
+    cold = translate(dataFile('top.v'), out='cold.sp', spi_files=[lib], use_cache=True)
+    warm = translate(dataFile('top.v'), out='warm.sp', spi_files=[lib], use_cache=True)
+    assert parsed == [lib]
+    assert cold == warm == uncached
+    #an edited library is parsed again
+    with open(lib, 'a') as f:
+        f.write('.subckt BUFX1 INP Z VDD VSS\n.ends\n')
+    translate(dataFile('top.v'), out='edited.sp', spi_files=[lib], use_cache=True)
+    assert parsed == [lib, lib]
+    assert ['BUFX1', 'INP', 'Z', 'VDD', 'VSS'] in LibraryCache().load(lib)
+    translate(dataFile('top.v'), out='rebuilt.sp', spi_files=[lib], use_cache=True, rebuild_cache=True)
+    assert len(parsed) == 3
+
+def testTrimDropsLeastRecentlyUsed(tmp_path):
+    cache = LibraryCache(str(tmp_path / 'cache'))
+    libs = []
+    for i in range(3):
+        lib = str(tmp_path / ('lib' + str(i) + '.cdl'))
+        shutil.copy(dataFile('lib.cdl'), lib)
+        libs.append(lib)
+        cache.store(lib, Verilog2Spice.parseSpiceLibrary(lib))
+        os.utime(cache.entryPath(lib), ns=(i * 10**9, i * 10**9))
+    cache.max_bytes = os.path.getsize(cache.entryPath(libs[0])) * 2
+    cache.trim()
+    assert [cache.load(lib) != None for lib in libs] == [False, True, True]
+
+def testParallelLoadMatchesSerial(tmp_path, translate, monkeypatch):
+    libs = [str(tmp_path / 'lib.cdl'), str(tmp_path / 'extra.cdl')]
+    shutil.copy(dataFile('lib.cdl'), libs[0])
+    with open(libs[1], 'w') as f:
+        f.write('.subckt BUFX1 INP Z VDD VSS\n.ends\n.subckt INVX1 A Y VDD VSS\n.ends\n')
+    serial = [Verilog2Spice.loadSpiceLibrary(lib) for lib in libs]
+    cold = translate(dataFile('top.v'), out='serial.sp', spi_files=libs)
+    monkeypatch.setattr(verilog2spice, 'LIBRARY_POOL_BYTES', 0)
+    parsed = countParses(monkeypatch)
+    assert Verilog2Spice.loadSpiceLibraries(libs) == serial
+    cache = LibraryCache()
+    assert Verilog2Spice.loadSpiceLibraries(libs, cache) == serial
+    #the pool workers wrote the cache entries
+    assert [cache.load(lib) for lib in libs] == serial
+    if (os.cpu_count() or 1) > 1:
+        assert parsed == [] #parsed in the pool processes
+    assert translate(dataFile('top.v'), out='parallel.sp', spi_files=libs, use_cache=True) == cold
@@ -0,0 +1,32 @@
+from lineWrapper import LineWrapper
+
+def writeWideModule(path, nb_ports=300):
+    ports = ['p' + str(i) for i in range(nb_ports)]
+    with open(path, 'w') as f:
+        f.write('module wide ( ' + ', '.join(ports) + ' );\n  input ' + ', '.join(ports) + ';\n')
+        f.write('  AND2X1 U1 ( .IN1(p0), .IN2(p1), .Q(p2) );\nendmodule\n')
+
+def testWrap():
+    assert LineWrapper.wrap('aa bb cc dd', 5) == ['aa bb', 'cc dd']
+    assert LineWrapper.wrap('aa bb cc dd', 6, prefix='+ ') == ['aa bb', '+ cc', '+ dd']
+    assert LineWrapper.wrap('aa aaaaaaaa bb', 5) == ['aa', 'aaaaaaaa bb'] #no cut inside a token, as breakLineUp did
+    assert LineWrapper.wrap('aa bb cc dd', 5, min_length=20) == ['aa bb cc dd']
+
+def testSpiceLine():
+    assert LineWrapper.spiceLine(['X1', 'a', 'b', 'INV'], 0) == 'X1 a b INV\n'
+    assert LineWrapper.spiceLine(['X1', 'a', 'b', 'INV'], 6) == 'X1 a b\n+ INV\n'
+
+def testLinesAreKeptWholeByDefault(tmp_path, translate):
+    ver = tmp_path / 'wide.v'
+    writeWideModule(str(ver))
+    text = translate(str(ver))
+    assert '\n+ ' not in text
+    assert max(len(line) for line in text.splitlines()) > 1000
+
+def testLineWidth(tmp_path, translate):
+    ver = tmp_path / 'wide.v'
+    writeWideModule(str(ver))
+    text = translate(str(ver), line_width=100)
+    lines = text.splitlines()
+    assert max(len(line) for line in lines) <= 100
+    assert text.replace('\n+ ', ' ') == translate(str(ver), out='whole.sp')
@@ -0,0 +1,40 @@
+import pytest
+
+from cdlToCOFFE import CoffeLibGeneration
+from powerNets import PowerNets
+
+FOUNDRY = {'vdd': {'nets': ['VPWR', 'VPB']}, 'vss': {'nets': ['VGND', 'VNB'], 'patterns': ['vss', '^gnd_']}}
+
+def testDefaultRules():
+    power = PowerNets()
+    assert [power.classify(net) for net in ('VDD', 'vddl', 'VSS', 'GND', 'ground', 'A', 'VPWR')] == [
+        'vdd', 'vdd', 'vss', 'vss', 'vss', None, None]
+    #with gnd_is_vss False, the gnd nets are vdd rails
+    assert PowerNets(gnd_is_vss=False).classify('GND') == 'vdd'
+
+def testFoundryRules():
+    power = PowerNets(FOUNDRY)
+    assert [power.classify(net) for net in ('VPWR', 'vpb', 'VGND', 'VNB', 'gnd_a', 'VSSA', 'VDD', 'Z')] == [
+        'vdd', 'vdd', 'vss', 'vss', 'vss', 'vss', None, None]
+    #a class given in the rules replaces its default rules, the others are kept
+    assert power.classify('GROUND') == 'vss'
+    assert PowerNets(FOUNDRY).key() != PowerNets().key()
+
+def testInvalidRules():
+    with pytest.raises(ValueError):
+        PowerNets({'vcc': {'nets': ['VCC']}})
+    with pytest.raises(ValueError):
+        PowerNets({'vdd': {'names': ['VCC']}})
+
+def testFoundryCells(tmp_path):
+    lib = tmp_path / 'lib.cdl'
+    lib.write_text('.subckt INV A Y VPWR VGND VPB VNB\nMN0 Y A VGND VNB nmos l=0.1u w=0.4u\n'
+                   'MP0 Y A VPWR VPB pmos l=0.1u w=0.6u\n.ends\n')
+    def cell(power):
+        library = CoffeLibGeneration.buildCoffeLibrary(str(lib), 'p12', 'n12', 'n_vdd', 'n_gnd', True, power=power)
+        return library['subcircuit_info']['subcircuits'][0]
+    #with the default rules only VGND is a supply
+    assert cell(None)['vddvss_translation'] == {'n_vdd': [], 'n_gnd': ['VGND']}
+    foundry = cell(PowerNets(FOUNDRY))
+    assert foundry['vddvss_translation'] == {'n_vdd': ['VPWR', 'VPB'], 'n_gnd': ['VGND', 'VNB']}
+    assert foundry['ports'] == ['A', 'Y'] #the new supplies are global
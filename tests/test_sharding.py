@@ -0,0 +1,38 @@
+from conftest import dataFile, writeCommentedNetlist, writeNetlist
+from verilog2spice import Verilog2Spice
+
+def testShardsNeverStartInBlockComment(tmp_path):
+    ver_file = str(tmp_path / 'comment.v')
+    writeNetlist(ver_file)
+    shards = Verilog2Spice.shardVerilogFile(ver_file, 32)
+    assert len(shards) > 8
+    with open(ver_file, 'rb') as f:
+        data = f.read()
+    for start, end in shards:
+        #a cut is never between the opening and the closing of the comment
+        assert data.count(b'/*', 0, start) == data.count(b'*/', 0, start)
+
+def testShardedTranslationIsIdenticalToSerial(tmp_path, translate):
+    ver_file = str(tmp_path / 'comment.v')
+    writeNetlist(ver_file)
+    serial = translate(ver_file, out='serial.sp')
+    sharded = translate(ver_file, out='sharded.sp', workers=4)
+    assert 'XUC' not in serial
+    assert 'XUE ' in serial
+    assert sharded == serial
+
+def testShardedSampleNetlist(translate):
+    serial = translate(dataFile('top.v'), out='serial.sp')
+    sharded = translate(dataFile('top.v'), out='sharded.sp', workers=3)
+    assert sharded == serial
+
+def testShardsNeverCutAfterLineComments(tmp_path, translate):
+    ver_file = str(tmp_path / 'notes.v')
+    writeCommentedNetlist(ver_file)
+    with open(ver_file, 'rb') as f:
+        data = f.read()
+    for start, end in Verilog2Spice.shardVerilogFile(ver_file, 64)[1:]:
+        assert data[:start].endswith(b'/* done; */\n')
+    serial = translate(ver_file, out='serial.sp')
+    assert 'XU107 w_bus43_ w_bus44_ ' in serial
+    assert translate(ver_file, out='sharded.sp', workers=16) == serial
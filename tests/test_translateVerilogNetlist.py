@@ -0,0 +1,88 @@
+from conftest import dataFile, spiceText
+from translateVerilogNetlist import translateVerilogNetlist, Signal
+from verilog2spice import Verilog2Spice
+from verilogParser import VerilogParser
+
+NETLIST = '''module top (a, d, z, q);
+  input a;
+  input [3:0] d;
+  output [0:1] z;
+  output q;
+  reg [2:0] q;
+  wire [7:4] w;
+  wire [N-1:0] p;
+  wire \\b[0] ;
+  pair u1 (.x(d), .y(w));
+  INVX1 U2 (.INP(a), .ZN(z[0]));
+endmodule
+module pair (x, y);
+  input [3:0] x;
+  output [3:0] y;
+  INVX1 U1 (.INP(x[0]), .ZN(y[3]));
+endmodule
+'''
+
+def load(tmp_path):
+    ver_file = tmp_path / 'decl.v'
+    ver_file.write_text(NETLIST)
+    return str(ver_file), translateVerilogNetlist(verilogFile=str(ver_file), circuitTranslation={}, cellInfo={'subcircuits': []})
+
+def testDeclaredBusWidths(tmp_path):
+    ver_file, tvn = load(tmp_path)
+    assert tvn.signalWidth('d') == 4
+    assert tvn.signalWidth('z') == 2
+    assert tvn.signalWidth('w', 'top') == 4
+    assert tvn.signalWidth('a') == 1
+    assert tvn.signalWidth('b[0]') == 1 #escaped name
+    assert tvn.signalWidth('p') == None #range that is not a number
+    assert tvn.signalWidth('nope') == None
+    #the port direction is kept over the reg declaration
+    assert tvn.signal('q', 'top') == Signal('output', None, None, 4)
+    assert tvn.signalWidth('x', 'pair') == 4
+    assert tvn.moduleNames() == {'top', 'pair'}
+
+def testSpiceTranslationUsesTheIndex(tmp_path):
+    ver_file, tvn = load(tmp_path)
+    def translate(out, **kwargs):
+        Verilog2Spice.verilogNetlist2Spice(spi_files=[dataFile('lib.cdl')], ver_file=ver_file, out_file=str(tmp_path / out),
+                                           use_cache=False, **kwargs)
+        return spiceText(str(tmp_path / out))
+    direct = translate('direct.sp')
+    assert 'Xu1 d_bus0_ d_bus1_ d_bus2_ d_bus3_ w_bus4_ w_bus5_ w_bus6_ w_bus7_ pair' in direct
+    assert translate('index.sp', statements=tvn.translatedStatements(), module_names=tvn.moduleNames(), signals=tvn.signals) == direct
+    #the bus widths of the connections come from the index
+    signals = dict(tvn.signals)
+    signals['top'] = dict(signals['top'], w=Signal('wire', 5, 4, 6))
+    narrowed = translate('narrowed.sp', statements=tvn.translatedStatements(), module_names=tvn.moduleNames(), signals=signals)
+    assert 'Xu1 d_bus0_ d_bus1_ d_bus2_ d_bus3_ w_bus4_ w_bus5_ 0 0 pair' in narrowed
+
+REMAP = '''module top (a, y);
+  input a; output [1:0] y;
+  INVX1 U1 (.A(a), .Y(y[0]), .VDD(p), .VSS(g), .GND(g2), .BODY(b));
+  INVX1 U2 (.BODY(b), .Y(y[1]), .A(a), .GND(g));
+  INVX1 U3 (a, y[1]);
+  AND2X1 U4 (.A(a), .B(a), .Y(y[0]), .VDD(p));
+endmodule
+'''
+CELLS = {'INVX1': 'njf_INV', 'AND2X1': 'njf_AND2'}
+CELL_INFO = {'subcircuits': [
+    {'name': 'njf_INV', 'ports_changed': True, 'old_ports': ['A', 'Y', 'VDD', 'VSS', 'GND', 'BODY'], 'ports': ['A', 'Y', 'n_vdd', 'n_gnd'],
+     'vddvss_translation': {'n_vdd': ['VDD'], 'n_gnd': ['VSS', 'GND']}, 'unused_ports': ['BODY']},
+    {'name': 'njf_AND2', 'ports_changed': False}]}
+
+def testPortRemapTables(tmp_path):
+    ver_file = tmp_path / 'remap.v'
+    ver_file.write_text(REMAP)
+    tvn = translateVerilogNetlist(verilogFile=str(ver_file), circuitTranslation=CELLS, cellInfo=CELL_INFO)
+    #renames, supply folding and dropped unused ports in one table, only for the cells whose ports changed
+    assert tvn.remapTables == {'njf_INV': {'A': 'A', 'Y': 'Y', 'VDD': 'n_vdd', 'VSS': 'n_gnd', 'GND': 'n_gnd'}}
+    assert list(tvn.netlist.lines())[3:7] == ['njf_INV U1 ( .A(a), .Y(y[0]), .n_vdd(p), .n_gnd(g2) );',
+                                              'njf_INV U2 ( .Y(y[1]), .A(a), .n_gnd(g) );',
+                                              'njf_INV U3 (  );', #positional connections are dropped
+                                              'njf_AND2 U4 ( .A(a), .B(a), .Y(y[0]), .VDD(p) );']
+    #the same tables translate a netlist chunk by chunk
+    tables = translateVerilogNetlist(circuitTranslation=CELLS, cellInfo=CELL_INFO)
+    assert tables.translationDigest() == tvn.translationDigest()
+    statements = list(VerilogParser.parseFile(str(ver_file)))
+    chunks = list(tables.translateRecords(statements[:4])) + list(tables.translateRecords(statements[4:]))
+    assert chunks == list(tvn.translatedStatements())
@@ -0,0 +1,35 @@
+from verilogParser import VerilogParser, Module, Declaration, Instance, EndModule, Statement
+
+NETLIST = '''module top ( a, \\b[0] , y );
+  input a, \\b[0] ;
+  output [3:0] y; // a comment ; with a semicolon
+  wire /* block
+  comment ; */ n1;
+  INVX1 U1 ( .INP(a), .ZN(y[0]) );
+  AND2X1 \\U2/x  ( a, n1,
+     y[1] );
+  assign y[2] = a;
+endmodule
+'''
+
+def testParse():
+    records = list(VerilogParser.parse(NETLIST.splitlines(True)))
+    assert records == [
+        Module('top', ['a', '\\b[0]', 'y'], [], 'module top ( a, \\b[0] , y );'),
+        Declaration('input', None, None, ['a', '\\b[0]'], 'input a, \\b[0] ;'),
+        Declaration('output', 3, 0, ['y'], 'output [3:0] y;'),
+        Declaration('wire', None, None, ['n1'], 'wire n1;'),
+        Instance('INVX1', 'U1', [('INP', 'a'), ('ZN', 'y[0]')], 'INVX1 U1 ( .INP(a), .ZN(y[0]) );'),
+        Instance('AND2X1', '\\U2/x', [(None, 'a'), (None, 'n1'), (None, 'y[1]')], 'AND2X1 \\U2/x ( a, n1, y[1] );'),
+        Statement('assign y[2] = a;'),
+        EndModule('endmodule')]
+
+def testParseIsStreamed():
+    #a statement is yielded once its ';' is read, before the rest of the file
+    def lines():
+        yield 'module top ( a );\n'
+        yield '  INVX1 U1 ( .INP(a), .ZN(y) );\n'
+        raise AssertionError('read past the statement')
+    records = VerilogParser.parse(lines())
+    assert isinstance(next(records), Module)
+    assert next(records).name == 'U1'
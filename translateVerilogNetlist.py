@@ -1,105 +1,128 @@
+import hashlib
 import json
-import re
+from collections import namedtuple
+
+from compressedIO import CompressedIO
+from flowLog import FlowLog, DEBUG
+from flowMetrics import FlowMetrics
+from lineWrapper import LineWrapper
+from netlistModel import Netlist
+from verilogParser import VerilogParser, Module, Declaration
+
+#a declared signal: kind (input, output, wire, ...), msb/lsb (None for scalars) and the number of the
+#statement declaring it in the netlist, which is its line in the translated netlist before line wrapping
+Signal = namedtuple('Signal', ['kind', 'msb', 'lsb', 'statement'])
 
 class translateVerilogNetlist:
-    def __init__(self, verilogFile, circuitInfoFile='subcircuit_info.json', circuitTranslationFile = 'circuit_translation.json'):
+    def __init__(self, verilogFile=None, circuitInfoFile='subcircuit_info.json', circuitTranslationFile = 'circuit_translation.json',
+                 circuitTranslation=None, cellInfo=None):
+        #circuitTranslation and cellInfo can be handed over in memory (see CoffeLibGeneration.buildCoffeLibrary),
+        #otherwise they are read from circuitTranslationFile and circuitInfoFile.
+        #Without verilogFile only the translation tables are loaded, for translateRecords
         self.inputs = [] #include reg and wires
         self.outputs = []
         self.wires = []
         self.regs = []
         self.portTranslations = {}
-        minV = translateVerilogNetlist.minimumVerilogLines(verilogFile)
-        minLines = translateVerilogNetlist.joinLines(minV)
-        self.verilogLines = minLines
-        self.inputs = translateVerilogNetlist.grabSignals(self.verilogLines, 'input')
-        self.outputs = translateVerilogNetlist.grabSignals(self.verilogLines, 'output')
-        self.wires = translateVerilogNetlist.grabSignals(self.verilogLines, 'wire')
-        self.regs = translateVerilogNetlist.grabSignals(self.verilogLines, 'reg')
+        self.signals = {} #module name -> {signal name: Signal}, see signal(). Used by the SPICE translation for the bus widths
+        #the netlist is held as a compact Netlist: interned names, instances in array columns
+        self.netlist = None
+        if verilogFile != None:
+            with FlowMetrics.stage('translate.parse'):
+                self.netlist = Netlist.fromStatements(VerilogParser.parseFile(verilogFile))
+            FlowMetrics.fileRead(verilogFile)
+            FlowMetrics.count('translate.instances', self.netlist.instanceCount())
+            FlowMetrics.count('translate.pins', len(self.netlist.pin_id))
+            with FlowMetrics.stage('translate.declarations'):
+                self.indexDeclarations()
         # read in circuit and translation information
-        cTransF = open(circuitTranslationFile)
-        self.celltranslation = json.load(cTransF)
-        cTransF.close()
-        cInfoF = open(circuitInfoFile)
-        self.cellInfo = json.load(cInfoF)
-        cInfoF.close()
+        if circuitTranslation == None:
+            cTransF = open(circuitTranslationFile)
+            circuitTranslation = json.load(cTransF)
+            cTransF.close()
+        self.celltranslation = circuitTranslation
+        if cellInfo == None:
+            cInfoF = open(circuitInfoFile)
+            cellInfo = json.load(cInfoF)
+            cInfoF.close()
+        self.cellInfo = cellInfo
 
         self.cellNames = []
         for cell in self.cellInfo['subcircuits']:
             self.cellNames.append(cell['name'])
         self.extractPortTranslation()
-        self.replaceCells()
-        self.replacePorts()
-        for line in self.verilogLines:
-            print(line)
-        self.shortenLines()
-
-
-    def clean_whitespace(text):
-        return re.sub(r'\s+', ' ', text).strip()
-
-    def minimumVerilogLines(verilogFile:str) -> list:
-        vfile = open(verilogFile, 'r')
-        minlines = []
-        for line in vfile.readlines():
-            cleanedline = translateVerilogNetlist.clean_whitespace(line)
-            if '//' in cleanedline: #remove comments
-                cleanedline = cleanedline.split('//')[0] 
-            if(len(cleanedline) > 0):
-                # print(cleanedline)
-                minlines.append(cleanedline)
-        return minlines
-
-    def joinLines(lines, ends=[';', 'endmodule', 'begin']): #join multi-line statements
-        result = []
-        buffer = ""
-        for line in lines:
-            line = line.strip() #double check there are no whitespaces at the end
-            if buffer:
-                bufferEndsSuffix = False
-                for end in ends: #check if buffer ends with one of the ends
-                    if buffer.endswith(end):
-                        bufferEndsSuffix = True
-                        break
-                #if it does, just add it to the result as a line
-                if bufferEndsSuffix:
-                    result.append(buffer)
-                    buffer = line #start new buffer with current line
-                else:
-                    buffer += ' ' + line #append current line to end of buffer
+        self.remapTables = self.pinTables() #compiled once, used for the whole netlist or for every chunk
+        if self.netlist == None:
+            return
+        with FlowMetrics.stage('translate.cells'):
+            self.replaceCells()
+        with FlowMetrics.stage('translate.ports'):
+            self.replacePorts()
+        if FlowLog.enabled(DEBUG): #the whole translated netlist, only for --verbose
+            with FlowMetrics.stage('translate.echo'):
+                for line in self.netlist.lines():
+                    FlowLog.debug(line)
+
+    @property
+    def verilogLines(self) -> list:
+        #translated netlist as a list of lines (built on demand, prefer translatedLines() for large netlists)
+        return list(self.translatedLines())
+
+    def indexDeclarations(self) -> None:
+        #one pass over the statements that are not instances: fills self.signals and the inputs, outputs,
+        #wires and regs name lists. Signals are indexed by their plain name (see VerilogParser.unescape), a
+        #port direction takes precedence over a net declaration of the same name (see VerilogParser.supersedes).
+        #As in the SPICE translation, only the first definition of a module is indexed
+        byKind = {'input': self.inputs, 'output': self.outputs, 'wire': self.wires, 'reg': self.regs}
+        others = self.netlist.others
+        signals = self.signals.setdefault('', {}) #declarations outside of any module
+        for statement, k in enumerate(self.netlist.order):
+            if k >= 0: #instance
+                continue
+            stmt = others[-1 - k]
+            if isinstance(stmt, Module): #ANSI style port declarations
+                name = VerilogParser.unescape(stmt.name)
+                signals = self.signals.setdefault(name, {}) if name not in self.signals else {}
+                decls = stmt.declarations
+            elif isinstance(stmt, Declaration):
+                decls = (stmt,)
             else:
-                buffer = line
-        #add last line
-        if buffer:
-            result.append(buffer)
-
-        return result
-
-    def grabSignals(lines, type:str):
-        names = []
-        for line in lines:
-            if line.startswith(type):
-                #remove ; [:]
-                typelessline = str(line).replace(type, '')
-                typelessline = typelessline.replace(';', '')
-                typelessline = re.sub(r'\[\d+:\d+\]', '', typelessline) #removes [number:number]
-                #loop through everything separated by commas
-                for name in typelessline.split(','):
-                    names.append(name.strip())
-        return names
+                continue
+            for decl in decls:
+                names = byKind.get(decl.kind)
+                if names != None:
+                    names.extend(decl.names)
+                for name in decl.names:
+                    name = VerilogParser.unescape(name)
+                    if VerilogParser.supersedes(signals.get(name), decl):
+                        signals[name] = Signal(decl.kind, decl.msb, decl.lsb, statement)
+        if not self.signals['']:
+            del self.signals['']
+
+    def signal(self, name: str, module=None) -> Signal:
+        #declaration of a signal (plain name, without the backslash of an escaped name), None if it is not declared.
+        #module : name of the module declaring it, by default the first module that does
+        if module != None:
+            return self.signals.get(module, {}).get(name)
+        for signals in self.signals.values():
+            if name in signals:
+                return signals[name]
+        return None
+
+    def signalWidth(self, name: str, module=None) -> int:
+        #number of bits of a declared signal, None if it is not declared or its range is not a number
+        signal = self.signal(name, module)
+        if signal == None:
+            return None
+        if signal.msb == None:
+            return 1
+        if not (isinstance(signal.msb, int) and isinstance(signal.lsb, int)):
+            return None
+        return abs(signal.msb - signal.lsb) + 1
 
     def replaceCells(self):
-        result = []
-        for line in self.verilogLines:
-            #see if line begins with a cell name
-            split = line.split(' ')
-            beginning = split[0].strip()
-            rest = ' '.join(split[1:])
-            if beginning in self.celltranslation.keys():
-                newline = self.celltranslation[beginning] + ' ' + rest
-                result.append(newline)
-            else:
-                result.append(line)
-        self.verilogLines = result
+        #cell types are interned, so this renames each distinct type once
+        self.netlist.renameCells(self.celltranslation)
 
     def extractPortTranslation(self):
         self.portTranslations = {}
@@ -128,97 +151,71 @@ class translateVerilogNetlist:
                                 translation[op] = key
                 #now add the translation. Form =  circuitname : translation_dictionary
                 self.portTranslations[name] = translation
-        for key in self.portTranslations:
-            print(key)
-            print(self.portTranslations[key])
+        if FlowLog.enabled(DEBUG):
+            for key in self.portTranslations:
+                FlowLog.debug(key)
+                FlowLog.debug(str(self.portTranslations[key]))
                             
-    def replacePorts(self) -> list:
-        newlines = []
-        portPattern = r'\.(\w+)\(([^)]+)\)'
-        for line in self.verilogLines:
-            split = line.split(' ')
-            type = split[0].strip()
-            if type in self.cellNames and len(split) > 1:
-                if type in self.portTranslations.keys():
-                    #get name
-                    name = split[1]
-                    #if its an instance of a shell, go ahead
-                    port_matches = re.findall(portPattern, line)
-                    port_dict = {port: connection for port, connection in port_matches}
-                    
-                    #go through and replace the ports
-                    newports = {}
-                    for key in port_dict.keys():
-                        #check if there is a translation. If not, it is an unused port to be removed
-                        if key in self.portTranslations[type].keys():
-                            newportname = self.portTranslations[type][key]
-                            newports[newportname] = port_dict[key]
-                    print('translated ' + type + ' ports from ' + str(port_dict) + ' to ' + str(newports))
-
-                    newline = type + ' ' + name + ' ( '
-                    first = True
-                    for port in newports.keys():
-                        if not first:
-                            newline += ', '
-                        else:
-                            first = False
-                        newline += '.' + port + '(' + newports[port] + ')'
-                    newline += ' );'
-                    newlines.append(newline) 
-                else:
-                    newlines.append(line)
-            else:#no translation map. therefore, keep it the same
-                newlines.append(line)
-        self.verilogLines = newlines
-        return
+    def pinTables(self) -> dict:
+        #cell name -> {old pin: new pin}, for the cells of the new library whose ports changed
+        cellNames = set(self.cellNames)
+        tables = {}
+        for type, translation in self.portTranslations.items():
+            if type in cellNames:
+                tables[type] = translation
+        return tables
+
+    def replacePorts(self) -> None:
+        #ports missing from a translation are unused ports and are removed
+        self.netlist.remapPins(self.remapTables)
+
+    def translateRecords(self, statements):
+        #translated records of a part of a netlist, e.g. one chunk of an incremental translation
+        #(see Verilog2Spice.verilogNetlist2Spice). Every instance is translated on its own, so the result
+        #is the same as for the whole netlist
+        netlist = Netlist.fromStatements(statements)
+        netlist.renameCells(self.celltranslation)
+        netlist.remapPins(self.remapTables)
+        return netlist.statements()
+
+    def translationDigest(self) -> str:
+        #identifies the cell and pin translations, e.g. in the manifest of an incremental translation
+        tables = json.dumps([self.celltranslation, self.remapTables], sort_keys=True)
+        return hashlib.sha1(tables.encode('utf-8')).hexdigest()
 
     def breakLineUp(string, limit=150, min_length = 20, newline_prefix=''):
-        parts = [string]
-        longest_length = max(len(part) for part in parts)
-        somethingBroken = True #keeps track if you are still shortening strings. If you can't shorten anything anymore, just stop
-        while longest_length > limit and somethingBroken:
-            # print('over limit\n')
-            somethingBroken = False
-            #loop through list and break long strings in 2
-            for s in parts:
-                # print('loop2: ' + s)
-                if len(s) > limit and len(s) > min_length:
-                    # print('loop3: ' + s)
-                    #go to char 150. Go backwards until it finds a space
-                    for i in range(limit,1, -1): #don't need to look at 0 since it's the end
-                        print(i)
-                        if s[i] == ' ': #if s is a space. break it
-                            part1 = s[0:i]
-                            part2 = newline_prefix + s[i+1:] #remove the space
-                            newparts = []
-                            for p in parts: #now loop through and replace the broken part while keeping the others
-                                if s == p:
-                                    newparts.append(part1)
-                                    newparts.append(part2)
-                                else:
-                                    newparts.append(p)
-                            parts = newparts
-                            somethingBroken = True
-                            break
-        return parts
-
-    def shortenLines(self) -> None:
-        newlines = []
-        for line in self.verilogLines:
-            if len(line) > 150: #if too long, break it up
-                brokenLines = translateVerilogNetlist.breakLineUp(line, 150, 30)
-                # print('brokenlines ' + str(brokenLines))
-                for bl in brokenLines:
-                    newlines.append(bl)
+        #cuts string at spaces (token boundaries) into parts of at most limit characters, see lineWrapper.py
+        return LineWrapper.wrap(string, limit, min_length, newline_prefix)
+
+    def shortenLines(lines, limit=150):
+        wrapped = 0
+        for line in lines:
+            if len(line) > limit: #if too long, break it up
+                wrapped += 1
+                yield from translateVerilogNetlist.breakLineUp(line, limit, 30)
             else:
-                newlines.append(line)
-        self.verilogLines = newlines
-
-    def outputTranslatedVerilog(self, filename: str) -> None:
-        file = open(filename, 'w+')
-        for line in self.verilogLines:
-            file.write(line + '\n')
-        file.close()
+                yield line
+        FlowMetrics.count('translate.wrapped_lines', wrapped)
+
+    def translatedLines(self):
+        return translateVerilogNetlist.shortenLines(self.netlist.lines())
+
+    def moduleNames(self) -> set:
+        #names of the modules defined in the netlist
+        return set(name for name in self.signals if name != '')
+
+    def translatedStatements(self):
+        #statement records of the translated netlist, for handing over to Verilog2Spice without a temporary file
+        return self.netlist.statements()
+
+    def outputTranslatedVerilog(self, filename: str, level=None) -> None:
+        #compressed when filename ends with .gz, .xz or .bz2
+        with FlowMetrics.stage('translate.write'):
+            file = CompressedIO.openOutput(filename, level=level)
+            for line in self.translatedLines():
+                file.write(line + '\n')
+            file.close()
+        FlowMetrics.fileWritten(filename)
         return
 
 if __name__ == '__main__':
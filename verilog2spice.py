@@ -16,39 +16,308 @@
 #     distributed under GNU GPLv3
 ##############################################################################
 
+import argparse
+import collections
+import contextlib
+import functools
+import multiprocessing
+import os
 import sys
-import re
+import zlib
 from datetime import datetime
 
+from compressedIO import CompressedIO
+from ecoManifest import EcoManifest
+from flowLog import FlowLog, Diagnostics, WARNING, MAX_MESSAGES
+from flowMetrics import FlowMetrics
+from libraryCache import LibraryCache
+from lineWrapper import LineWrapper, SPICE_CONTINUATION
+from verilogParser import VerilogParser, Module, Declaration, Instance, EndModule, DIRECTIONS
+
+SHARD_STATE = {}  # read-only data of a shard worker process, see Verilog2Spice.initShardWorker
+ECO_CHUNK_LINES = 64  # average number of statement lines of an incremental translation chunk
+ECO_CHUNK_BYTES = 1 << 20  # a chunk is also cut once it reaches this size
+PortRange = collections.namedtuple('PortRange', ['name', 'msb', 'lsb'])  # port of a module, msb/lsb None for a scalar.
+                                                                         # A bus is only expanded bit by bit when written
+LIBRARY_POOL_BYTES = 16 << 20  # several libraries adding up to this size are loaded in parallel processes
+SPICE_LINE_WIDTH = 0  # longer SPICE lines are cut into '+' continuation lines, 0 for no limit (the default, lines are kept whole)
+
 class Verilog2Spice:
-	def verilogNetlist2Spice(spi_files=[],ver_file='', out_file='', pos_pwr='VDD', neg_pwr='VSS', del_on=True):
-	# spi_files = []
-	# ver_file = ''
-	# out_file = ''
-	# pos_pwr = 'VDD'
-	# neg_pwr = 'VSS'
-	# del_on = False
-
-		# for arg in range(1,len(sys.argv)) : # parse all arguments 
-		# 	if sys.argv[arg] == '-spice' :
-		# 			spi_files.append(sys.argv[arg+1])
-		# 	elif sys.argv[arg] == '-verilog' :
-		# 			if ver_file != "" :
-		# 				print ('ERROR : only one structured Verilog netlist can be specified !')
-		# 			else :
-		# 				ver_file = sys.argv[arg+1]
-		# 	elif sys.argv[arg] == '-output' :
-		# 			if out_file != "" :
-		# 				print ('ERROR : only one output Spice netlist can be specified !')
-		# 			else :
-		# 				out_file = sys.argv[arg+1]
-		# 	if sys.argv[arg] == '-pos_pwr' :
-		# 			pos_pwr = sys.argv[arg+1]
-		# 	if sys.argv[arg] == '-neg_pwr' :
-		# 			neg_pwr = sys.argv[arg+1]
-		# 	elif sys.argv[arg] == '-delimiter' :
-		# 		del_on = True
-				
+	def parseSpiceLibrary(spi_file):
+		# returns the cells of a SPICE library file as a list of [cell_name, pin1, pin2, ...]
+		spifl  = CompressedIO.openInput(spi_file)  # open a SPICE library file, plain or compressed
+		cells = Verilog2Spice.parseSpiceLines(spifl)
+		spifl.close()
+		return cells
+
+	def parseSpiceLines(lines):
+		# same as parseSpiceLibrary for SPICE text already in memory (any iterable of lines)
+		cells = []
+		cell_num = 0
+		subckt_on = False
+		for line1 in lines:
+			words = line1.rstrip('\r\n').strip().split()
+			if len(words) > 0:
+				if words[0].upper().find('SUBCKT') == 1 :
+					subckt_on = True
+					words.pop(0)
+					cells.append(words)
+				elif subckt_on and words[0] == '+' : # case of .SUBCKT defined on several lines
+					cells[cell_num].extend(words)  # store each cell_name and pins in a list
+				else :
+					subckt_on = False
+				if words[0].upper().find('ENDS') == 1 : # end of SUBCKT
+					cell_num += 1
+		return cells
+
+	def loadSpiceLibrary(spi_file, cache=None):
+		# parse a SPICE library, going through the persistent cache when one is given
+		if cache != None :
+			cells = cache.load(spi_file)
+			if cells != None :
+				return cells
+		cells = Verilog2Spice.parseSpiceLibrary(spi_file)
+		if cache != None :
+			cache.store(spi_file, cells)
+		return cells
+
+	def loadLibraryWorker(job):
+		# loads one library in a worker process of loadSpiceLibraries, going through the cache when one is given
+		spi_file, cache_dir, rebuild = job
+		cache = LibraryCache(cache_dir, rebuild=rebuild) if cache_dir != None else None
+		return Verilog2Spice.loadSpiceLibrary(spi_file, cache)
+
+	def loadSpiceLibraries(spi_files, cache=None):
+		# cell table of each library, in the order of spi_files. Several libraries adding up to LIBRARY_POOL_BYTES
+		# or more are loaded (cache lookup, parsing, cache update) by a pool of processes, one library each
+		processes = min(len(spi_files), os.cpu_count() or 1)
+		plain = all(CompressedIO.isPlainFile(spi_file) for spi_file in spi_files)
+		size = sum(os.path.getsize(spi_file) for spi_file in spi_files) if plain else 0
+		if processes < 2 or size < LIBRARY_POOL_BYTES :
+			return [Verilog2Spice.loadSpiceLibrary(spi_file, cache) for spi_file in spi_files]
+		jobs = [(spi_file, cache.cache_dir if cache != None else None, cache != None and cache.rebuild) for spi_file in spi_files]
+		with multiprocessing.Pool(processes) as pool :
+			return pool.map(Verilog2Spice.loadLibraryWorker, jobs, chunksize=1)
+
+	def indexCells(libraries, diagnostics=None):
+		# cell_name -> list of pins, from (library name, cells) pairs in order. The first definition of a cell wins,
+		# as in the original linear search. Later definitions are reported as duplicate_cell warnings
+		library = {}
+		origin = {}  # cell_name -> library defining it
+		for name, cells in libraries :
+			for cell in cells :
+				if cell[0] not in library :
+					library[cell[0]] = cell[1:]
+					origin[cell[0]] = name
+				elif diagnostics != None :
+					diagnostics.warning('duplicate_cell', (cell[0],), 'Warning : cell ' + cell[0] + ' of ' + name + ' is already defined in ' + origin[cell[0]] + ', the first definition is used !')
+		return library
+
+	def compilePinTemplates(library, pos_pwr, neg_pwr):
+		# cell_name -> tuple of (pin, supply) in SPICE pin order. supply is the power net to connect
+		# for pos_pwr/neg_pwr pins, None for pins whose node comes from the verilog instance
+		templates = {}
+		for cell_name, pins in library.items() :
+			templates[cell_name] = tuple((pin, pin if pin == pos_pwr or pin == neg_pwr else None) for pin in pins)
+		return templates
+
+	@functools.lru_cache(maxsize=1 << 20)
+	def spiceNode(net, del_on):
+		# SPICE node name of a verilog net or bit, memoized per net
+		node = VerilogParser.unescape(net)
+		if del_on :  # change the busses delimiter
+			node = node.replace('[','_bus').replace(']','_')
+		return node
+
+	def translateInstance(stmt, templates, del_on, counts, diagnostics, width=0):
+		# SPICE line of one instance of a library cell, '' if it cannot be translated.
+		# counts[0] / counts[1] are incremented for cells / pins not found, messages go to diagnostics (see flowLog.py)
+		# width : the line is cut into '+' continuation lines of at most width characters (0 : no limit)
+		instance = VerilogParser.unescape(stmt.name)
+		if instance[0] != 'X' :  # avoid double XX at the beginning of the instance name
+			instance = 'X' + instance
+		cell_name = stmt.type
+		ports = {}  # verilog pin name -> netlist node, first connection wins
+		for pin, net in stmt.pins :
+			if pin is not None and pin not in ports :
+				ports[pin] = net
+		if len(ports) == 0 :
+			diagnostics.warning('no_named_port', (cell_name,), 'Warning : instance ' + instance + ' has no named port connection, skipped !')
+			return ''
+		nodes = [instance]
+		for pin, supply in templates[cell_name] : # pin order of the cell stored with the SPICE
+			if supply is not None :
+				nodes.append(supply)
+			elif pin in ports : # if the verilog pin name = spice pin name
+				nodes.append(Verilog2Spice.spiceNode(ports[pin], del_on))
+			else :
+				if diagnostics.note(WARNING, 'missing_pin', (cell_name, pin)) :  # the message is only built when printed
+					diagnostics.show(WARNING, 'missing_pin', 'Warning : pin ' + pin + ' of the Spice netlist not found for the cell ' + instance + ' of the Verilog netlist !  Connecting to ground (0) by default.')
+				nodes.append('0')
+				counts[1] += 1
+		nodes.append(cell_name)
+		return LineWrapper.spiceLine(nodes, width)
+
+	def translateStatements(statements, templates, del_on, counts, diagnostics, width=0):
+		# yields the SPICE line of each instance of a library cell and every other record unchanged
+		# (instances of verilog modules are resolved by the ModuleWriter)
+		nb_instances = 0
+		nb_pins = 0
+		for stmt in statements :
+			if isinstance(stmt, Instance) and stmt.type in templates :
+				nb_instances += 1
+				nb_pins += len(stmt.pins)
+				yield Verilog2Spice.translateInstance(stmt, templates, del_on, counts, diagnostics, width)
+			else :
+				yield stmt
+		counts[2] += nb_instances
+		counts[3] += nb_pins
+
+	def shardVerilogFile(ver_file, nb_shards):
+		# cut the file into about nb_shards byte ranges. Each cut is placed right after a line ending
+		# a statement (see VerilogParser.statementEnd), so that no statement or comment is split. The file
+		# is scanned from the start to know where the block comments are
+		size = os.path.getsize(ver_file)
+		cuts = [0]
+		target = size // nb_shards
+		with open(ver_file, 'rb') as verfl :
+			pos = 0
+			in_block = False
+			for line1 in verfl :
+				pos += len(line1)
+				ends, in_block = VerilogParser.statementEnd(line1, in_block)
+				if ends and pos >= target and pos < size :
+					cuts.append(pos)
+					if len(cuts) == nb_shards :
+						break
+					target = len(cuts) * size // nb_shards
+		cuts.append(size)
+		return [(cuts[i], cuts[i+1]) for i in range(len(cuts)-1)]
+
+	def readShardLines(ver_file, start, end):
+		with open(ver_file, 'rb') as verfl :
+			verfl.seek(start)
+			pos = start
+			while pos < end :
+				line1 = verfl.readline()
+				if not line1 :
+					break
+				pos += len(line1)
+				yield line1.decode('utf-8', 'replace')
+
+	def initShardWorker(templates, del_on, width, limit):
+		# the cell table is set once per worker process and only read afterwards
+		SHARD_STATE['templates'] = templates
+		SHARD_STATE['del_on'] = del_on
+		SHARD_STATE['width'] = width
+		SHARD_STATE['limit'] = limit
+
+	def translateShard(shard):
+		# translate one byte range of the verilog netlist in a worker process.
+		# Returns the events in order (consecutive SPICE lines joined in one string), the counts and the diagnostics
+		ver_file, start, end = shard
+		counts = [0, 0, 0, 0]
+		diagnostics = Diagnostics(SHARD_STATE['limit'], echo=False)
+		events = []
+		lines = []
+		statements = VerilogParser.parse(Verilog2Spice.readShardLines(ver_file, start, end))
+		for event in Verilog2Spice.translateStatements(statements, SHARD_STATE['templates'], SHARD_STATE['del_on'], counts, diagnostics, SHARD_STATE['width']) :
+			if isinstance(event, str) :
+				lines.append(event)
+				continue
+			if lines :
+				events.append(''.join(lines))
+				lines = []
+			events.append(event)
+		if lines :
+			events.append(''.join(lines))
+		return events, counts, diagnostics
+
+	def translateShardedFile(ver_file, templates, del_on, workers, counts, diagnostics, width=0):
+		# same events as translateStatements, computed by a pool of processes and merged in the file order
+		shards = [(ver_file, start, end) for start, end in Verilog2Spice.shardVerilogFile(ver_file, workers * 4)]
+		with multiprocessing.Pool(workers, initializer=Verilog2Spice.initShardWorker, initargs=(templates, del_on, width, diagnostics.limit)) as pool :
+			for events, shard_counts, shard_diagnostics in pool.imap(Verilog2Spice.translateShard, shards) :
+				diagnostics.merge(shard_diagnostics)
+				for i in range(len(counts)) :
+					counts[i] += shard_counts[i]
+				yield from events
+
+	def chunkVerilogFile(ver_file):
+		# content defined chunks of a plain netlist file, for incremental translations. A chunk ends after a line
+		# ending a statement (see VerilogParser.statementEnd, as for shardVerilogFile) whose crc32 is a multiple of
+		# ECO_CHUNK_LINES, or once it reaches ECO_CHUNK_BYTES. The cuts only depend on the lines themselves and on
+		# the block comments open before them, so an edit only changes the chunks around it
+		with open(ver_file, 'rb') as verfl :
+			lines = []
+			size = 0
+			in_block = False
+			for line1 in verfl :
+				lines.append(line1)
+				size += len(line1)
+				ends, in_block = VerilogParser.statementEnd(line1, in_block)
+				if ends and (zlib.crc32(line1.rstrip()) % ECO_CHUNK_LINES == 0 or size >= ECO_CHUNK_BYTES) :
+					yield b''.join(lines)
+					lines = []
+					size = 0
+			if lines :
+				yield b''.join(lines)
+
+	def translateIncremental(ver_file, old_file, manifest, templates, del_on, transform, writer, counts):
+		# translate ver_file chunk by chunk through the writer. The SPICE lines of the chunks found in the manifest
+		# are read from the previous output (old_file, None when there is no valid previous run), the other chunks
+		# are parsed and translated. The spans of the chunks made only of cell instances are recorded for the next run
+		outfl = writer.outfl
+		diagnostics = writer.diagnostics
+		for chunk in Verilog2Spice.chunkVerilogFile(ver_file) :
+			digest = EcoManifest.chunkDigest(chunk)
+			span = manifest.lookup(digest)  # never found without a valid previous run
+			if span != None :
+				offset, length, chunk_counts, chunk_state = span
+				old_file.seek(offset)
+				events = [old_file.read(length).decode('utf-8')]
+				chunk_diagnostics = Diagnostics.fromState(chunk_state, diagnostics.limit)
+			else :
+				chunk_counts = [0, 0, 0, 0]
+				chunk_diagnostics = Diagnostics(diagnostics.limit, echo=False)
+				statements = VerilogParser.parse(chunk.decode('utf-8', 'replace').splitlines(True))
+				if transform != None :
+					statements = transform(statements)
+				events = list(Verilog2Spice.translateStatements(statements, templates, del_on, chunk_counts, chunk_diagnostics, writer.width))
+			diagnostics.merge(chunk_diagnostics)
+			for i in range(len(counts)) :
+				counts[i] += chunk_counts[i]
+			if writer.skip or writer.pending or not all(isinstance(event, str) for event in events) :
+				for event in events :
+					writer.process(event)
+				continue
+			writer.openSubckt()  # written before the first line of the chunk anyway, kept out of its span
+			start = outfl.tell()
+			for event in events :
+				writer.process(event)
+			manifest.record(digest, start, outfl.tell() - start, chunk_counts, chunk_diagnostics.state())
+
+	def verilogNetlist2Spice(spi_files=[],ver_file='', out_file='', pos_pwr='VDD', neg_pwr='VSS', del_on=True, use_cache=True, rebuild_cache=False,
+	                        cells=None, statements=None, workers=1, compress_level=None, incremental=False, transform=None, transform_key='',
+	                        line_width=SPICE_LINE_WIDTH, diagnostics=None, module_names=None, signals=None):
+		# cells : already parsed library ([cell_name, pin1, ...] lists), spi_files are then only used for the .INCLUDE
+		# statements : VerilogParser records of the netlist (e.g. translateVerilogNetlist.translatedStatements()),
+		#              ver_file is then only used as the source name in the header
+		# workers : number of processes translating shards of ver_file in parallel (plain file input only)
+		# compress_level : compression level when out_file ends with .gz, .xz or .bz2
+		# incremental : reuse the SPICE lines of the unchanged parts of ver_file from the previous run, recorded
+		#               in the manifest out_file + '.eco' (see ecoManifest.py). Plain ver_file and out_file only
+		# transform : function applied to the records parsed from ver_file before their translation, one instance
+		#             at a time (e.g. translateVerilogNetlist.translateRecords), identified by transform_key in the manifest
+		# line_width : longer SPICE lines are cut into '+' continuation lines, 0 for no limit
+		# diagnostics : Diagnostics collecting the warnings and errors of the translation (see flowLog.py),
+		#               e.g. to write them to a file afterwards. Only the first ones are printed, then a summary
+		# module_names : names of the verilog modules of the netlist. By default they are found by a pre-scan of ver_file
+		#                (none with statements or for '-', so a module used before its definition is then an unknown cell)
+		# signals : declaration index of the netlist (translateVerilogNetlist.signals), for the bus widths of the
+		#           module instance connections. Only with statements, which it has to describe
+		# spi_files, ver_file and out_file can be compressed (.gz, .xz, .bz2), ver_file and out_file can be '-'
+		# returns the counts : cells and pins of the verilog netlist not found in the SPICE netlist, instances and pins translated
 		if len(spi_files) == 0 :
 			sys.exit("Spice library netlist not specified")
 		if ver_file == "" :
@@ -56,149 +325,401 @@ class Verilog2Spice:
 		if out_file == "" :
 			sys.exit("Output Spice netlist not specified")
 		if del_on :
-			print ('The positive power supply is : ' + pos_pwr + '  The negative one : ' + neg_pwr + '  Busses are delimited by _bus:_')
+			FlowLog.info('The positive power supply is : ' + pos_pwr + '  The negative one : ' + neg_pwr + '  Busses are delimited by _bus:_')
 		else :
-			print ('The positive power supply is : ' + pos_pwr + '  The negative one : ' + neg_pwr + '  Busses are delimited by [:]')
+			FlowLog.info('The positive power supply is : ' + pos_pwr + '  The negative one : ' + neg_pwr + '  Busses are delimited by [:]')
 
-		nb_subckt = 0  # number of cells in the spice netlist
-		cells = []   # list of cell of the spice netlist
-		cell_num = 0 #same as nb_subckt + 1
-		inst_on = False
-		subckt_on = False
 		spi_inc = ""
+		if diagnostics == None :
+			diagnostics = Diagnostics()
 
 		# parse the SPICE cells library file :
 		######################################
+		laps = FlowMetrics.laps()
+		if cells == None :
+			cache = LibraryCache(rebuild=rebuild_cache) if use_cache else None
+			libraries = list(zip(spi_files, Verilog2Spice.loadSpiceLibraries(spi_files, cache)))
+			for spi_file in spi_files :
+				FlowMetrics.fileRead(spi_file)
+		else :
+			libraries = [(spi_files[0], cells)]
 		for spi_file in spi_files :
-			spifl  = open(spi_file,'r')  # open a SPICE library file
 			if spi_file.find('\\') != -1 : # remove any path from the reference SPICE netlist
 				spi_file = spi_file[spi_file.rfind('\\')+1:]
 			if spi_file.find('/') != -1 : # remove any path from the reference SPICE netlist
 				spi_file = spi_file[spi_file.rfind('/')+1:]
 			spi_inc = spi_inc + spi_file + ' '
-			for line1 in spifl:
-				words = line1.rstrip('\r\n').strip().split()
-				if len(words) > 0:
-					if words[0].upper().find('SUBCKT') == 1 :
-						subckt_on = True
-						nb_subckt += 1
-						words.pop(0)
-						cells.append(words)
-					elif subckt_on and words[0] == '+' : # case of .SUBCKT defined on several lines
-						cells[cell_num].extend(words)  # store each cell_name and pins in a list
-					else :
-						subckt_on = False
-					if words[0].upper().find('ENDS') == 1 : # end of SUBCKT
-						#print (cells[cell_num])
-						cell_num += 1
-			spifl.close()
+		nb_subckt = sum(len(cells) for name, cells in libraries)  # number of cells in the spice netlist
 
 		if nb_subckt == 0 :
 			sys.exit('\nERROR : NO subckt found in the Spice netlist !\n')
 		else :
-			print ('... end of SPICE netlist parsing : ' + str(nb_subckt) + ' cells found in the SPICE netist.\n')
+			FlowLog.info('... end of SPICE netlist parsing : ' + str(nb_subckt) + ' cells found in the SPICE netist.\n')
+
+		templates = Verilog2Spice.compilePinTemplates(Verilog2Spice.indexCells(libraries, diagnostics), pos_pwr, neg_pwr)
+		laps.lap('v2s.library')
+		FlowMetrics.count('v2s.library_cells', nb_subckt)
 
 		# parse the VERILOG netlist :
 		#############################
-		verfl  = open(ver_file,'r')  # open VERILOG file to translate
-		outfl = open(out_file,'w')   # open the output SPICE netlist
+		if incremental and (statements != None or not CompressedIO.isPlainFile(ver_file) or out_file == '-' or CompressedIO.outputFormat(out_file) != '') :
+			FlowLog.warning('Warning : an incremental translation needs a plain verilog file and a plain output file. Translating everything.')
+			incremental = False
+		if incremental :  # the new netlist is written next to the previous one, which is read for the unchanged chunks
+			manifest = EcoManifest(out_file, EcoManifest.settingsKey(sorted(templates.items()), pos_pwr, neg_pwr, del_on, transform_key, line_width))
+			old_file = open(out_file, 'rb') if manifest.load() else None
+			outfl = CompressedIO.openOutput(out_file + '.tmp', encoding='utf-8')
+		else :
+			outfl = CompressedIO.openOutput(out_file, level=compress_level)   # open the output SPICE netlist
 
-		nb_subckt = 0
-		nb_pins = 0
 		outfl.write('*\n*  ' + out_file + ' : SPICE netlist translated from the VERILOG netlist : ' + ver_file + '\n')
 		outfl.write('*'+ ' '* (len(out_file) + 5 ) + 'on the ' + str(datetime.now())+ '\n*\n')
 		outfl.write('*' * (len(out_file) + len(ver_file) + 60) + '\n\n')
 		outfl.write('.INCLUDE ' + spi_inc + '\n\n')
 
-		for line1 in verfl:
-			words = line1.rstrip('\r\n').strip().split()
-			if len(words) > 0:
-				if words[0].upper().find('MODULE') == 0 : #first build the toplevel subckt
-					subckt_name = words[1]
-					subckt = '.SUBCKT ' + subckt_name + ' '
-				if words[0].upper().startswith('INPUT') or words[0].upper().startswith('OUTPUT') or words[0].upper().startswith('INOUT') :
-					subckt_on = True
-					if line1.find('[') == -1 : # pins that are not a bus
-						subckt += line1[line1.find(words[0])+6:].strip() + ' '
-						subckt = subckt.replace(',','')
-						subckt = subckt.replace(';','')
-						
-					else : # busses treatment
-						lsb = min(int(line1[line1.find('[')+1 : line1.find(':')]) , int(line1[line1.find(':')+1 : line1.find(']')]))
-						msb = max(int(line1[line1.find('[')+1 : line1.find(':')]) , int(line1[line1.find(':')+1 : line1.find(']')]))		
-						words = re.split(', *', line1[line1.find(']')+1:].rstrip('\r\n').strip().replace(';',''))
-						for word in words:
-							for i in range(lsb,msb+1): # spread each bit of each bus
-								subckt += word + '[' + str(i) + '] '
-
-			if subckt_on and line1.find('(')>0 : # first cell detected : write the toplevel .SUBCKT
-				subckt_on = False
-				if del_on :  # change the busses delimiter
-					subckt = subckt.replace('[','_bus').replace(']','_')
-				outfl.write('.GLOBAL ' + pos_pwr + ' ' + neg_pwr + '\n\n' + subckt + '\n\n')
-
-			if (not subckt_on) and (not inst_on) and re.search(r'\(\s*\.',line1) and words[0].upper().find('MODULE') != 0 and line1.strip()[0:2].find('//') != 0 :
-				words = line1.rstrip('\r\n').strip().split()
-				if words[1][0] == 'X' :  # avoid double XX at the beginning of the instance name
-					instance = words[1]
-				else :
-					instance = 'X' + words[1]		
-				subckt = words[0]
-				inst_on = True
-				line2 = line1[line1.find('(')+1:]
-			elif (not subckt_on) and inst_on :  # store all the instance description into line2
-				line2 = line2 + line1
-
-			if inst_on and line1.find(';')>0 : # end of the cell description
-				inst_on = False
-				if del_on :  # change the busses delimiter
-					line2 = line2.replace('[','_bus').replace(']','_')
-				pins=[]  # list of pins
-				nodes=[]  # list of netlist nodes
-				words = line2.rstrip('\r\n').strip().split('.')
-				all_pins = '  '
-				for word in words :
-					pins.append(word[:word.find('(')])
-					nodes.append(word[word.find('(')+1:word.find(')')])
-				i = 0
-				while i < len(cells) and subckt != cells[i][0] : # search for the cell on the list of cells stored with the SPICE
-					i += 1
-				if i == len(cells) :
-					print ('ERROR : subckt ' + subckt + ' not found in the Spice netlist !')
-					nb_subckt += 1
-				else :
-					inst_name = instance
-					for pin in range(1,len(cells[i])) : # search for the pins of the SPICE subckt
-						if cells[i][pin] == pos_pwr :
-							instance = instance + ' ' + pos_pwr
-						elif cells[i][pin] == neg_pwr :
-							instance = instance + ' ' + neg_pwr
-						else :
-							j = 0
-							while j < len(pins) and cells[i][pin] != pins[j] : # if the verilog pin name = spice pin name
-								j += 1
-							if j == len(nodes) :
-								print ( 'Warning : pin ' + cells[i][pin] + ' of the Spice netlist not found for the cell ' + inst_name + ' of the Verilog netlist !  Connecting to ground (0) by default.')
-								instance = instance + ' 0'
-								nb_pins += 1
-							else :
-								instance = instance + ' ' + nodes[j]
-					# print (instance + ' ' + subckt)
-					outfl.write(instance + ' ' + subckt + '\n')
-
-		outfl.write('\n' + '.ENDS ' + subckt_name )
+		counts = [0, 0, 0, 0]  # cells and pins from the verilog netlist not found in the SPICE netlist, instances and pins translated
+
+		if workers > 1 and statements == None and not CompressedIO.isPlainFile(ver_file) :
+			FlowLog.warning('Warning : ' + ver_file + ' is compressed or a stream, it cannot be cut into shards. Translating with one process.')
+			workers = 1
+		if module_names == None :
+			module_names = VerilogParser.moduleNames(ver_file) if statements == None and ver_file != '-' else set()
+		writer = ModuleWriter(outfl, pos_pwr, neg_pwr, del_on, counts, diagnostics, line_width, module_names, signals if statements != None else None)
+		if incremental :
+			Verilog2Spice.translateIncremental(ver_file, old_file, manifest, templates, del_on, transform, writer, counts)
+			FlowMetrics.fileRead(ver_file)
+		else :
+			if workers > 1 and statements == None and transform == None :
+				events = Verilog2Spice.translateShardedFile(ver_file, templates, del_on, workers, counts, diagnostics, line_width)
+				FlowMetrics.fileRead(ver_file)
+			else :
+				if statements == None :
+					statements = VerilogParser.parseFile(ver_file)
+					FlowMetrics.fileRead(ver_file)
+					if transform != None :
+						statements = transform(statements)
+				events = Verilog2Spice.translateStatements(statements, templates, del_on, counts, diagnostics, line_width)
+			for stmt in events:
+				writer.process(stmt)
+		writer.finish()
+		nb_subckt, nb_pins, nb_instances, nb_connections = counts
+		diagnostics.summary()
 
 		if nb_subckt > 0 :
-			print ('\nERROR : during the translation : ' + str(nb_subckt) + ' cells from the VERILOG netlist not found in the SPICE netlist !\n')
+			FlowLog.error('\nERROR : during the translation : ' + str(nb_subckt) + ' cells from the VERILOG netlist not found in the SPICE netlist !\n')
 		if nb_pins > 0 :
-			print ('\nERROR : during the translation : ' + str(nb_pins) + ' pins from the VERILOG netlist not found in the SPICE netlist !\n')
+			FlowLog.error('\nERROR : during the translation : ' + str(nb_pins) + ' pins from the VERILOG netlist not found in the SPICE netlist !\n')
 		if nb_subckt + nb_pins == 0 :
-			print (ver_file + ' : VERILOG netlist successfully translated to the SPICE netlist : ' + out_file + '\n')
+			FlowLog.info(ver_file + ' : VERILOG netlist successfully translated to the SPICE netlist : ' + out_file + '\n')
 
-		verfl.close()
 		outfl.close()
+		if incremental :
+			if old_file != None :
+				old_file.close()
+			os.replace(out_file + '.tmp', out_file)
+			manifest.store()
+			FlowLog.info('Incremental translation : ' + str(manifest.reused) + ' chunks reused, ' + str(manifest.translated) + ' chunks translated\n')
+			FlowMetrics.count('v2s.eco_chunks_reused', manifest.reused)
+			FlowMetrics.count('v2s.eco_chunks_translated', manifest.translated)
+		laps.end('v2s.emit')
+		FlowMetrics.fileWritten(out_file)
+		FlowMetrics.count('v2s.instances', nb_instances)
+		FlowMetrics.count('v2s.pins', nb_connections)
+		FlowMetrics.count('v2s.modules', writer.nb_modules)
+
+		return counts
+
+class ModuleWriter:
+	# writes one .SUBCKT per verilog module, in the netlist order. Instances of verilog modules are
+	# translated against the module table. A module used before its definition is kept, with everything
+	# written after it, until the module is defined. A module defined twice is only translated once.
+	# module_names : the modules defined in the netlist. An instance of a type that is neither a cell nor
+	# one of them is reported as an unknown cell right away, instead of holding back the rest of the output
+	# signals : declaration index of the netlist, module name -> {signal name: declaration with kind, msb and lsb}
+	# (see translateVerilogNetlist.signals). The bus widths of the module instance connections are then looked up
+	# there, otherwise they are collected from the declarations while the netlist is written
+	def __init__(self, outfl, pos_pwr, neg_pwr, del_on, counts, diagnostics, width=0, module_names=(), signals=None):
+		self.outfl = outfl
+		self.pos_pwr = pos_pwr
+		self.neg_pwr = neg_pwr
+		self.del_on = del_on
+		self.counts = counts
+		self.diagnostics = diagnostics
+		self.width = width  # longer SPICE lines are cut into '+' continuation lines, 0 for no limit
+		self.modules = {}  # module name -> (PortRange of the .SUBCKT ports in declaration order, header port order)
+		self.pending = collections.deque()  # output waiting for a module definition
+		self.module_names = module_names
+		self.signals = signals
+		self.nb_modules = 0  # modules written
+		self.name = None  # module being translated
+		self.skip = False  # inside a module already translated
+
+	def process(self, stmt):
+		if self.skip :
+			self.skip = not isinstance(stmt, EndModule)
+			return
+		if isinstance(stmt, str) : # SPICE lines of translated instances
+			self.openSubckt()
+			self.write(stmt)
+			return
+		if isinstance(stmt, Instance) : # instance of a verilog module (or of an unknown cell)
+			self.openSubckt()
+			self.write((stmt, self.widths))
+			return
+		if isinstance(stmt, EndModule) :
+			self.closeSubckt()
+			return
+		if isinstance(stmt, Module) :
+			name = VerilogParser.unescape(stmt.name)
+			if name in self.modules :
+				self.diagnostics.warning('module_redefined', (name,), 'Warning : module ' + name + ' is defined more than once, the first definition is used !')
+				self.skip = True
+				return
+			if self.name != None :
+				self.closeSubckt()
+			self.name = name
+			self.subckt = []  # PortRange of the pins of the .SUBCKT
+			self.widths = {} if self.signals is None else self.signals.get(name, {})  # net name -> declaration, for the bus connections of module instances
+			self.ports = [VerilogParser.unescape(port) for port in stmt.ports]
+			self.subckt_on = True
+			declarations = stmt.declarations
+		elif isinstance(stmt, Declaration) :
+			declarations = [stmt]
+		else :
+			return
+		for decl in declarations :
+			self.declare(decl)
+
+	def declare(self, decl):
+		msb = decl.msb
+		lsb = decl.lsb
+		if msb is not None and not (isinstance(msb, int) and isinstance(lsb, int)) :
+			if decl.kind in DIRECTIONS :
+				self.diagnostics.error('bus_range', (str(self.name), ', '.join(decl.names)), 'ERROR : bus range [' + str(msb) + ':' + str(lsb) + '] of ' + ', '.join(decl.names) + ' is not a number, declared as scalar pins !')
+			msb = lsb = None
+		for name in decl.names :
+			name = VerilogParser.unescape(name)
+			if self.signals is None and VerilogParser.supersedes(self.widths.get(name), decl) :
+				self.widths[name] = decl
+			if decl.kind not in DIRECTIONS :
+				continue
+			self.subckt.append(PortRange(name, msb, lsb))
+			if msb is not None :
+				FlowMetrics.count('v2s.bus_bits', abs(msb - lsb) + 1)
+
+	def busBits(name, msb, lsb):
+		step = -1 if msb >= lsb else 1
+		return [name + '[' + str(i) + ']' for i in range(msb, lsb+step, step)]
 
-		return
+	def pinIndexes(port):
+		# bit indexes of a port in the SPICE pin order : busses go from the lowest to the highest index
+		if port.msb is None :
+			return (None,)
+		return range(min(port.msb, port.lsb), max(port.msb, port.lsb)+1)
+
+	def headerWords(self):
+		# words of the .SUBCKT line, the busses expanded one bit at a time
+		yield '.SUBCKT'
+		yield self.name
+		for port in self.subckt :
+			if port.msb is None :
+				yield port.name
+			else :
+				for i in ModuleWriter.pinIndexes(port) :
+					yield port.name + '[' + str(i) + ']'
+
+	def openSubckt(self):
+		# the first statement after the declarations : the module interface is known, write the .SUBCKT line
+		if self.name is None or not self.subckt_on :
+			return
+		self.subckt_on = False
+		self.modules[self.name] = (self.subckt, self.ports)
+		header = ' '.join(self.headerWords()) + ' '
+		if self.del_on :  # change the busses delimiter
+			header = header.replace('[','_bus').replace(']','_')
+		if self.width and len(header) > self.width :
+			header = '\n'.join(LineWrapper.wrap(header, self.width, prefix=SPICE_CONTINUATION))
+		if self.nb_modules == 0 :
+			self.write('.GLOBAL ' + self.pos_pwr + ' ' + self.neg_pwr + '\n\n' + header + '\n\n')
+		else :
+			self.write('\n\n' + header + '\n\n')
+		self.nb_modules += 1
+
+	def closeSubckt(self):
+		if self.name is None :
+			return
+		self.openSubckt()
+		self.write('\n' + '.ENDS ' + self.name)
+		self.name = None
+		self.flush(False)
+
+	def write(self, piece):
+		# piece : SPICE text, or (instance, widths of its module) for an instance of a verilog module
+		if not self.pending :
+			if isinstance(piece, str) :
+				self.outfl.write(piece)
+				return
+			if piece[0].type in self.modules :
+				self.outfl.write(self.translateModuleInstance(piece[0], piece[1]))
+				return
+		if not isinstance(piece, str) and piece[0].type not in self.modules and piece[0].type not in self.module_names :
+			self.unknownCell(piece[0])
+			return
+		self.pending.append(piece)
+
+	def unknownCell(self, stmt):
+		self.diagnostics.error('unknown_cell', (stmt.type,), 'ERROR : subckt ' + stmt.type + ' not found in the Spice netlist !')
+		self.counts[0] += 1
+
+	def flush(self, final):
+		# write the pending output up to the first instance of a module still not defined.
+		# When final, instances of unknown modules are reported and skipped
+		while self.pending :
+			piece = self.pending[0]
+			if isinstance(piece, str) :
+				self.outfl.write(piece)
+			elif piece[0].type in self.modules :
+				self.outfl.write(self.translateModuleInstance(piece[0], piece[1]))
+			elif final :  # a module name found in a comment by the pre-scan, never defined
+				self.unknownCell(piece[0])
+			else :
+				return
+			self.pending.popleft()
+
+	def finish(self):
+		self.closeSubckt()
+		self.flush(True)
+
+	def translateModuleInstance(self, stmt, widths):
+		instance = VerilogParser.unescape(stmt.name)
+		if instance[0] != 'X' :  # avoid double XX at the beginning of the instance name
+			instance = 'X' + instance
+		ports, order = self.modules[stmt.type]
+		connections = {}  # port -> net, named or positional
+		for i, (pin, net) in enumerate(stmt.pins) :
+			if pin is None :
+				if i >= len(order) :
+					continue
+				pin = order[i]
+			if pin not in connections :
+				connections[pin] = net
+		nodes = [instance]
+		expanded = {}  # port -> SPICE nodes of its connection, msb first
+		for port in ports : # .SUBCKT pin order
+			expr = expanded.get(port.name)
+			if expr is None :
+				net = connections.get(port.name)
+				expr = expanded[port.name] = self.expandNet(net, widths) if net else []
+			for i in ModuleWriter.pinIndexes(port) :
+				k = 1 if i is None else abs(i - port.lsb) + 1  # connect from the lsb side
+				if k <= len(expr) :
+					nodes.append(expr[-k])
+				else :
+					pin = port.name if i is None else port.name + '[' + str(i) + ']'
+					if self.diagnostics.note(WARNING, 'missing_pin', (stmt.type, pin)) :
+						self.diagnostics.show(WARNING, 'missing_pin', 'Warning : pin ' + pin + ' of the Spice netlist not found for the cell ' + instance + ' of the Verilog netlist !  Connecting to ground (0) by default.')
+					nodes.append('0')
+					self.counts[1] += 1
+		nodes.append(stmt.type)
+		return LineWrapper.spiceLine(nodes, self.width)
+
+	def expandNet(self, net, widths):
+		# SPICE nodes of the bits of a verilog net expression, msb first
+		toks = [tok for tok, spaced in VerilogParser.tokenize([net])]
+		try :
+			bits, i = self.expandExpr(toks, 0, widths)
+		except (IndexError, ValueError) :
+			return [Verilog2Spice.spiceNode(net.strip(), self.del_on)]
+		return bits
+
+	def expandExpr(self, toks, i, widths):
+		tok = toks[i]
+		if tok == '{' : # concatenation or replication
+			if toks[i+1][0].isdigit() and toks[i+2] == '{' :
+				count = int(toks[i+1])
+				bits, i = self.expandExpr(toks, i+2, widths)
+				if toks[i] != '}' :
+					raise ValueError(tok)
+				return bits * count, i + 1
+			bits = []
+			i += 1
+			while True :
+				part, i = self.expandExpr(toks, i, widths)
+				bits.extend(part)
+				if toks[i] == '}' :
+					return bits, i + 1
+				if toks[i] != ',' :
+					raise ValueError(tok)
+				i += 1
+		if tok[0].isdigit() or tok[0] == "'" : # constant : 1 -> pos_pwr, 0 (and x, z) -> neg_pwr
+			return [self.pos_pwr if bit == '1' else self.neg_pwr for bit in ModuleWriter.constantBits(tok)], i + 1
+		name = VerilogParser.unescape(tok)
+		i += 1
+		if i < len(toks) and toks[i] == '[' : # bit or part select
+			close = toks.index(']', i)
+			if close == i + 2 :
+				return [Verilog2Spice.spiceNode(name + '[' + toks[i+1] + ']', self.del_on)], close + 1
+			msb = int(toks[i+1])
+			lsb = int(toks[i+3])
+			return [Verilog2Spice.spiceNode(bit, self.del_on) for bit in ModuleWriter.busBits(name, msb, lsb)], close + 1
+		decl = widths.get(name)
+		if decl is None or not (isinstance(decl.msb, int) and isinstance(decl.lsb, int)) :  # scalar, or a range that is not a number
+			return [Verilog2Spice.spiceNode(name, self.del_on)], i
+		return [Verilog2Spice.spiceNode(bit, self.del_on) for bit in ModuleWriter.busBits(name, decl.msb, decl.lsb)], i
+
+	def constantBits(tok):
+		# bits of a verilog constant, msb first
+		if "'" not in tok :
+			return bin(int(tok.replace('_','')))[2:]
+		size, value = tok.split("'")
+		base = value[0].lower()
+		if base == 's' :
+			value = value[1:]
+			base = value[0].lower()
+		digits = value[1:].replace('_','').lower()
+		if base == 'b' :
+			bits = digits
+		elif base in 'oh' :
+			width = 3 if base == 'o' else 4
+			bits = ''.join(bin(int(d, 16))[2:].zfill(width) if d not in 'xz?' else d * width for d in digits)
+		else :
+			bits = bin(int(digits))[2:]
+		if size :
+			bits = bits[-int(size):].rjust(int(size), '0')
+		return bits
 
 if __name__ == '__main__':
-	Verilog2Spice.verilogNetlist2Spice(spi_files=['newcdl.cdl'], ver_file='newverilog.v', out_file='final1.sp', pos_pwr='njf_vdd', neg_pwr='njf_gnd', del_on=True)
\ No newline at end of file
+	parser = argparse.ArgumentParser(description='Simple structured VERILOG netlist to SPICE netlist translator')
+	parser.add_argument('-spice', action='append', default=[], help='reference SPICE library netlist, can be repeated')
+	parser.add_argument('-verilog', default='')
+	parser.add_argument('-output', default='')
+	parser.add_argument('-pos_pwr', default='VDD')
+	parser.add_argument('-neg_pwr', default='VSS')
+	parser.add_argument('-delimiter', action='store_true', help='change the busses delimiter from [:] to _bus:_')
+	parser.add_argument('--no-cache', action='store_true', help='do not read or write the parsed library cache')
+	parser.add_argument('--rebuild-cache', action='store_true', help='reparse the libraries and refresh the cache')
+	parser.add_argument('-workers', type=int, default=1, help='number of processes translating the instances')
+	parser.add_argument('-compress_level', type=int, help='compression level of a .gz/.xz/.bz2 output')
+	parser.add_argument('--incremental', action='store_true', help='only translate the parts of the netlist changed since the previous run')
+	parser.add_argument('-line_width', type=int, default=SPICE_LINE_WIDTH, help="cut SPICE lines longer than this into '+' continuation lines, 0 (default) for no limit")
+	parser.add_argument('--quiet', action='store_true', help='only print the errors')
+	parser.add_argument('--verbose', action='store_true', help='also print the details of every step')
+	parser.add_argument('-max_messages', type=int, default=MAX_MESSAGES, help='messages printed per kind of warning or error, the others are counted in the summary')
+	parser.add_argument('--diagnostics', help='write the counts of every warning and error to this json file')
+	parser.add_argument('--metrics', help='write the time, counts and bytes of every stage to this json file')
+	parser.add_argument('--metrics-memory', action='store_true', help='add the tracemalloc peak of every stage to the metrics')
+	args = parser.parse_args()
+	FlowLog.setLevel(FlowLog.levelFromArgs(args.quiet, args.verbose))
+	diagnostics = Diagnostics(args.max_messages)
+	if args.metrics :
+		FlowMetrics.enable(trace_memory=args.metrics_memory)
+	with contextlib.redirect_stdout(sys.stderr if args.output == '-' else sys.stdout) : # keep stdout for the netlist
+		Verilog2Spice.verilogNetlist2Spice(spi_files=args.spice, ver_file=args.verilog, out_file=args.output,
+		                                   pos_pwr=args.pos_pwr, neg_pwr=args.neg_pwr, del_on=args.delimiter,
+		                                   use_cache=not args.no_cache, rebuild_cache=args.rebuild_cache, workers=args.workers,
+		                                   compress_level=args.compress_level, incremental=args.incremental, line_width=args.line_width,
+		                                   diagnostics=diagnostics)
+		if args.diagnostics :
+			diagnostics.write(args.diagnostics)
+		if args.metrics :
+			FlowMetrics.write(args.metrics)
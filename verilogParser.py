@@ -0,0 +1,316 @@
+import re
+from collections import namedtuple
+
+from compressedIO import CompressedIO
+
+#
+# Streaming tokenizer and statement parser for structural Verilog netlists
+#
+# The file is read one line at a time and every statement is yielded as soon
+# as its ';' (or endmodule) is seen, so memory is bounded by the longest
+# statement. Line comments, block comments spanning lines and escaped
+# identifiers are handled by the tokenizer.
+#
+# Yielded records:
+#   Module(name, ports, declarations, text)   declarations holds ANSI style port declarations
+#   Declaration(kind, msb, lsb, names, text)  input/output/inout/wire/reg/... ; msb/lsb are None for scalars
+#   Instance(type, name, pins, text)          pins is the ordered list of (pin, net); pin is None for positional connections
+#   EndModule(text)
+#   Statement(text)                           anything else (assign, parameter, ...)
+#
+# text is the statement with comments removed and whitespace collapsed to single spaces.
+# Escaped identifiers keep their leading backslash and their terminating space.
+##############################################################################
+
+Module = namedtuple('Module', ['name', 'ports', 'declarations', 'text'])
+Declaration = namedtuple('Declaration', ['kind', 'msb', 'lsb', 'names', 'text'])
+Instance = namedtuple('Instance', ['type', 'name', 'pins', 'text'])
+EndModule = namedtuple('EndModule', ['text'])
+Statement = namedtuple('Statement', ['text'])
+
+TOKEN_RE = re.compile(r"""
+    \s+
+  | (?P<comment>//|/\*)
+  | (?P<tok>\\\S+|[A-Za-z_$][\w$]*|\d[\w']*(?:\.\d+)?|'[sS]?[bBoOdDhH][\w?]+|"(?:\\.|[^"\\])*"|.)
+""", re.X)
+
+MODULE_NAME_RE = re.compile(r"(?:^|[\s;])(?:macro)?module(?:\s+(\\\S+|[A-Za-z_$][\w$]*)|\s*$)")
+NAME_RE = re.compile(r"\s*(\\\S+|[A-Za-z_$][\w$]*)")
+#one item of a line of code for statementEnd: line comment (group 1), block comment closed on the line or not
+#(group 2), escaped name, string, other characters
+STATEMENT_SCAN_RE = re.compile(rb'(//.*)|(/\*.*?(?:\*/|$))|\\\S*|"(?:\\.|[^"\\])*"?|[^\s/\\"]+|\S', re.S)
+DIRECTIONS = ('input', 'output', 'inout')
+DECLARATION_KINDS = frozenset(DIRECTIONS + ('wire', 'reg', 'tri', 'wand', 'wor', 'tri0', 'tri1',
+                                            'supply0', 'supply1', 'logic'))
+DECLARATION_QUALIFIERS = frozenset(('wire', 'reg', 'tri', 'wand', 'wor', 'tri0', 'tri1',
+                                    'supply0', 'supply1', 'logic', 'signed', 'unsigned', 'scalared', 'vectored'))
+KEYWORDS = frozenset(('module', 'macromodule', 'endmodule', 'assign', 'parameter', 'localparam', 'defparam',
+                      'always', 'initial', 'function', 'endfunction', 'task', 'endtask', 'generate',
+                      'endgenerate', 'genvar', 'integer', 'real', 'time', 'specify', 'endspecify',
+                      'begin', 'end', 'if', 'else', 'case', 'endcase', 'for', 'timescale')) | DECLARATION_KINDS
+
+class VerilogParser:
+    def tokenize(lines):
+        #yields (token, spaced) pairs. spaced is True when whitespace, a comment or a newline precedes the token
+        in_block = False
+        for line in lines:
+            pos = 0
+            end = len(line)
+            spaced = True
+            if not in_block and line.lstrip().startswith('`'): #compiler directives end with the line
+                yield line.split('//')[0].strip(), True
+                continue
+            while pos < end:
+                if in_block:
+                    close = line.find('*/', pos)
+                    if close == -1:
+                        break
+                    pos = close + 2
+                    in_block = False
+                    spaced = True
+                    continue
+                m = TOKEN_RE.match(line, pos)
+                pos = m.end()
+                tok = m.group('tok')
+                if tok is None:
+                    if m.group('comment') == '//':
+                        break
+                    if m.group('comment') == '/*':
+                        in_block = True
+                    spaced = True
+                    continue
+                yield tok, spaced
+                spaced = False
+
+    def joinTokens(toks, spaces) -> str:
+        #rebuild source text from tokens. An escaped identifier always keeps its terminating space
+        parts = []
+        escaped = False
+        for tok, spaced in zip(toks, spaces):
+            if parts and spaced and not escaped:
+                parts.append(' ')
+            parts.append(tok)
+            escaped = tok[0] == '\\'
+            if escaped:
+                parts.append(' ')
+        return ''.join(parts)
+
+    def unescape(name: str) -> str:
+        #plain name of a (possibly escaped) identifier
+        if name[:1] == '\\':
+            return name[1:].rstrip()
+        return name
+
+    def parseFile(verilogFile: str):
+        #plain or compressed file, '-' for stdin
+        with CompressedIO.openInput(verilogFile) as vfile:
+            yield from VerilogParser.parse(vfile)
+
+    def moduleNames(verilogFile: str) -> set:
+        #names (unescaped) of the modules defined in a plain or compressed file, found by a scan of its lines
+        #that is much faster than parsing it. A module keyword in a block comment is counted as well
+        names = set()
+        named = True #False when a line ended with the module keyword
+        with CompressedIO.openInput(verilogFile) as vfile:
+            for line in vfile:
+                if named and 'module' not in line:
+                    continue
+                line = line.split('//', 1)[0]
+                if not named:
+                    match = NAME_RE.match(line)
+                    if match == None:
+                        continue
+                    names.add(VerilogParser.unescape(match.group(1)))
+                    named = True
+                for match in MODULE_NAME_RE.finditer(line):
+                    if match.group(1) == None:
+                        named = False
+                    else:
+                        names.add(VerilogParser.unescape(match.group(1)))
+        return names
+
+    def supersedes(known, decl) -> bool:
+        #True when the declaration decl replaces known, the declaration of the same name seen before it (None
+        #for none), in a declaration index: a port direction takes precedence over a net declaration of the same
+        #name (output q; reg q;), otherwise the first declaration is kept
+        return known == None or (known.kind not in DIRECTIONS and decl.kind in DIRECTIONS)
+
+    def statementEnd(line: bytes, in_block: bool) -> tuple:
+        #(ends, in_block) for a line of a netlist read in binary: ends is True when the last character of the
+        #line outside of comments is a ';' (not one of an escaped name or a string) and no block comment is left
+        #open, so the netlist can be cut after the line without splitting a statement or a comment.
+        #in_block tells whether a block comment is open at the start of the line, then at its end
+        if in_block:
+            end = line.find(b'*/')
+            if end == -1:
+                return False, True
+            line = line[end+2:]
+        elif b'/' not in line and b'\\' not in line and b'"' not in line: #only code
+            return line.rstrip().endswith(b';'), False
+        last = b''
+        in_block = False
+        for match in STATEMENT_SCAN_RE.finditer(line):
+            if match.lastindex == 1:
+                break
+            if match.lastindex == 2:
+                comment = match.group(2)
+                in_block = len(comment) < 4 or not comment.endswith(b'*/')
+                continue
+            last = match.group()
+        return not in_block and last.endswith(b';') and last[:1] not in (b'\\', b'"'), in_block
+
+    def parse(lines):
+        toks = []
+        spaces = []
+        for tok, spaced in VerilogParser.tokenize(lines):
+            if tok == 'endmodule' and not toks:
+                yield EndModule(tok)
+                continue
+            if tok[0] == '`':
+                if not toks:
+                    yield Statement(tok)
+                continue
+            toks.append(tok)
+            spaces.append(spaced)
+            if tok == ';' or tok == 'begin':
+                yield VerilogParser.makeRecord(toks, spaces)
+                toks = []
+                spaces = []
+        if toks:
+            yield VerilogParser.makeRecord(toks, spaces)
+
+    def makeRecord(toks, spaces):
+        text = VerilogParser.joinTokens(toks, spaces)
+        first = toks[0]
+        if first == 'module' or first == 'macromodule':
+            return VerilogParser.makeModule(toks, spaces, text)
+        if first in DECLARATION_KINDS:
+            return VerilogParser.makeDeclaration(toks, 0, len(toks), text)
+        if first not in KEYWORDS and len(toks) > 2:
+            inst = VerilogParser.makeInstance(toks, spaces, text)
+            if inst != None:
+                return inst
+        return Statement(text)
+
+    def matchingParen(toks, start: int) -> int:
+        #index of the token closing the bracket opened at toks[start]
+        depth = 0
+        for i in range(start, len(toks)):
+            tok = toks[i]
+            if tok == '(' or tok == '[' or tok == '{':
+                depth += 1
+            elif tok == ')' or tok == ']' or tok == '}':
+                depth -= 1
+                if depth == 0:
+                    return i
+        return len(toks)
+
+    def splitList(toks, start: int, end: int) -> list:
+        #(begin, end) index ranges of the comma separated items in toks[start:end], at bracket depth 0
+        items = []
+        depth = 0
+        begin = start
+        for i in range(start, end):
+            tok = toks[i]
+            if tok == '(' or tok == '[' or tok == '{':
+                depth += 1
+            elif tok == ')' or tok == ']' or tok == '}':
+                depth -= 1
+            elif tok == ',' and depth == 0:
+                items.append((begin, i))
+                begin = i + 1
+        if begin < end:
+            items.append((begin, end))
+        return items
+
+    def rangeBound(toks) -> object:
+        text = ''.join(toks)
+        try:
+            return int(text)
+        except ValueError:
+            return text
+
+    def makeDeclaration(toks, start: int, end: int, text: str):
+        #declaration found in toks[start:end]: kind [qualifiers] [msb:lsb] name, name = value, ... ;
+        kind = toks[start]
+        i = start + 1
+        while i < end and toks[i] in DECLARATION_QUALIFIERS:
+            i += 1
+        msb = None
+        lsb = None
+        if i < end and toks[i] == '[':
+            close = VerilogParser.matchingParen(toks, i)
+            colon = toks.index(':', i, close) if ':' in toks[i:close] else -1
+            if colon == -1:
+                msb = lsb = VerilogParser.rangeBound(toks[i+1:close])
+            else:
+                msb = VerilogParser.rangeBound(toks[i+1:colon])
+                lsb = VerilogParser.rangeBound(toks[colon+1:close])
+            i = close + 1
+        if end > i and toks[end-1] == ';':
+            end -= 1
+        names = []
+        for begin, stop in VerilogParser.splitList(toks, i, end):
+            if begin < stop and toks[begin] != '=':
+                names.append(toks[begin])
+        return Declaration(kind, msb, lsb, names, text)
+
+    def makeModule(toks, spaces, text: str):
+        name = toks[1] if len(toks) > 1 else ''
+        ports = []
+        declarations = []
+        i = 2
+        if i < len(toks) and toks[i] == '#': #skip the parameter list
+            i = VerilogParser.matchingParen(toks, i+1) + 1
+        if i < len(toks) and toks[i] == '(':
+            close = VerilogParser.matchingParen(toks, i)
+            direction = None
+            for begin, stop in VerilogParser.splitList(toks, i+1, close):
+                if begin == stop:
+                    continue
+                if toks[begin] in DIRECTIONS: #ANSI style port declaration
+                    decl = VerilogParser.makeDeclaration(toks, begin, stop, '')
+                    declarations.append(decl)
+                    direction = decl
+                    ports.extend(decl.names)
+                elif direction != None: #continues the previous ANSI declaration
+                    direction.names.append(toks[stop-1])
+                    ports.append(toks[stop-1])
+                elif toks[begin] == '.' and begin + 1 < stop:
+                    ports.append(toks[begin+1])
+                else:
+                    ports.append(toks[begin])
+        return Module(name, ports, declarations, text)
+
+    def makeInstance(toks, spaces, text: str):
+        #cell_type [#(params)] inst_name [range] ( connections ) ;
+        i = 1
+        if toks[i] == '#':
+            if i + 1 >= len(toks) or toks[i+1] != '(':
+                return None
+            i = VerilogParser.matchingParen(toks, i+1) + 1
+        if i >= len(toks):
+            return None
+        name = toks[i]
+        if not (name[0].isalpha() or name[0] in '_\\'):
+            return None
+        i += 1
+        if i < len(toks) and toks[i] == '[': #instance array
+            i = VerilogParser.matchingParen(toks, i) + 1
+        if i >= len(toks) or toks[i] != '(':
+            return None
+        close = VerilogParser.matchingParen(toks, i)
+        pins = []
+        for begin, stop in VerilogParser.splitList(toks, i+1, close):
+            if begin == stop:
+                continue
+            if toks[begin] == '.' and begin + 1 < stop:
+                pin = VerilogParser.unescape(toks[begin+1])
+                net = ''
+                if begin + 2 < stop and toks[begin+2] == '(':
+                    pclose = VerilogParser.matchingParen(toks, begin+2)
+                    net = VerilogParser.joinTokens(toks[begin+3:pclose], spaces[begin+3:pclose])
+                pins.append((pin, net))
+            else:
+                pins.append((None, VerilogParser.joinTokens(toks[begin:stop], spaces[begin:stop])))
+        return Instance(toks[0], name, pins, text)